@@ -1,81 +1,7 @@
 #!/usr/bin/env python3
-import argparse, json, re, hashlib
+import argparse, json
 from pathlib import Path
-from typing import List
-import pandas as pd
-import numpy as np
-
-def snake_case(name: str) -> str:
-    s1 = re.sub(r'(.)([A-Z][a-z]+)', r'\1_\2', name)
-    s2 = re.sub(r'([a-z0-9])([A-Z])', r'\1_\2', s1)
-    return (s2.strip().lower().replace(" ", "_").replace("-", "_").replace("/", "_").replace("__","_"))
-
-def read_all_csvs(raw_dir: Path):
-    frames = []
-    for p in sorted(raw_dir.glob("*.csv")):
-        try:
-            df = pd.read_csv(p, low_memory=False)
-        except UnicodeDecodeError:
-            df = pd.read_csv(p, low_memory=False, encoding="latin-1")
-        df.columns = [snake_case(c) for c in df.columns]
-        df["__source_file"] = p.name
-        frames.append(df)
-    if not frames:
-        raise SystemExit(f"No CSVs in {raw_dir}")
-    return frames
-
-def unify(frames):
-    all_cols = sorted(set().union(*[set(f.columns) for f in frames]))
-    return pd.concat([f.reindex(columns=all_cols) for f in frames], ignore_index=True)
-
-def coerce(df):
-    for c in df.columns:
-        if c == "__source_file": continue
-        if df[c].dtype == object:
-            # try numeric
-            num = pd.to_numeric(df[c], errors="ignore")
-            if not num.equals(df[c]):
-                df[c] = num
-            # try datetime
-            if df[c].dtype == object and any(k in c for k in ["date","time","timestamp"]):
-                df[c] = pd.to_datetime(df[c], errors="coerce")
-    return df
-
-def fill_missing(df, make_synth=False, seed=13):
-    rng = np.random.default_rng(seed)
-    report = {"numeric":{}, "categorical":{}}
-    for c in df.columns:
-        if c == "__source_file": continue
-        s = df[c]
-        if pd.api.types.is_numeric_dtype(s):
-            if make_synth and s.isna().any():
-                vals = s.dropna().to_numpy()
-                if len(vals)>0:
-                    picks = rng.choice(vals, size=s.isna().sum(), replace=True)
-                    s.loc[s.isna()] = picks
-            if s.isna().any():
-                s.fillna(s.median(), inplace=True)
-            report["numeric"][c] = int(s.isna().sum())
-        elif pd.api.types.is_datetime64_any_dtype(s):
-            df[f"is_missing_{c}"] = s.isna().astype(int)
-        else:
-            mode = s.mode(dropna=True)
-            fillv = mode.iloc[0] if len(mode) else "_missing"
-            s.fillna(fillv, inplace=True)
-            report["categorical"][c] = fillv
-    return df, report
-
-def make_core(df, min_ratio):
-    thresh = int(len(df)*min_ratio)
-    keep = [c for c in df.columns if df[c].notna().sum() >= thresh]
-    return df[keep].copy()
-
-def md5(path: Path):
-    h = hashlib.md5()
-    with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
-            h.update(chunk)
-    return h.hexdigest()
+from iom_ingest import MAX_COERCED, ingest
 
 def main():
     ap = argparse.ArgumentParser()
@@ -83,39 +9,54 @@ def main():
     ap.add_argument("--out_dir", required=True)
     ap.add_argument("--make_synth", action="store_true")
     ap.add_argument("--core_threshold", type=float, default=0.2)
+    ap.add_argument("--workers", type=int, default=0, help="parser/writer processes (0 = one per core)")
+    ap.add_argument("--chunksize", type=int, default=200000)
+    ap.add_argument("--tmp_dir", default=None, help="where parsed chunks are spilled between passes")
+    ap.add_argument("--format", choices=["csv", "parquet", "both"], default="csv",
+                    help="parquet: master_full/ and master_core/ datasets, one file per chunk, with column statistics")
+    ap.add_argument("--partition_by", choices=["source", "none"], default="source",
+                    help="parquet: hive-partition by __source_file, or keep it as a column")
+    ap.add_argument("--row_group_rows", type=int, default=100000)
+    ap.add_argument("--max_coerced", type=float, default=MAX_COERCED,
+                    help="share of a numeric/date column's values that may be dropped as unparseable (counted in "
+                         "audit.json ingest.coerced_to_null); default 0: any unparseable value keeps the column as text")
     args = ap.parse_args()
 
     raw = Path(args.raw_dir); out = Path(args.out_dir)
     out.mkdir(parents=True, exist_ok=True)
 
-    frames = read_all_csvs(raw)
-    df = unify(frames)
-    df = coerce(df)
-    df, impute = fill_missing(df, make_synth=args.make_synth)
-
-    full = out / "master_full.csv"; core = out / "master_core.csv"
-    df.to_csv(full, index=False)
-    core_df = make_core(df, args.core_threshold)
-    core_df.to_csv(core, index=False)
+    res = ingest(raw, out, workers=args.workers, chunksize=args.chunksize, make_synth=args.make_synth,
+                 core_threshold=args.core_threshold, tmp_dir=args.tmp_dir,
+                 formats=("csv", "parquet") if args.format == "both" else (args.format,),
+                 partition_by=args.partition_by, row_group_rows=args.row_group_rows, max_coerced=args.max_coerced)
+    plan = res["plan"]
 
     # dictionary
     dd = []
-    for c in core_df.columns:
-        entry = {"name": c, "dtype": str(core_df[c].dtype)}
+    for c in plan["core_cols"]:
+        entry = {"name": c, "dtype": res["dtypes"].get(c, "object")}
         dd.append(entry)
 
     audit = {
-        "rows_full": int(len(df)), "cols_full": int(df.shape[1]),
-        "rows_core": int(len(core_df)), "cols_core": int(core_df.shape[1]),
-        "imputation": impute,
-        "artifacts": {
-            "master_full.csv":{"md5": md5(full)},
-            "master_core.csv":{"md5": md5(core)}
-        }
+        "rows_full": plan["rows"], "cols_full": len(plan["full_cols"]),
+        "rows_core": plan["rows"], "cols_core": len(plan["core_cols"]),
+        "imputation": plan["report"],
+        "ingest": {"files": res["files"], "column_kinds": res["kinds"], "coerced_to_null": res["coerced"],
+                   "widened_to_text": res["widened"],
+                   "seconds": res["timings"]},
+        "artifacts": {}
     }
+    # hashes were taken while the outputs were written
+    for name in ("master_full", "master_core"):
+        if args.format != "parquet":
+            audit["artifacts"][f"{name}.csv"] = {"md5": res["md5"][f"{name}.csv"]}
+        if args.format != "csv":
+            files = sorted((out / name).rglob("*.parquet"))
+            audit["artifacts"][f"{name}/"] = {"md5": res["md5"][f"{name}/"], "files": len(files),
+                                              "bytes": sum(f.stat().st_size for f in files), "partition_by": args.partition_by}
     with open(out/"audit.json","w") as f: json.dump(audit, f, indent=2)
     with open(out/"data_dictionary_core.json","w") as f: json.dump(dd, f, indent=2)
-    print(json.dumps({"status":"ok","out_dir":str(out)}))
+    print(json.dumps({"status":"ok","out_dir":str(out),"coerced_to_null":res["coerced"],"widened_to_text":res["widened"]}))
 
 if __name__ == "__main__":
     main()
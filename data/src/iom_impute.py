@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""Imputation engine used by iom_ingest.py.
+
+Statistics: one mergeable ColumnStats per column, updated from every parsed chunk and merged across
+workers. Value counts stay exact up to `max_exact` distinct values; past that a numeric column switches to
+a log-bucketed quantile sketch (relative error ALPHA on the median, the synthetic draws and the sketch
+stay mergeable) and a text column to Misra-Gries heavy hitters (the mode is exact whenever the most
+frequent value is heavier than the truncation error).
+
+Filling: one vectorized fillna over the whole column block per chunk, and for synthetic draws a
+counter-based Philox stream per column, positioned by the global row index, so a row's fill depends only
+on (seed, column, row) and not on the worker count or the chunk size.
+"""
+import zlib
+import numpy as np, pandas as pd
+
+MAX_EXACT = 100_000
+ALPHA = 0.001
+_GAMMA = (1 + ALPHA) / (1 - ALPHA)
+_LOG_GAMMA = np.log(_GAMMA)
+
+def _bucket(vals: np.ndarray) -> np.ndarray:
+    """Representative value of each value's log bucket (gamma^(k-1), gamma^k]; zero stays zero."""
+    a = np.abs(vals); out = np.zeros_like(vals, dtype=float); nz = a > 0
+    k = np.ceil(np.log(a[nz]) / _LOG_GAMMA)
+    out[nz] = np.sign(vals[nz]) * 2 * _GAMMA ** k / (_GAMMA + 1)
+    return out
+
+def _rebucket(vc: pd.Series) -> pd.Series:
+    return vc.groupby(_bucket(vc.index.to_numpy(dtype=float))).sum()
+
+class ColumnStats:
+    """Streamed per-column counters: rows, non-null, values coerced to NaN, and value counts (numeric/string)
+    that are exact up to `max_exact` distinct values and sketched beyond."""
+    def __init__(self, kind: str, max_exact: int = MAX_EXACT):
+        self.kind = kind; self.max_exact = max_exact
+        self.rows = 0; self.non_null = 0; self.coerced = 0
+        self.sketched = False; self.error = 0; self._integral = True
+        self._parts = []; self._counts = None
+
+    def update(self, s: pd.Series):
+        self.rows += len(s); self.non_null += int(s.notna().sum())
+        if self.kind != "datetime":
+            self._add(s.value_counts(dropna=True))
+
+    def merge(self, other: "ColumnStats"):
+        counts = other.counts  # compacts `other` first, which may switch it to the sketch
+        self.rows += other.rows; self.non_null += other.non_null; self.coerced += other.coerced
+        self.error += other.error; self._integral &= other._integral
+        if other.sketched and self.kind == "numeric":
+            self.sketched = True
+        self._add(counts, checked=True)
+        return self
+
+    def _add(self, vc: pd.Series, checked: bool = False):
+        if self.kind == "numeric" and not checked and len(vc):
+            self._integral &= bool(np.all(np.mod(vc.index.to_numpy(dtype=float), 1) == 0))
+        self._parts.append(vc)
+        if len(self._parts) >= 16: self._compact()
+
+    def _compact(self):
+        parts = [p for p in ([self._counts] if self._counts is not None else []) + self._parts if p is not None and len(p)]
+        if self.sketched and self.kind == "numeric":
+            parts = [_rebucket(p) for p in parts]
+        c = pd.concat(parts).groupby(level=0).sum() if parts else pd.Series(dtype="int64")
+        if len(c) > self.max_exact:
+            if self.kind == "numeric":
+                self.sketched = True; c = _rebucket(c)
+            if len(c) > self.max_exact:  # Misra-Gries: keep the heaviest, every count lowered by the cut
+                c = c.sort_values(ascending=False, kind="stable"); cut = int(c.iloc[self.max_exact])
+                c = c.iloc[:self.max_exact] - cut; c = c[c > 0]
+                self.sketched = True; self.error += cut
+        self._counts = c; self._parts = []
+
+    @property
+    def counts(self) -> pd.Series:
+        if self._parts or self._counts is None: self._compact()
+        return self._counts
+
+    def integral(self) -> bool:
+        return bool(len(self.counts)) and self._integral
+
+    def median(self) -> float:
+        # exact: same as Series.median (mean of the two middle order statistics); sketched: within ALPHA
+        c = self.counts.sort_index(); n = int(c.sum())
+        if not n:
+            return float("nan")
+        cum = c.to_numpy().cumsum(); vals = c.index.to_numpy(dtype=float)
+        lo = vals[np.searchsorted(cum, (n - 1) // 2 + 1)]; hi = vals[np.searchsorted(cum, n // 2 + 1)]
+        med = float((lo + hi) / 2)
+        return float(round(med)) if self.sketched and self._integral else med
+
+    def mode(self):
+        # same as Series.mode().iloc[0]: most frequent, smallest value among ties
+        c = self.counts
+        return sorted(c.index[c == c.max()])[0] if len(c) else None
+
+    def distribution(self) -> tuple:
+        """(values, cumulative probabilities) of the observed values, for synthetic draws."""
+        c = self.counts.sort_index(); vals = c.index.to_numpy()
+        if self.sketched and self._integral: vals = np.round(vals.astype(float))
+        cdf = np.cumsum(c.to_numpy(dtype=float)); cdf /= cdf[-1]
+        return vals, cdf
+
+def plan_imputation(stats: dict, make_synth: bool) -> dict:
+    """Per-column fill decisions and the audit report, from counters only."""
+    fill = {}; synth = {}; indicators = []; report = {"numeric": {}, "categorical": {}, "approximate": []}
+    for c, s in stats.items():
+        if s.kind == "numeric":
+            if make_synth and s.non_null and s.non_null < s.rows:
+                synth[c] = s.distribution()
+            elif s.non_null < s.rows and s.non_null:
+                fill[c] = s.median()
+            report["numeric"][c] = 0 if s.non_null else s.rows
+        elif s.kind == "datetime":
+            indicators.append(c)
+        else:
+            mode = s.mode(); fill[c] = "_missing" if mode is None else mode
+            report["categorical"][c] = fill[c]
+        if s.sketched and (c in fill or c in synth): report["approximate"].append(c)
+    return {"fill": fill, "synth": synth, "indicators": indicators, "report": report}
+
+def column_uniforms(seed: int, column: str, offset: int, n: int) -> np.ndarray:
+    """U(0,1) for global rows [offset, offset+n) of `column`; Philox emits 4 doubles per counter step."""
+    bg = np.random.Philox(key=[seed, zlib.crc32(column.encode())])
+    bg.advance(offset // 4)
+    return np.random.Generator(bg).random(n + offset % 4)[offset % 4:]
+
+def impute(df: pd.DataFrame, plan: dict, seed: int, offset: int) -> pd.DataFrame:
+    """Fill one chunk whose first row is global row `offset`."""
+    for c, (vals, cdf) in plan["synth"].items():
+        miss = df[c].isna().to_numpy()
+        if miss.any():
+            u = column_uniforms(seed, c, offset, len(df))[miss]
+            col = df[c].to_numpy(dtype=float, copy=True)
+            col[miss] = vals[np.minimum(np.searchsorted(cdf, u, side="right"), len(vals) - 1)]
+            df[c] = col
+    fill = {c: v for c, v in plan["fill"].items() if c in df.columns}
+    if fill:
+        df = df.fillna(fill)
+    if plan["indicators"]:
+        ind = df[plan["indicators"]].isna().astype(int).add_prefix("is_missing_")
+        df = pd.concat([df, ind], axis=1)
+    return df
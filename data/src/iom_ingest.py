@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""Streaming multi-file ingestion used by iom_build.py.
+
+sniff (header + sample per file) -> parse (process pool, one task per file, chunked, typed, reindexed to
+the union schema, spilled as pickles) -> merge per-column counters -> fill + write (process pool, one
+task per spilled chunk) -> concatenate the CSV parts in input order and/or write each chunk as one file of
+a hive-partitioned Parquet dataset (master_full/__source_file=<file>/part-00000.parquet).
+Every output is md5-hashed from the bytes as they are written, so the audit never re-reads it.
+Peak memory is a few chunks per worker, not a multiple of the whole input.
+"""
+import hashlib, os, re, shutil, tempfile, time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from urllib.parse import quote
+import numpy as np, pandas as pd
+from iom_impute import ColumnStats, plan_imputation, impute
+
+SOURCE = "__source_file"
+DATE_HINTS = ("date", "time", "timestamp")
+ENCODINGS = ("utf-8", "latin-1")
+# share of a numeric/datetime column's non-empty values that may be dropped as unparseable (then counted in the
+# result's "coerced"); by default none: a column with any unparseable value is kept as text
+MAX_COERCED = 0.0
+
+def snake_case(name: str) -> str:
+    s1 = re.sub(r'(.)([A-Z][a-z]+)', r'\1_\2', name)
+    s2 = re.sub(r'([a-z0-9])([A-Z])', r'\1_\2', s1)
+    return (s2.strip().lower().replace(" ", "_").replace("-", "_").replace("/", "_").replace("__","_"))
+
+# ---- sniffing ---------------------------------------------------------------
+def _sample_kind(name: str, s: pd.Series) -> str:
+    vals = s.dropna()
+    if not len(vals):
+        return "unknown"
+    if pd.api.types.is_numeric_dtype(s) or pd.to_numeric(vals, errors="coerce").notna().all():
+        return "numeric"
+    return "datetime" if any(k in name for k in DATE_HINTS) else "string"
+
+def sniff_file(path: Path, sample_rows: int = 10000) -> dict:
+    """Header, encoding and per-column kind guessed from the first `sample_rows` rows."""
+    for enc in ENCODINGS:
+        try:
+            df = pd.read_csv(path, nrows=sample_rows, encoding=enc, low_memory=False)
+            break
+        except UnicodeDecodeError:
+            continue
+    names = {src: snake_case(src) for src in df.columns}
+    return {"path": str(path), "encoding": enc, "names": names,
+            "kinds": {names[src]: _sample_kind(names[src], df[src]) for src in df.columns}}
+
+def merge_kinds(sniffs: list) -> dict:
+    """One kind per unified column, as pandas would have typed the concatenated column: datetime (date-like
+    name with text) beats string beats numeric; columns that are empty in every sample stay numeric."""
+    seen = {}
+    for info in sniffs:
+        for c, k in info["kinds"].items():
+            seen.setdefault(c, set()).add(k)
+    return {c: next((k for k in ("datetime", "string") if k in ks), "numeric") for c, ks in seen.items()}
+
+# ---- pass 1: parse ----------------------------------------------------------
+def _coerce(df: pd.DataFrame, kinds: dict, stats: dict) -> pd.DataFrame:
+    for c in df.columns:
+        k = kinds.get(c)
+        if k == "numeric" and not pd.api.types.is_numeric_dtype(df[c]):
+            num = pd.to_numeric(df[c], errors="coerce")
+            stats[c].coerced += int((num.isna() & df[c].notna()).sum()); df[c] = num
+        elif k == "datetime":
+            dt = pd.to_datetime(df[c], errors="coerce", format="mixed").astype("datetime64[ns]")
+            stats[c].coerced += int((dt.isna() & df[c].notna()).sum()); df[c] = dt
+        elif k == "string" and df[c].dtype != object:
+            df[c] = df[c].astype(object).where(df[c].notna(), None)
+    return df
+
+_EMPTY = {"numeric": lambda n: np.full(n, np.nan), "datetime": lambda n: np.full(n, np.datetime64("NaT"), dtype="datetime64[ns]"),
+          "string": lambda n: np.full(n, None, dtype=object)}
+
+def _parse_file(index: int, info: dict, columns: list, kinds: dict, chunksize: int, tmp: str) -> dict:
+    path = Path(info["path"]); t0 = time.perf_counter()
+    # text columns are read as str so leading zeros / mixed values survive; the rest is coerced per chunk
+    dtype = {src: str for src, c in info["names"].items() if kinds[c] == "string"}
+    for enc in dict.fromkeys([info["encoding"], *ENCODINGS]):
+        stats = {c: ColumnStats(kinds[c]) for c in columns}; parts = []; rows = 0
+        try:
+            for j, chunk in enumerate(pd.read_csv(path, chunksize=chunksize, encoding=enc, dtype=dtype, low_memory=False)):
+                chunk.columns = [info["names"].get(c, snake_case(c)) for c in chunk.columns]
+                chunk = _coerce(chunk, kinds, stats)
+                chunk[SOURCE] = path.name
+                absent = [c for c in columns if c not in chunk.columns]
+                chunk = chunk.reindex(columns=columns)
+                for c in absent:  # typed like the column in the files that have it, so chunk dtypes agree
+                    chunk[c] = _EMPTY[kinds[c]](len(chunk))
+                for c in columns:
+                    stats[c].update(chunk[c])
+                part = Path(tmp) / f"p{index:04d}_{j:05d}.pkl"
+                chunk.to_pickle(part); parts.append((str(part), len(chunk))); rows += len(chunk)
+        except UnicodeDecodeError:
+            for p, _ in parts: Path(p).unlink(missing_ok=True)
+            continue
+        for s in stats.values(): s._compact()
+        return {"file": path.name, "encoding": enc, "rows": rows, "parts": parts, "stats": stats,
+                "seconds": round(time.perf_counter() - t0, 3)}
+    raise UnicodeDecodeError("ingest", b"", 0, 1, f"{path}: none of {ENCODINGS} decodes the file")
+
+def to_widen(stats: dict, max_coerced: float) -> dict:
+    """Numeric/datetime columns whose coercion dropped more than `max_coerced` of their non-empty values (text the
+    sample did not show): {column: share dropped}. These are read again as text instead of losing the values."""
+    out = {}
+    for c, s in stats.items():
+        seen = s.non_null + s.coerced
+        if s.kind in ("numeric", "datetime") and s.coerced and s.coerced > max_coerced * seen:
+            out[c] = round(s.coerced / seen, 6)
+    return out
+
+# ---- plan: imputation + core columns from the merged counters --------------
+def plan_fill(columns: list, stats: dict, make_synth: bool, core_threshold: float) -> dict:
+    """What pass 2 does to every chunk, and the imputation report, decided from counters only."""
+    rows = max((s.rows for s in stats.values()), default=0)
+    plan = plan_imputation({c: stats[c] for c in columns if c != SOURCE}, make_synth)
+    fill, indicators = plan["fill"], plan["indicators"]
+    post_fill_non_null = {SOURCE: rows}; types = {SOURCE: "string"}
+    for c in columns:
+        if c == SOURCE:
+            continue
+        s = stats[c]
+        types[c] = {"numeric": "float64", "datetime": "timestamp[ns]"}.get(s.kind, "string")
+        if s.kind == "numeric":
+            # whole numbers with nothing left missing after the fill stay int64 in Parquet
+            if s.integral() and (c not in fill or float(fill[c]).is_integer()):
+                types[c] = "int64"
+            post_fill_non_null[c] = rows if s.non_null else 0
+        else:
+            post_fill_non_null[c] = s.non_null if s.kind == "datetime" else rows
+    full_cols = columns + [f"is_missing_{c}" for c in indicators]
+    for c in indicators:
+        post_fill_non_null[f"is_missing_{c}"] = rows; types[f"is_missing_{c}"] = "int64"
+    thresh = int(rows * core_threshold)
+    core_cols = [c for c in full_cols if post_fill_non_null[c] >= thresh]
+    return {**plan, "full_cols": full_cols, "core_cols": core_cols, "rows": rows, "parquet_types": types}
+
+# ---- pass 2: fill + write ---------------------------------------------------
+def _write_parquet(df: pd.DataFrame, columns: list, types: dict, root: Path, index: int, source, row_group_rows: int):
+    import pyarrow as pa, pyarrow.parquet as pq
+    if source is not None:  # hive partition: the directory name carries __source_file, the file does not
+        columns = [c for c in columns if c != SOURCE]; root = root / f"{SOURCE}={quote(source, safe='')}"
+    root.mkdir(parents=True, exist_ok=True)
+    schema = pa.schema([(c, pa.type_for_alias(types[c])) for c in columns])
+    df = df[columns].astype({c: "int64" for c in columns if types[c] == "int64"})
+    buf = pa.BufferOutputStream()  # encoded in memory (one compressed chunk) so it is hashed on the way to disk
+    pq.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False), buf,
+                   row_group_size=row_group_rows, write_statistics=True)
+    data = buf.getvalue(); path = root / f"part-{index:05d}.parquet"
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path), hashlib.md5(data).hexdigest()
+
+def _fill_part(index: int, part: str, offset: int, plan: dict, seed: int, out: dict) -> tuple:
+    df = impute(pd.read_pickle(part), plan, seed, offset)
+    full = core = None; hashes = {}
+    if out["csv"]:
+        full, core = part + ".full.csv", part + ".core.csv"
+        df.to_csv(full, index=False, header=False, columns=plan["full_cols"])
+        df.to_csv(core, index=False, header=False, columns=plan["core_cols"])
+    if out["parquet"]:
+        source = out["source"] if out["partition"] else None
+        for name, cols in (("master_full", plan["full_cols"]), ("master_core", plan["core_cols"])):
+            path, digest = _write_parquet(df, cols, plan["parquet_types"], Path(out["dir"]) / name, index, source,
+                                          out["row_group_rows"])
+            hashes[name] = (os.path.relpath(path, Path(out["dir"]) / name), digest)
+    Path(part).unlink()
+    dtypes = {c: str(df[c].dtype) for c in plan["core_cols"]}
+    return full, core, len(df), dtypes, hashes
+
+def _concat(out: Path, columns: list, parts: list) -> str:
+    """Header + parts in order; returns the md5 of exactly the bytes written."""
+    h = hashlib.md5()
+    with open(out, "wb") as f:
+        head = pd.DataFrame(columns=columns).to_csv(index=False).encode()
+        f.write(head); h.update(head)
+        for p in parts:
+            with open(p, "rb") as src:
+                for block in iter(lambda: src.read(1 << 22), b""):
+                    h.update(block); f.write(block)
+            os.unlink(p)
+    return h.hexdigest()
+
+def dataset_md5(parts: list) -> str:
+    """Fingerprint of a Parquet dataset: md5 over the sorted 'relative path  md5' lines of its part files."""
+    return hashlib.md5("".join(f"{p}  {d}\n" for p, d in sorted(parts)).encode()).hexdigest()
+
+def ingest(raw_dir: Path, out_dir: Path, workers: int = 0, chunksize: int = 200000, make_synth: bool = False,
+           core_threshold: float = 0.2, seed: int = 13, sample_rows: int = 10000, tmp_dir=None,
+           formats=("csv",), partition_by: str = "source", row_group_rows: int = 100000,
+           max_coerced: float = MAX_COERCED) -> dict:
+    """Build master_full / master_core (CSV files and/or Parquet datasets, see `formats`) from every CSV in
+    raw_dir; returns plan, per-file info and timings. A column whose sniffed kind would null out more than
+    `max_coerced` of its values is widened to text and the files are parsed once more."""
+    files = sorted(Path(raw_dir).glob("*.csv"))
+    if not files:
+        raise SystemExit(f"No CSVs in {raw_dir}")
+    workers = workers or os.cpu_count() or 1
+    out_dir = Path(out_dir); out_dir.mkdir(parents=True, exist_ok=True)
+    timings = {}; t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        sniffs = list(pool.map(sniff_file, files, [sample_rows] * len(files)))
+        kinds = merge_kinds(sniffs)
+        columns = sorted(set(kinds) | {SOURCE}); kinds[SOURCE] = "string"
+        timings["sniff"] = round(time.perf_counter() - t0, 3); t0 = time.perf_counter()
+        with tempfile.TemporaryDirectory(prefix="iom_ingest_", dir=tmp_dir) as tmp:
+            widened = {}
+            while True:
+                parsed = list(pool.map(_parse_file, range(len(files)), sniffs, [columns] * len(files),
+                                       [kinds] * len(files), [chunksize] * len(files), [tmp] * len(files)))
+                stats = {c: ColumnStats(kinds[c]) for c in columns}
+                for r in parsed:
+                    for c, s in r.pop("stats").items():
+                        stats[c].merge(s)
+                wide = to_widen(stats, max_coerced)
+                if not wide:
+                    break
+                for r in parsed:
+                    for p, _ in r["parts"]: Path(p).unlink(missing_ok=True)
+                widened.update(wide); kinds.update({c: "string" for c in wide})
+            plan = plan_fill(columns, stats, make_synth, core_threshold)
+            timings["parse"] = round(time.perf_counter() - t0, 3); t0 = time.perf_counter()
+            parts = [(p, n, r["file"]) for r in parsed for p, n in r.pop("parts")]
+            offsets = np.concatenate([[0], np.cumsum([n for _, n, _ in parts])[:-1]]).astype(int).tolist()
+            if "parquet" in formats:  # a rebuild must not leave part files of a previous run behind
+                for name in ("master_full", "master_core"):
+                    shutil.rmtree(out_dir / name, ignore_errors=True)
+            outs = [{"csv": "csv" in formats, "parquet": "parquet" in formats, "dir": str(out_dir), "source": src,
+                     "partition": partition_by == "source", "row_group_rows": row_group_rows} for _, _, src in parts]
+            written = list(pool.map(_fill_part, range(len(parts)), [p for p, _, _ in parts], offsets,
+                                    [plan] * len(parts), [seed] * len(parts), outs))
+            md5 = {}
+            if "csv" in formats:
+                md5["master_full.csv"] = _concat(out_dir / "master_full.csv", plan["full_cols"], [w[0] for w in written])
+                md5["master_core.csv"] = _concat(out_dir / "master_core.csv", plan["core_cols"], [w[1] for w in written])
+            for name in ("master_full", "master_core") if "parquet" in formats else ():
+                md5[f"{name}/"] = dataset_md5([w[4][name] for w in written])
+            timings["fill_write"] = round(time.perf_counter() - t0, 3)
+    dtypes = {}
+    for w in written:  # a column is float64 if any chunk needed it, e.g. an int column with a non-integral median
+        for c, d in w[3].items():
+            dtypes[c] = d if dtypes.get(c, d) == d else "float64" if {dtypes[c], d} <= {"int64", "float64"} else "object"
+    return {"plan": plan, "files": parsed, "kinds": kinds, "dtypes": dtypes, "timings": timings, "md5": md5,
+            "coerced": {c: s.coerced for c, s in stats.items() if s.coerced}, "widened": widened}
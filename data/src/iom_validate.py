@@ -1,28 +1,135 @@
 #!/usr/bin/env python3
-import argparse, json
+"""Validate iom_build outputs in one sequential read of master_full.
+
+master_core holds the same rows as master_full restricted to a column subset, so its checks are derived
+from the full read. Per chunk: null counts and min/max per column, and a 64-bit hash per core row that is
+spilled into buckets on disk (external hash partitioning); duplicates are then counted bucket by bucket,
+so memory stays at one chunk plus one bucket. For CSV the raw bytes are md5-hashed as the parser reads
+them and compared with audit.json.
+"""
+import argparse, hashlib, json, tempfile
 from pathlib import Path
-import pandas as pd
+import numpy as np, pandas as pd
+
+BUCKET_BITS = 8
+
+class HashingReader:
+    """File wrapper that md5-hashes whatever the CSV parser reads, so verifying costs no extra pass."""
+    def __init__(self, path):
+        self.f = open(path, "rb"); self.md5 = hashlib.md5()
+
+    def read(self, n=-1):
+        data = self.f.read(n); self.md5.update(data)
+        return data
+
+    def __iter__(self):
+        return iter(self.f)
+
+    def close(self):
+        self.f.close()
+
+class ColumnSummary:
+    def __init__(self):
+        self.nulls = 0; self.min = self.max = None; self.mixed = False
+
+    def update(self, s: pd.Series):
+        self.nulls += int(s.isna().sum())
+        vals = s.dropna()
+        if not len(vals) or self.mixed:
+            return
+        try:
+            lo, hi = vals.min(), vals.max()
+            self.min = lo if self.min is None else min(self.min, lo)
+            self.max = hi if self.max is None else max(self.max, hi)
+        except TypeError:  # e.g. numbers in one chunk, text in another: no meaningful order
+            self.mixed = True; self.min = self.max = None
+
+    def to_dict(self):
+        conv = lambda v: v.item() if hasattr(v, "item") else None if v is None else str(v)
+        return {"nulls": self.nulls, "min": conv(self.min), "max": conv(self.max)}
+
+class DuplicateCounter:
+    """Row hashes partitioned by their top bits into bucket files; duplicates = rows - distinct, per bucket."""
+    def __init__(self, tmp_dir=None):
+        self.tmp = tempfile.TemporaryDirectory(prefix="iom_validate_", dir=tmp_dir)
+        self.files = [open(Path(self.tmp.name) / f"b{i:03d}.u64", "wb") for i in range(1 << BUCKET_BITS)]
+
+    def add(self, df: pd.DataFrame):
+        h = pd.util.hash_pandas_object(df, index=False).to_numpy()
+        b = (h >> np.uint64(64 - BUCKET_BITS)).astype(np.intp)
+        order = np.argsort(b, kind="stable"); h, b = h[order], b[order]
+        bounds = np.searchsorted(b, np.arange((1 << BUCKET_BITS) + 1))
+        for i in np.flatnonzero(np.diff(bounds)):
+            self.files[i].write(h[bounds[i]:bounds[i + 1]].tobytes())
+
+    def count(self) -> int:
+        dups = 0
+        for f in self.files:
+            f.close()
+            h = np.fromfile(f.name, dtype=np.uint64)
+            dups += len(h) - len(np.unique(h))
+        self.tmp.cleanup()
+        return dups
+
+def _chunks(out: Path, chunksize: int, nrows: int):
+    """(chunk iterator, HashingReader or None) for the CSV file or the Parquet dataset."""
+    if (out/"master_full.csv").exists():
+        reader = HashingReader(out/"master_full.csv")
+        return pd.read_csv(reader, chunksize=chunksize, nrows=nrows or None, low_memory=False), reader
+    if (out/"master_full").is_dir():
+        import pyarrow.dataset as ds
+        dset = ds.dataset(str(out/"master_full"), format="parquet", partitioning="hive", ignore_prefixes=["."])
+        def batches():
+            seen = 0
+            for b in dset.to_batches(batch_size=chunksize):
+                df = b.to_pandas()
+                if nrows and seen + len(df) > nrows: df = df.iloc[:nrows - seen]
+                seen += len(df); yield df
+                if nrows and seen >= nrows: break
+        return batches(), None
+    raise SystemExit("Outputs missing. Run iom_build.py first.")
+
+def core_columns(out: Path) -> list:
+    if (out/"master_core.csv").exists():
+        return list(pd.read_csv(out/"master_core.csv", nrows=0).columns)
+    if (out/"data_dictionary_core.json").exists():
+        return [e["name"] for e in json.loads((out/"data_dictionary_core.json").read_text())]
+    raise SystemExit("Outputs missing. Run iom_build.py first.")
+
+def validate(out: Path, chunksize: int = 1_000_000, nrows: int = 0, tmp_dir=None) -> dict:
+    chunks, reader = _chunks(out, chunksize, nrows)
+    core = core_columns(out)
+    cols = {}; dup = DuplicateCounter(tmp_dir); rows = 0
+    try:
+        for chunk in chunks:
+            rows += len(chunk)
+            for c in chunk.columns:
+                cols.setdefault(c, ColumnSummary()).update(chunk[c])
+            dup.add(chunk[core])
+    finally:
+        duplicates = dup.count()
+        if reader is not None: reader.close()
+    issues = []
+    if any(cols[c].nulls for c in core): issues.append("core_has_nans")
+    if duplicates: issues.append("core_has_duplicates")
+    res = {"rows_full": rows, "cols_full": len(cols), "rows_core": rows, "cols_core": len(core),
+           "core_duplicate_rows": duplicates, "columns": {c: s.to_dict() for c, s in cols.items()}, "issues": issues}
+    audit = out/"audit.json"
+    if reader is not None and not nrows:
+        res["md5_full"] = reader.md5.hexdigest()
+        if audit.exists():
+            expected = json.loads(audit.read_text()).get("artifacts", {}).get("master_full.csv", {}).get("md5")
+            if expected and expected != res["md5_full"]: issues.append("md5_mismatch_full")
+    return res
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--out_dir", required=True)
+    ap.add_argument("--chunksize", type=int, default=1_000_000)
+    ap.add_argument("--nrows", type=int, default=0, help="validate only the first n rows (0 = the whole file)")
+    ap.add_argument("--tmp_dir", default=None, help="where row-hash buckets are spilled")
     args = ap.parse_args()
-    out = Path(args.out_dir)
-    mf = out/"master_full.csv"; mc = out/"master_core.csv"
-    if not mf.exists() or not mc.exists():
-        raise SystemExit("Outputs missing. Run iom_build.py first.")
-    df_full = pd.read_csv(mf, nrows=200000, low_memory=False)
-    df_core = pd.read_csv(mc, nrows=200000, low_memory=False)
-    issues = []
-    if df_core.isna().any().any(): issues.append("core_has_nans")
-    if df_core.duplicated().any(): issues.append("core_has_duplicates")
-    print(json.dumps({
-        "sample_rows_full": int(len(df_full)),
-        "sample_cols_full": int(df_full.shape[1]),
-        "sample_rows_core": int(len(df_core)),
-        "sample_cols_core": int(df_core.shape[1]),
-        "issues": issues
-    }, indent=2))
+    print(json.dumps(validate(Path(args.out_dir), args.chunksize, args.nrows, args.tmp_dir), indent=2))
 
 if __name__ == "__main__":
     main()
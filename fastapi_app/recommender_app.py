@@ -1,12 +1,30 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from typing import Literal, Optional
+from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel, Field
-import pandas as pd
 from utils.iom.config import AppConfig
 from utils.iom.recommend import Recommender
+from utils.iom.microbatch import MicroBatcher
+from utils.iom.batch_pipeline import BatchJobs
+from utils.iom.registry import get_registry
+from utils.iom.profile_store import ProfileService
+from utils.iom.mongo import close_async_clients
 
-app = FastAPI(title="IOM Learning Recommender")
 CFG = AppConfig.load()
 REC = Recommender(CFG)
+JOBS = BatchJobs(CFG)
+PROFILES = ProfileService.from_config(CFG)
+BATCHER = MicroBatcher(REC.predict_clusters, window_ms=CFG.microbatch_window_ms, max_batch=CFG.microbatch_max_batch,
+                       workers=CFG.microbatch_workers) if CFG.microbatch_enabled else None
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    if BATCHER is not None:
+        await BATCHER.close()
+    await close_async_clients()
+
+app = FastAPI(title="IOM Learning Recommender", lifespan=lifespan)
 
 class InputRow(BaseModel):
     time_spent: float = Field(..., ge=0)
@@ -14,6 +32,19 @@ class InputRow(BaseModel):
     accuracy: float = Field(..., ge=0)
     difficulty_level: int = Field(..., ge=0, le=10)
 
+class LookupRequest(BaseModel):
+    ids: list[str] = Field(..., min_length=1, max_length=10000)
+
+class LearnerUpdate(BaseModel):
+    time_spent: Optional[float] = Field(None, ge=0)
+    avg_score: Optional[float] = Field(None, ge=0)
+    accuracy: Optional[float] = Field(None, ge=0)
+    difficulty_level: Optional[int] = Field(None, ge=0, le=10)
+    topic_progress: Optional[float] = Field(None, ge=0)
+    cluster_kmeans: Optional[int] = Field(None, ge=0)
+    cluster_gmm: Optional[int] = Field(None, ge=0)
+    gmm_confidence: Optional[float] = Field(None, ge=0, le=1)
+
 @app.get("/health")
 async def health():
     return {"status": "ok"}
@@ -23,8 +54,18 @@ async def clusters():
     return {"n_clusters": CFG.n_clusters}
 
 @app.post("/recommend")
-async def recommend(row: InputRow):
-    r = REC.recommend_one(row.model_dump())
+async def recommend(row: InputRow, mode: Optional[Literal["hard", "soft"]] = None):
+    payload = row.model_dump()
+    if (mode or CFG.recommend_mode) == "soft":
+        r = REC.recommend_one(payload, "soft")  # compiled features + compiled GMM: microseconds, no batching needed
+        return {"cluster": r.cluster, "next_difficulty": r.next_difficulty, "topics": r.topics, "tips": r.tips,
+                "posterior": r.posterior, "expected_difficulty": r.expected_difficulty}
+    if BATCHER is not None:
+        r = REC.cached(payload)
+        if r is None:
+            r = REC.recommend_for_cluster(payload, await BATCHER.submit(payload)); REC.remember(payload, r)
+    else:
+        r = REC.recommend_one(payload)
     return {
         "cluster": r.cluster,
         "next_difficulty": r.next_difficulty,
@@ -32,11 +73,52 @@ async def recommend(row: InputRow):
         "tips": r.tips,
     }
 
+@app.get("/learners/{learner_id}")
+async def learner(learner_id: str):
+    # snapshot reads are a memory-mapped binary search; only ids it lacks go to Mongo, on the async client
+    doc = (await PROFILES.alookup([learner_id])).get(learner_id)
+    if doc is None:
+        raise HTTPException(status_code=404, detail="unknown learner_id")
+    return doc
+
+@app.put("/learners/{learner_id}")
+async def learner_update(learner_id: str, update: LearnerUpdate):
+    if PROFILES.acoll is None:
+        raise HTTPException(status_code=503, detail="learner writes need profiles.mongo_fallback")
+    return await PROFILES.aupsert(learner_id, update.model_dump(exclude_none=True))
+
+@app.post("/learners/lookup")
+async def learners_lookup(req: LookupRequest):
+    found = await PROFILES.alookup(req.ids)
+    return {"found": found, "missing": [i for i in dict.fromkeys(req.ids) if i not in found]}
+
+@app.get("/metrics/profiles")
+async def profile_metrics():
+    return PROFILES.metrics()
+
+@app.get("/metrics/recommend")
+async def recommend_metrics():
+    return REC.metrics()
+
+@app.get("/metrics/microbatch")
+async def microbatch_metrics():
+    if BATCHER is None:
+        return {"enabled": False}
+    return {"enabled": True, **BATCHER.metrics()}
+
+@app.get("/metrics/registry")
+async def registry_metrics():
+    return get_registry(CFG).metrics()
+
 @app.post("/batch_recommend")
-async def batch(csv_path: str):
-    df = pd.read_csv(csv_path)
-    out = REC.recommend_batch(df)
-    save = CFG.reports / "batch_recommendations.csv"
-    save.parent.mkdir(parents=True, exist_ok=True)
-    out.to_csv(save, index=False)
-    return {"rows": len(out), "saved": str(save)}
+async def batch(csv_path: str, output_format: Optional[Literal["csv", "parquet"]] = None,
+                mode: Optional[Literal["hard", "soft"]] = None):
+    job_id = JOBS.submit(csv_path, fmt=output_format, mode=mode)
+    return {"job_id": job_id, "status_url": f"/batch_recommend/{job_id}"}
+
+@app.get("/batch_recommend/{job_id}")
+async def batch_status(job_id: str):
+    job = JOBS.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="unknown job_id")
+    return job
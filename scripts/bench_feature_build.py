@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# Throughput and peak memory of feature building: pipeline transform + toarray (float64) vs compact float32 mode.
+# usage: PYTHONPATH=. python scripts/bench_feature_build.py --rows 10000000 --chunksize 1000000
+import argparse, json, time, tracemalloc
+from dataclasses import replace
+import numpy as np, pandas as pd
+from utils.iom.config import AppConfig
+from utils.iom.features import FeatureBuilder
+
+def synthetic(cfg, n, rng):
+    df = pd.DataFrame({c: rng.gamma(2.0, 10.0, n) for c in cfg.numeric})
+    for c in cfg.categorical:
+        df[c] = rng.integers(0, 3, n)
+    return df
+
+def run(name, build, chunks):
+    secs = 0.0; peak = 0; rows = 0
+    for df in chunks():
+        tracemalloc.start()
+        t0 = time.perf_counter(); X = build(df); secs += time.perf_counter() - t0
+        peak = max(peak, tracemalloc.get_traced_memory()[1]); tracemalloc.stop()
+        rows += len(X); width = X.shape[1]; dtype = X.dtype
+    return {"mode": name, "rows": rows, "seconds": round(secs, 2), "rows_per_sec": round(rows / secs),
+            "peak_mib_per_chunk": round(peak / 2**20, 1), "dtype": str(dtype),
+            "full_matrix_mib": round(rows * width * np.dtype(dtype).itemsize / 2**20, 1)}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--config", default="config.yaml")
+    ap.add_argument("--rows", type=int, default=10_000_000)
+    ap.add_argument("--chunksize", type=int, default=1_000_000)
+    args = ap.parse_args()
+    cfg = AppConfig.load(args.config)
+    # fit in a scratch artifacts dir so the bench never overwrites the real preprocess
+    cfg = replace(cfg, artifacts=cfg.reports / "bench_artifacts")
+    fb = FeatureBuilder(cfg)
+    fb.fit(synthetic(cfg, 100_000, np.random.default_rng(0)))
+
+    def chunks():
+        rng = np.random.default_rng(1)
+        for a in range(0, args.rows, args.chunksize):
+            yield synthetic(cfg, min(args.chunksize, args.rows - a), rng)
+
+    def legacy(df):
+        X = fb.build(df, fit=False)
+        return np.ascontiguousarray(X.toarray() if hasattr(X, "toarray") else X, dtype=np.float32)
+
+    buf = np.empty((args.chunksize, fb.build_compact(synthetic(cfg, 1, np.random.default_rng(0))).shape[1]), np.float32)
+    compact = lambda df: fb.build_compact(df, out=buf[:len(df)])
+    out = {"pipeline+toarray": run("pipeline+toarray", legacy, chunks), "compact": run("compact", compact, chunks)}
+    out["speedup"] = round(out["compact"]["rows_per_sec"] / out["pipeline+toarray"]["rows_per_sec"], 2)
+    print(json.dumps(out, indent=2))
+
+if __name__ == "__main__":
+    main()
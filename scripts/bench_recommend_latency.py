@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# Latency of Recommender.recommend_one: sklearn/pandas path vs compiled NumPy path.
+# usage: PYTHONPATH=. python scripts/bench_recommend_latency.py --csv data/processed/iom_task2_input_aug.csv
+import argparse, json, time
+from dataclasses import replace
+import numpy as np, pandas as pd
+from utils.iom.config import AppConfig
+from utils.iom.recommend import Recommender
+
+def timed(rec, rows, repeat):
+    lat = []
+    for _ in range(repeat):
+        for row in rows:
+            t0 = time.perf_counter(); rec.recommend_one(row); lat.append(time.perf_counter() - t0)
+    lat = np.asarray(lat) * 1e6
+    return {"calls": int(len(lat)), "p50_us": round(float(np.percentile(lat, 50)), 1),
+            "p99_us": round(float(np.percentile(lat, 99)), 1), "mean_us": round(float(lat.mean()), 1)}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--csv", required=True)
+    ap.add_argument("--config", default="config.yaml")
+    ap.add_argument("--rows", type=int, default=500)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+    cfg = AppConfig.load(args.config)
+    df = pd.read_csv(args.csv, nrows=args.rows)
+    rows = df[cfg.numeric + cfg.categorical].to_dict("records")
+
+    sk = Recommender(replace(cfg, compiled_inference=False))
+    fast = Recommender(replace(cfg, compiled_inference=True))
+    mismatched = sum(sk.recommend_one(r).cluster != fast.recommend_one(r).cluster for r in rows)
+    out = {"rows": len(rows), "cluster_mismatches": int(mismatched),
+           "sklearn": timed(sk, rows, args.repeat), "compiled": timed(fast, rows, args.repeat)}
+    out["speedup_p50"] = round(out["sklearn"]["p50_us"] / out["compiled"]["p50_us"], 1)
+    print(json.dumps(out, indent=2))
+
+if __name__ == "__main__":
+    main()
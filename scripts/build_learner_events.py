@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# Learner-events table for scripts/train_task_2_1_profile.py: a uniform sample of up to --per_file rows of
+# every CSV under data_local_backup/{raw,iom_datasets}, mapped onto the events schema.
+# Each file is streamed once in chunks through a bottom-k reservoir (one random key per row from a stream
+# seeded by (seed, file)), so memory is one chunk + the sample and the output depends only on --seed, never
+# on --workers or --chunksize. Scaling decisions (max grade, pass/fail wording, ...) use whole-file counters.
+# usage: PYTHONPATH=. python scripts/build_learner_events.py --workers 8
+import argparse, time, zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np, pandas as pd
+import pyarrow as pa, pyarrow.parquet as pq
+from utils.iom.columns import pick_columns
+
+SOURCES = ["data_local_backup/raw", "data_local_backup/iom_datasets"]
+ALIASES = {
+  "learner": ["learner_id","student_id","studentid","user id","userid","id"],
+  "content": ["content_id","activity","module_id","resource","assessment_id","course","course_id","vle_id"],
+  "topic": ["topic","subject","module","area","course"],
+  "difficulty": ["difficulty","level","grade","g1","g2","g3"],
+  "time": ["time_spent_sec","duration","time","studytime","spent"],
+  "correct": ["correct","is_correct","passed","result","final_result","score","marks"],
+}
+GRADES = {"g1","g2","g3","grade"}
+PASS = ["pass","passed","true","yes","correct","1"]
+FAIL = ["fail","failed","false","no","incorrect","0"]
+TOPICS = ["arrays","loops","recursion","graphs","trees","dp","ml","ai","math","stats"]
+SCHEMA = pa.schema([("learner_id", pa.string()), ("content_id", pa.string()), ("topic", pa.string()),
+                    ("difficulty", pa.float64()), ("time_spent_sec", pa.int64()), ("correct", pa.int64())])
+
+def _seconds(s: pd.Series) -> pd.Series:
+    # numbers are seconds already; anything else is tried as a duration ("00:05:00", "5 min")
+    v = pd.to_numeric(s, errors="coerce")
+    text = v.isna() & s.notna()
+    if text.any():
+        v[text] = pd.to_timedelta(s[text], errors="coerce").dt.total_seconds()
+    return v
+
+class FileStats:
+    """Whole-file counters behind the per-file scaling decisions."""
+    def __init__(self):
+        self.rows = 0; self.diff_nn = 0; self.diff_min = np.inf; self.diff_max = -np.inf; self.time_nn = 0
+        self.corr_text = 0; self.corr_pass = 0; self.corr_fail = 0; self.corr_nn = 0; self.corr_max = -np.inf
+
+    def update(self, chunk: pd.DataFrame, m: dict):
+        self.rows += len(chunk)
+        if "difficulty" in m:
+            d = pd.to_numeric(chunk[m["difficulty"]], errors="coerce")
+            self.diff_nn += int(d.notna().sum())
+            self.diff_min = min(self.diff_min, float(d.min(skipna=True)) if d.notna().any() else np.inf)
+            self.diff_max = max(self.diff_max, float(d.max(skipna=True)) if d.notna().any() else -np.inf)
+        if "time" in m:
+            self.time_nn += int(_seconds(chunk[m["time"]]).notna().sum())
+        if "correct" in m:
+            s = chunk[m["correct"]]; n = pd.to_numeric(s, errors="coerce")
+            self.corr_text += int((n.isna() & s.notna()).sum())
+            low = s.astype(str).str.lower()
+            self.corr_pass += int(low.isin(PASS).sum()); self.corr_fail += int(low.isin(FAIL).sum())
+            self.corr_nn += int(n.notna().sum())
+            if n.notna().any(): self.corr_max = max(self.corr_max, float(n.max()))
+
+def _events(sample: pd.DataFrame, m: dict, st: FileStats, rng) -> pd.DataFrame:
+    """The events columns for the sampled rows, scaled with the whole-file counters."""
+    n = len(sample); rows = max(st.rows, 1)
+    out = {"learner_id": sample[m["learner"]].astype(str) if "learner" in m else None,
+           "content_id": sample[m["content"]].astype(str) if "content" in m else None,
+           "topic": sample[m["topic"]].astype(str) if "topic" in m else pd.Series(rng.choice(TOPICS, n), index=sample.index)}
+    diff = None
+    if "difficulty" in m and st.diff_nn:
+        d = pd.to_numeric(sample[m["difficulty"]], errors="coerce")
+        if m["difficulty"].lower() in GRADES:
+            mx = st.diff_max
+            diff = (d if mx <= 1.0 else d / 20.0 if mx <= 20 else d / mx).clip(0, 1)
+        else:
+            diff = (d - st.diff_min) / (st.diff_max - st.diff_min)
+    if diff is None or st.diff_nn / rows < 0.3:
+        diff = pd.Series(rng.uniform(0.3, 0.9, n), index=sample.index)
+    out["difficulty"] = diff
+    out["time_spent_sec"] = (_seconds(sample[m["time"]]) if "time" in m and st.time_nn / rows >= 0.3
+                             else pd.Series(rng.integers(60, 1200, n), index=sample.index))
+    corr = None
+    if "correct" in m:
+        s = sample[m["correct"]]
+        if st.corr_text:
+            low = s.astype(str).str.lower()
+            if st.corr_pass / rows > 0.3: corr = low.isin(PASS).astype(int)
+            elif st.corr_fail / rows > 0.3: corr = (~low.isin(FAIL)).astype(int)
+        if corr is None and st.corr_nn:
+            x = pd.to_numeric(s, errors="coerce"); mx = st.corr_max
+            corr = (x >= (0.6 if mx <= 1.0 else 12 if mx <= 20 else 0.6 * mx)).astype(int)
+    out["correct"] = corr if corr is not None else pd.Series(rng.choice([0, 1], n), index=sample.index)
+    return pd.DataFrame(out, index=sample.index)
+
+def _file_seed(seed: int, path: Path) -> list:
+    return [seed, zlib.crc32("/".join(path.parts[-2:]).encode())]
+
+def sample_file(path, per_file: int, chunksize: int, seed: int) -> dict:
+    """One pass over `path`: whole-file counters plus a bottom-k reservoir of `per_file` rows, in file order."""
+    path = Path(path); t0 = time.perf_counter()
+    keys_ss, fill_ss = np.random.SeedSequence(_file_seed(seed, path)).spawn(2)
+    keys_rng = np.random.default_rng(keys_ss)
+    try:
+        header = list(pd.read_csv(path, nrows=0).columns)
+        m = pick_columns(header, ALIASES)
+        usecols = list(dict.fromkeys(m.values())) or header[:1]
+        st = FileStats(); res = None; rows = 0
+        for chunk in pd.read_csv(path, usecols=usecols, dtype=str, chunksize=chunksize, on_bad_lines="skip"):
+            st.update(chunk, m)
+            chunk = chunk.assign(_row=np.arange(rows, rows + len(chunk)), _key=keys_rng.random(len(chunk)))
+            rows += len(chunk)
+            res = chunk if res is None else pd.concat([res, chunk], ignore_index=True)
+            if len(res) > per_file:
+                res = res.iloc[np.argpartition(res["_key"].to_numpy(), per_file - 1)[:per_file]]
+    except (OSError, ValueError, UnicodeDecodeError, pd.errors.ParserError) as e:
+        return {"file": str(path), "rows": 0, "part": None, "error": str(e)}
+    if res is None:
+        return {"file": str(path), "rows": 0, "part": None}
+    res = res.sort_values("_row").set_index("_row")
+    part = _events(res, m, st, np.random.default_rng(fill_ss))
+    part["_row"] = part.index.to_numpy()
+    return {"file": str(path), "rows": rows, "part": part.reset_index(drop=True),
+            "generated": [c for c in ("learner", "content") if c not in m], "seconds": round(time.perf_counter() - t0, 3)}
+
+def clean(mix: pd.DataFrame) -> pd.DataFrame:
+    mix["learner_id"] = mix["learner_id"].str.strip().replace("", np.nan).fillna("L00000")
+    mix["content_id"] = mix["content_id"].str.strip().replace("", np.nan).fillna("C00000")
+    mix["topic"] = mix["topic"].str.strip().replace("", "general")
+    mix["difficulty"] = pd.to_numeric(mix["difficulty"], errors="coerce").fillna(0.5).clip(0, 1)
+    mix["time_spent_sec"] = pd.to_numeric(mix["time_spent_sec"], errors="coerce").fillna(300).clip(lower=1).astype(np.int64)
+    mix["correct"] = pd.to_numeric(mix["correct"], errors="coerce").fillna(0).clip(0, 1).astype(np.int64)
+    return mix[SCHEMA.names]
+
+def synthetic(n: int, rng) -> pd.DataFrame:
+    return pd.DataFrame({"learner_id": rng.choice([f"L{i:03d}" for i in range(1, 201)], n),
+                         "content_id": rng.choice([f"C{i:03d}" for i in range(1, 101)], n),
+                         "topic": rng.choice(TOPICS, n), "difficulty": rng.uniform(0.3, 0.9, n).round(2),
+                         "time_spent_sec": rng.integers(60, 1201, n), "correct": rng.choice([0, 1], n)})
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--src", nargs="+", default=SOURCES, help="directories searched recursively for *.csv")
+    ap.add_argument("--out", default="data/cleaned/learner_events.parquet")
+    ap.add_argument("--csv_out", default="data/cleaned/learner_events.csv", help="'' to skip the CSV copy")
+    ap.add_argument("--per_file", type=int, default=20000)
+    ap.add_argument("--min_rows", type=int, default=3000, help="top up with synthetic events below this")
+    ap.add_argument("--chunksize", type=int, default=200000)
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args()
+    files = sorted(f for d in map(Path, args.src) if d.exists() for f in d.rglob("*.csv"))
+    out = Path(args.out); out.parent.mkdir(parents=True, exist_ok=True)
+    writer = pq.ParquetWriter(out, SCHEMA)
+    csv = open(args.csv_out, "w", newline="") if args.csv_out else None
+    total = 0; base = {"learner": 1, "content": 1}; report = []
+
+    def write(part):
+        nonlocal total
+        part = clean(part)
+        writer.write_table(pa.Table.from_pandas(part, schema=SCHEMA, preserve_index=False))  # one row group per file
+        if csv: part.to_csv(csv, index=False, header=total == 0)
+        total += len(part)
+
+    pool = ProcessPoolExecutor(max_workers=args.workers) if args.workers > 1 else None
+    try:
+        n = len(files)
+        # results arrive in file order whatever the worker count; each is written as soon as it is next in line
+        for r in (pool.map if pool else map)(sample_file, files, [args.per_file] * n, [args.chunksize] * n, [args.seed] * n):
+            report.append({k: v for k, v in r.items() if k != "part"})
+            part = r["part"]
+            if part is None or not len(part):
+                continue
+            for c in r["generated"]:  # ids keep counting across files, as if every file were read in full
+                part[f"{c}_id"] = [f"{c[0].upper()}{base[c] + i:05d}" for i in part["_row"]]
+                base[c] += r["rows"]
+            write(part)
+        if total < args.min_rows:
+            write(synthetic(args.min_rows - total, np.random.default_rng([args.seed, 1])))
+    finally:
+        writer.close()
+        if csv: csv.close()
+        if pool: pool.shutdown()
+    for r in report:
+        if r.get("error"): print(f"[skip] {r['file']}: {r['error']}")
+    print(total)
+
+if __name__ == "__main__":
+    main()
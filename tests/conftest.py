@@ -0,0 +1,44 @@
+import inspect
+from dataclasses import replace
+from pathlib import Path
+import numpy as np, pandas as pd, pytest
+from utils.iom.clustering import Clusterer
+from utils.iom.config import AppConfig
+
+KNOWLEDGE = Path(__file__).resolve().parents[1] / "data" / "knowledge"
+
+def learners(n: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({"learner_id": [f"L{i:05d}" for i in range(n)],
+                         "time_spent": rng.uniform(0, 90, n).round(1), "avg_score": rng.uniform(0, 1, n).round(4),
+                         "accuracy": rng.uniform(0, 1, n).round(4), "difficulty_level": rng.integers(0, 3, n),
+                         "topic_progress": rng.uniform(0, 1, n).round(4)})
+
+@pytest.fixture
+def cfg(tmp_path) -> AppConfig:
+    return AppConfig(raw=tmp_path / "raw", processed=tmp_path / "processed", knowledge=KNOWLEDGE,
+                     artifacts=tmp_path / "models", reports=tmp_path / "reports", n_clusters=3, random_state=42,
+                     numeric=["time_spent", "avg_score", "accuracy", "topic_progress"], categorical=["difficulty_level"],
+                     difficulty_map={"beginner": 0, "intermediate": 1, "advanced": 2},
+                     feature_cache_dir=tmp_path / "cache", profiles_dir=tmp_path / "reports" / "profiles")
+
+@pytest.fixture
+def make_learners():
+    return learners
+
+@pytest.fixture
+def mongo_cfg(cfg, tmp_path, monkeypatch) -> AppConfig:
+    """cfg on an in-process mongomock database of its own."""
+    pytest.importorskip("mongomock")
+    from mongomock.collection import BulkOperationBuilder as B
+    for name in ("add_update", "add_replace"):  # pymongo >= 4.11 passes sort= to bulk ops, mongomock 4.3 does not take it
+        fn = getattr(B, name)
+        if "sort" not in inspect.signature(fn).parameters:
+            monkeypatch.setattr(B, name, lambda self, *a, sort=None, _fn=fn, **kw: _fn(self, *a, **kw))
+    return replace(cfg, mongo_backend="mongomock", mongo_db=f"test_{tmp_path.name}")
+
+@pytest.fixture
+def fitted(cfg) -> AppConfig:
+    """cfg with a small KMeans fitted on synthetic learners and published."""
+    Clusterer(cfg).fit(learners(300))
+    return cfg
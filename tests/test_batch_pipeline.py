@@ -0,0 +1,43 @@
+import time
+from dataclasses import replace
+import numpy as np, pandas as pd, pyarrow.parquet as pq
+from utils.iom.batch_pipeline import BatchJobs, run_batch
+from utils.iom.sinks import ParquetSink
+
+def test_parquet_sink_schema_is_stable_across_chunks(tmp_path):
+    sink = ParquetSink(tmp_path / "out.parquet")
+    sink.write(pd.DataFrame({"learner_id": ["a1", "a2"], "note": [np.nan, np.nan], "n": [1, 2]}))
+    sink.write(pd.DataFrame({"learner_id": [3, 4], "note": ["late", None], "n": [3.0, np.nan]}))
+    sink.close()
+    out = pq.read_table(tmp_path / "out.parquet").to_pandas()
+    assert out["learner_id"].tolist() == ["a1", "a2", "3", "4"]
+    assert out["note"].tolist()[2] == "late" and out["note"].isna().sum() == 3
+    assert out["n"].tolist()[:3] == [1, 2, 3] and pd.isna(out["n"].iloc[3])
+
+def test_run_batch_parquet_with_mixed_id_chunks(fitted, make_learners, tmp_path):
+    df = make_learners(60)
+    df.loc[30:, "learner_id"] = [str(i) for i in range(30)]  # later chunks look numeric
+    df["comment"] = [None] * 30 + ["x"] * 30                 # all empty in the first chunk
+    df.to_csv(tmp_path / "in.csv", index=False)
+    res = run_batch(fitted, tmp_path / "in.csv", tmp_path / "out.parquet", chunksize=10, workers=1, fmt="parquet")
+    out = pd.read_parquet(tmp_path / "out.parquet")
+    assert res["rows_done"] == 60 and len(out) == 60
+    assert out["learner_id"].tolist() == df["learner_id"].tolist()
+    assert out["comment"].tolist()[30:] == ["x"] * 30
+
+def _wait(jobs, ids, timeout=60):
+    t0 = time.time()
+    while any(jobs.status(i)["state"] in ("queued", "running") for i in ids):
+        assert time.time() - t0 < timeout
+        time.sleep(0.05)
+
+def test_batch_jobs_bounded_and_pruned(fitted, make_learners, tmp_path):
+    make_learners(50).to_csv(tmp_path / "in.csv", index=False)
+    jobs = BatchJobs(replace(fitted, batch_max_jobs=1, batch_workers=1, batch_job_ttl_seconds=0.2))
+    ids = [jobs.submit(tmp_path / "in.csv", tmp_path / f"out{i}.csv") for i in range(3)]
+    _wait(jobs, ids)
+    runs = sorted((jobs.status(i)["started_at"], jobs.status(i)["finished_at"]) for i in ids)
+    assert all(jobs.status(i)["state"] == "done" for i in ids)
+    assert all(b[0] >= a[1] for a, b in zip(runs, runs[1:]))  # one at a time
+    time.sleep(0.3)
+    assert all(jobs.status(i) is None for i in ids)
@@ -0,0 +1,28 @@
+import sys
+import numpy as np, pandas as pd
+from scripts import build_learner_events as ble
+
+def _sources(root):
+    rng = np.random.default_rng(7); (root / "raw").mkdir(parents=True); (root / "iom_datasets").mkdir()
+    n = 4000
+    pd.DataFrame({"student_id": rng.integers(0, 300, n), "course": rng.choice(["AAA", "BBB"], n),
+                  "G3": rng.integers(0, 21, n), "final_result": rng.choice(["Pass", "Fail"], n),
+                  "studytime": rng.integers(10, 900, n)}).to_csv(root / "raw" / "oulad.csv", index=False)
+    pd.DataFrame({"score": rng.uniform(0, 100, 2500).round(1), "level": rng.integers(1, 4, 2500)}).to_csv(
+        root / "iom_datasets" / "anon.csv", index=False)  # no learner or content column: ids are generated
+    return [str(root / "raw"), str(root / "iom_datasets")]
+
+def _build(monkeypatch, src, out, *extra):
+    monkeypatch.setattr(sys, "argv", ["build_learner_events", "--src", *src, "--out", str(out / "events.parquet"),
+                                      "--csv_out", str(out / "events.csv"), "--per_file", "1500", *extra])
+    ble.main()
+    return pd.read_parquet(out / "events.parquet"), (out / "events.csv").read_bytes()
+
+def test_same_seed_gives_identical_output(monkeypatch, tmp_path):
+    src = _sources(tmp_path / "src")
+    one, one_csv = _build(monkeypatch, src, tmp_path / "a", "--workers", "1", "--chunksize", "100000")
+    many, many_csv = _build(monkeypatch, src, tmp_path / "b", "--workers", "2", "--chunksize", "333")
+    assert len(one) == 3000 and one_csv == many_csv
+    pd.testing.assert_frame_equal(one, many)
+    other, _ = _build(monkeypatch, src, tmp_path / "c", "--seed", "7")
+    assert not one.equals(other)
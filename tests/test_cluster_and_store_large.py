@@ -0,0 +1,36 @@
+import sys
+import numpy as np, pandas as pd, pytest
+from utils.iom import cluster_and_store_large as large
+from utils.iom.clustering import Clusterer
+from utils.iom.mongo import learners as learners_coll
+from utils.iom.profile_store import ProfileStore
+
+def _run(cfg, monkeypatch, csv, *extra):
+    monkeypatch.setattr(large.AppConfig, "load", staticmethod(lambda: cfg))
+    monkeypatch.setattr(sys, "argv", ["cluster_and_store_large", "--csv", str(csv), "--chunksize", "300",
+                                      "--sample_for_gmm", "500", *extra])
+    large.main()
+    return pd.read_csv(cfg.reports / "learner_clusters.csv")
+
+def test_reservoir_keeps_a_uniform_sample():
+    r = large.Reservoir(100, np.random.default_rng(0)); X = np.arange(10000, dtype=float)[:, None]
+    for part in np.array_split(X, 37):
+        r.add(part)
+    assert r.rows.shape == (100, 1) and len(np.unique(r.rows)) == 100
+    assert 3000 < r.rows.mean() < 7000
+
+@pytest.mark.parametrize("predict_workers", ["1", "2"])
+def test_end_to_end(mongo_cfg, make_learners, monkeypatch, tmp_path, predict_workers):
+    df = make_learners(2000, seed=6); df.to_csv(tmp_path / "in.csv", index=False)
+    out = _run(mongo_cfg, monkeypatch, tmp_path / "in.csv", "--predict_workers", predict_workers)
+    assert out["learner_id"].tolist() == df["learner_id"].tolist()
+    assert out["cluster_kmeans"].tolist() == Clusterer(mongo_cfg).predict(df).tolist()  # published model = assignments
+    assert out["gmm_confidence"].between(0, 1).all() and set(out["cluster_gmm"]) <= {0, 1, 2}
+    assert learners_coll(mongo_cfg).count_documents({}) == 2000
+    assert len(ProfileStore(mongo_cfg.profiles_dir)) == 2000
+
+def test_empty_input_writes_an_empty_result(mongo_cfg, make_learners, monkeypatch, tmp_path):
+    make_learners(0).to_csv(tmp_path / "in.csv", index=False)
+    out = _run(mongo_cfg, monkeypatch, tmp_path / "in.csv", "--predict_workers", "2")
+    assert len(out) == 0 and "cluster_kmeans" in out.columns
+    assert len(ProfileStore(mongo_cfg.profiles_dir)) == 0
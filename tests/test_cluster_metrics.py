@@ -0,0 +1,27 @@
+import numpy as np, pytest
+from sklearn.cluster import KMeans
+from sklearn.datasets import make_blobs
+from sklearn.metrics import calinski_harabasz_score, davies_bouldin_score, silhouette_samples, silhouette_score
+from utils.iom.cluster_metrics import evaluate
+
+@pytest.fixture(scope="module")
+def blobs():
+    X, _ = make_blobs(3000, n_features=4, centers=3, cluster_std=2.5, random_state=0)
+    return X, KMeans(3, n_init=3, random_state=0).fit(X)
+
+def test_chunked_metrics_match_sklearn(blobs):
+    X, km = blobs; labels = km.predict(X)
+    out = evaluate(km, X, sample=3 * len(X), chunk=256, workers=3)
+    assert out["cluster_sizes"] == np.bincount(labels).tolist()
+    assert out["calinski_harabasz"] == pytest.approx(calinski_harabasz_score(X, labels), rel=1e-9)
+    assert out["davies_bouldin"] == pytest.approx(davies_bouldin_score(X, labels), rel=1e-9)
+    assert out["silhouette"] == pytest.approx(silhouette_score(X, labels), abs=1e-5)  # every row is sampled
+    per = silhouette_samples(X, labels)
+    assert out["silhouette_per_cluster"] == pytest.approx({c: per[labels == c].mean() for c in range(3)}, abs=1e-5)
+
+def test_sampled_silhouette_stays_inside_its_ci(blobs):
+    X, km = blobs; exact = silhouette_score(X, km.predict(X))
+    for seed in range(3):
+        out = evaluate(km, X, sample=600, chunk=500, silhouette="sampled", seed=seed)
+        lo, hi = out["silhouette_ci95"]
+        assert out["silhouette_sample_size"] == 600 and lo < exact < hi and hi - lo < 0.1
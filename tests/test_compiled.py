@@ -0,0 +1,32 @@
+from dataclasses import replace
+import numpy as np, pytest, scipy.sparse as sp
+from sklearn.mixture import GaussianMixture
+from utils.iom.clustering import Clusterer, CompiledGMM
+from utils.iom.recommend import Recommender
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_compiled_assignments_match_sklearn(cfg, make_learners, compact):
+    cfg = replace(cfg, compact_features=compact)
+    Clusterer(cfg).fit(make_learners(300))
+    df = make_learners(2000, seed=7)
+    c = Clusterer(cfg)
+    expected = c.predict(df)
+    assert np.array_equal(c.compile().predict(df), expected)
+    assert np.array_equal(c.compile().predict(df.to_dict("records")), expected)  # request payloads
+
+def test_compiled_serving_path(fitted, make_learners):
+    rows = make_learners(200, seed=3).to_dict("records")
+    assert (Recommender(replace(fitted, compiled_inference=True)).predict_clusters(rows)
+            == Recommender(fitted).predict_clusters(rows))
+
+@pytest.mark.parametrize("covariance_type", ["full", "tied", "diag", "spherical"])
+def test_compiled_gmm_matches_predict_proba(covariance_type):
+    rng = np.random.default_rng(0)
+    X = np.vstack([rng.normal(m, s, (300, 5)) for m, s in ((0, 1), (2, 0.5), (-1, 2))])
+    X[rng.random(X.shape) < 0.3] = 0.0  # one-hot-like zeros for the sparse case
+    gmm = GaussianMixture(3, covariance_type=covariance_type, random_state=0).fit(X)
+    compiled = CompiledGMM(gmm, chunk_rows=97)
+    assert np.allclose(compiled.predict_proba(X), gmm.predict_proba(X), rtol=0, atol=1e-10)
+    X32 = X.astype(np.float32); expected = gmm.predict_proba(X32.astype(np.float64))
+    assert np.allclose(compiled.predict_proba(X32), expected, rtol=0, atol=1e-10)
+    assert np.allclose(compiled.predict_proba(sp.csr_matrix(X32)), expected, rtol=0, atol=1e-10)
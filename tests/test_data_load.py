@@ -0,0 +1,36 @@
+import pandas as pd, pyarrow as pa, pytest
+from utils.iom.data_load import column_names, count_rows, iter_chunks, load_dataframe
+
+FILTERS = [("__source_file", "in", ["a.csv"]), ("accuracy", ">=", 0.5)]
+
+@pytest.fixture
+def hive(make_learners, tmp_path):
+    df = make_learners(400).assign(__source_file=["a.csv"] * 250 + ["b.csv"] * 150)
+    root = tmp_path / "master_core"
+    for src, part in df.groupby("__source_file"):
+        (root / f"__source_file={src}").mkdir(parents=True)
+        part.drop(columns="__source_file").to_parquet(root / f"__source_file={src}" / "part-0.parquet", index=False, row_group_size=50)
+    df.to_csv(tmp_path / "master_core.csv", index=False)
+    return df, root
+
+def test_partition_column_is_restored(hive):
+    df, root = hive
+    assert set(column_names(root)) == set(df.columns)
+    assert load_dataframe(None, root)["__source_file"].value_counts().to_dict() == {"a.csv": 250, "b.csv": 150}
+
+def test_filters_and_columns_are_pushed_down(hive, tmp_path):
+    df, root = hive
+    (root / "__source_file=b.csv" / "part-0.parquet").write_bytes(b"not parquet")  # a pruned partition is never opened
+    with pytest.raises(pa.ArrowInvalid):  # without the partition filter it is
+        load_dataframe(None, root, filters=FILTERS[1:])
+    cols = ["learner_id", "accuracy"]
+    got = load_dataframe(None, root, columns=cols, filters=FILTERS)
+    want = df[(df["__source_file"] == "a.csv") & (df["accuracy"] >= 0.5)][cols].reset_index(drop=True)
+    assert list(got.columns) == cols
+    pd.testing.assert_frame_equal(got, want)
+    assert count_rows(root, FILTERS) == len(want)
+    chunks = list(iter_chunks(root, 40, columns=cols, filters=FILTERS))
+    assert max(map(len, chunks)) <= 40
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), want)
+    csv = load_dataframe(None, tmp_path / "master_core.csv", columns=cols, filters=FILTERS)  # same filters in pandas
+    pd.testing.assert_frame_equal(csv.reset_index(drop=True), want)
@@ -0,0 +1,11 @@
+from dataclasses import replace
+import numpy as np
+from utils.iom.feature_cache import get_cache, load_features
+
+def test_compact_and_dense_features_are_cached_apart(fitted, make_learners, tmp_path):
+    src = tmp_path / "in.csv"; make_learners(500, seed=5).to_csv(src, index=False)
+    dense = np.array(load_features(fitted, src))
+    compact = np.array(load_features(replace(fitted, compact_features=True), src))
+    assert len(get_cache(fitted).entries()) == 2
+    assert np.allclose(compact, dense, atol=1e-6)
+    assert np.array_equal(np.array(load_features(fitted, src)), dense)  # hit on the dense entry
@@ -0,0 +1,18 @@
+from dataclasses import replace
+import numpy as np
+from utils.iom.features import FeatureBuilder, dense32
+
+def test_streamed_fit_matches_full_fit(cfg, make_learners, tmp_path):
+    df = make_learners(1000, seed=4).sort_values("difficulty_level", kind="stable").reset_index(drop=True)
+    assert set(df["difficulty_level"][:300]) == {0}  # levels 1 and 2 first show up in later chunks
+    full = FeatureBuilder(replace(cfg, artifacts=tmp_path / "full")).fit(df).named_steps["pre"]
+    fb = FeatureBuilder(replace(cfg, artifacts=tmp_path / "streamed"))
+    for chunk in np.array_split(np.arange(len(df)), 7):
+        fb.partial_fit(df.iloc[chunk])
+    streamed = fb.finish_fit().named_steps["pre"]
+    a, b = full.named_transformers_["num"], streamed.named_transformers_["num"]
+    assert np.allclose(a.mean_, b.mean_) and np.allclose(a.scale_, b.scale_)
+    assert [c.tolist() for c in full.named_transformers_["cat"].categories_] == \
+           [c.tolist() for c in streamed.named_transformers_["cat"].categories_]
+    X = df[cfg.numeric + cfg.categorical]
+    assert np.allclose(dense32(full.transform(X)), dense32(streamed.transform(X)), atol=1e-6)
@@ -0,0 +1,42 @@
+import sys
+import numpy as np, pytest
+from utils.iom import mongo_upsert_from_csv as upsert
+from utils.iom.fingerprints import FingerprintIndex, row_fingerprints
+from utils.iom.mongo import learners
+
+class _Failing:
+    def __init__(self, coll): self._coll = coll
+    def __getattr__(self, name): return getattr(self._coll, name)
+    def bulk_write(self, ops, ordered=True): raise ConnectionError("write failed")
+
+def _upsert(cfg, monkeypatch, csv, index, coll=None, *extra):
+    coll = coll or learners(cfg)
+    monkeypatch.setattr(upsert.AppConfig, "load", staticmethod(lambda: cfg))
+    monkeypatch.setattr(upsert, "learners", lambda *a: coll)
+    monkeypatch.setattr(sys, "argv", ["mongo_upsert_from_csv", "--csv", str(csv), "--incremental", "--index", str(index),
+                                      "--chunksize", "40", *extra])
+    upsert.main()
+
+def test_index_skips_unchanged_rows(make_learners, tmp_path):
+    df = make_learners(100)
+    idx = FingerprintIndex(tmp_path / "fp.npz")
+    assert idx.changed(df["learner_id"].to_numpy(), row_fingerprints(df)).all()
+    idx.commit()
+    df.loc[[3, 7], "accuracy"] = 0.123
+    again = FingerprintIndex(tmp_path / "fp.npz")
+    ids = df["learner_id"].to_numpy()[:60]
+    assert np.flatnonzero(again.changed(ids, row_fingerprints(df.iloc[:60]))).tolist() == [3, 7]
+    assert again.missing().tolist() == df["learner_id"].tolist()[60:]
+    again.commit(drop_missing=True)
+    assert len(FingerprintIndex(tmp_path / "fp.npz")) == 60
+
+def test_incremental_upsert_sends_changes_and_commits_only_on_success(mongo_cfg, make_learners, monkeypatch, tmp_path, capsys):
+    df = make_learners(100); df.to_csv(tmp_path / "in.csv", index=False); index = tmp_path / "fp.npz"
+    _upsert(mongo_cfg, monkeypatch, tmp_path / "in.csv", index)
+    assert "upserted 100 of 100" in capsys.readouterr().out
+    df.loc[5, "avg_score"] = 0.5; df.to_csv(tmp_path / "in.csv", index=False)
+    with pytest.raises(RuntimeError, match="write failed"):
+        _upsert(mongo_cfg, monkeypatch, tmp_path / "in.csv", index, _Failing(learners(mongo_cfg)))
+    _upsert(mongo_cfg, monkeypatch, tmp_path / "in.csv", index)  # the failed row is sent again
+    assert "upserted 1 of 100" in capsys.readouterr().out
+    assert learners(mongo_cfg).find_one({"learner_id": "L00005"})["avg_score"] == 0.5
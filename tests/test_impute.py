@@ -0,0 +1,34 @@
+import numpy as np, pandas as pd, pytest
+from iom_impute import ColumnStats
+from iom_ingest import ingest
+
+def _raw(tmp_path):
+    raw = tmp_path / "raw"; raw.mkdir(); rng = np.random.default_rng(0)
+    for f, n in (("a.csv", 2500), ("b.csv", 1700)):
+        df = pd.DataFrame({"Score": rng.normal(60, 15, n).round(2), "Level": rng.choice(["low", "mid", "high"], n),
+                           "Attempts": rng.integers(0, 9, n).astype(float)})
+        for c in df.columns:
+            df.loc[rng.random(n) < 0.2, c] = np.nan
+        df.to_csv(raw / f, index=False)
+    return raw
+
+@pytest.mark.parametrize("make_synth", [False, True])
+def test_output_independent_of_workers_and_chunksize(tmp_path, make_synth):
+    raw = _raw(tmp_path); outs = []
+    for i, (workers, chunksize) in enumerate([(1, 100000), (4, 300), (4, 977), (2, 64)]):
+        res = ingest(raw, tmp_path / f"out{i}", workers=workers, chunksize=chunksize, make_synth=make_synth)
+        outs.append((res["md5"], (tmp_path / f"out{i}" / "master_full.csv").read_bytes()))
+    assert all(o == outs[0] for o in outs[1:])
+    assert pd.read_csv(tmp_path / "out0" / "master_full.csv")[["score", "level", "attempts"]].notna().all().all()
+
+def test_median_and_mode_exact():
+    rng = np.random.default_rng(1)
+    num = pd.Series(np.where(rng.random(1001) < 0.1, np.nan, rng.integers(0, 50, 1001).astype(float)))
+    txt = pd.Series(rng.choice(["b", "a", "c", None], 999, p=[0.3, 0.3, 0.2, 0.2]))
+    for values, kind in ((num, "numeric"), (num.iloc[:-1], "numeric"), (txt, "string")):
+        merged = ColumnStats(kind)
+        for part in np.array_split(np.arange(len(values)), 3):  # per-worker counters, merged
+            s = ColumnStats(kind); s.update(values.iloc[part]); merged.merge(s)
+        if kind == "numeric":
+            assert merged.median() == values.median()
+        assert merged.mode() == values.mode().iloc[0]
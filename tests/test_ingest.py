@@ -0,0 +1,20 @@
+import numpy as np, pandas as pd
+from iom_ingest import ingest
+
+def _raw(tmp_path, n=12000):
+    raw = tmp_path / "raw"; raw.mkdir()
+    score = (np.arange(n) / n).round(6).astype(object)
+    score[11000] = "oops"  # past the sniff sample: the file looks numeric
+    pd.DataFrame({"LearnerId": [f"L{i}" for i in range(n)], "Score": score}).to_csv(raw / "a.csv", index=False)
+    return raw
+
+def test_one_bad_token_keeps_a_numeric_column_as_text(tmp_path):
+    res = ingest(_raw(tmp_path), tmp_path / "out", workers=1, chunksize=5000)
+    assert res["kinds"]["score"] == "string" and res["widened"] == {"score": round(1 / 12000, 6)}
+    out = pd.read_csv(tmp_path / "out" / "master_full.csv", dtype=str)
+    assert out["score"].iloc[11000] == "oops" and out["score"].notna().all()
+
+def test_dropping_values_is_opt_in_and_counted(tmp_path):
+    res = ingest(_raw(tmp_path), tmp_path / "out", workers=1, chunksize=5000, max_coerced=0.01)
+    assert res["kinds"]["score"] == "numeric" and res["widened"] == {}
+    assert res["coerced"] == {"score": 1}
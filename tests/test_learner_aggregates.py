@@ -0,0 +1,40 @@
+import numpy as np, pandas as pd
+from utils.iom.learner_aggregates import AggregateStore
+
+def _events(n, seed, ids):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"learner_id": rng.choice(ids, n), "correct": rng.integers(0, 2, n).astype(float),
+                       "time_spent_sec": rng.integers(60, 1200, n), "difficulty": rng.uniform(0, 1, n).round(3)})
+    df.loc[rng.random(n) < 0.1, "difficulty"] = np.nan
+    return df
+
+def _baseline(*parts):
+    # scripts/train_task_2_1_profile.py before the store: one groupby over every event
+    df = pd.concat(parts, ignore_index=True)
+    return df.groupby("learner_id").agg(accuracy_mean=("correct", "mean"), time_spent_mean=("time_spent_sec", "mean"),
+                                        difficulty_mean=("difficulty", "mean")).fillna(0.0)
+
+def test_incremental_store_matches_groupby_and_rebuilds_on_change(tmp_path):
+    ids = [f"L{i:03d}" for i in range(80)]
+    base, new = _events(3000, 0, ids), _events(500, 1, ids + ["L999"])
+    base.loc[base["learner_id"] == "L007", "difficulty"] = np.nan  # no value at all -> 0, like fillna
+    base.to_parquet(tmp_path / "events.parquet", index=False); new.to_csv(tmp_path / "b1.csv", index=False)
+    store = AggregateStore()
+    assert store.ingest([tmp_path / "events.parquet"], chunksize=700)["status"] == "incremental"
+    store.save(tmp_path / "agg.npz")
+    store = AggregateStore.load(tmp_path / "agg.npz")
+    info = store.ingest([tmp_path / "events.parquet", tmp_path / "b1.csv"])
+    assert info == {"status": "incremental", "new_rows": 500, "learners": 81}
+    pd.testing.assert_frame_equal(store.features(), _baseline(base, new))
+    changed = _events(200, 2, ids); changed.to_csv(tmp_path / "b1.csv", index=False)
+    info = store.ingest([tmp_path / "events.parquet", tmp_path / "b1.csv"])
+    assert info == {"status": "rebuilt", "new_rows": 3200, "learners": 80}
+    pd.testing.assert_frame_equal(store.features(), _baseline(base, changed))
+
+def test_numeric_ids_keep_the_groupby_order(tmp_path):
+    events = _events(1000, 3, [2, 10, 1, 33, 100])
+    events.to_csv(tmp_path / "b.csv", index=False)
+    store = AggregateStore(); store.ingest([tmp_path / "b.csv"])
+    got = store.features()
+    assert got.index.tolist() == [1, 2, 10, 33, 100]
+    pd.testing.assert_frame_equal(got, _baseline(events))
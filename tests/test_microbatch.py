@@ -0,0 +1,24 @@
+import asyncio
+from utils.iom.microbatch import MicroBatcher
+
+def _run(batcher, rows):
+    async def go():
+        try:
+            return await asyncio.gather(*(batcher.submit(r) for r in rows), return_exceptions=True)
+        finally:
+            await batcher.close()
+    return asyncio.run(go())
+
+def test_failed_batch_falls_back_to_rows():
+    def predict(rows):
+        if any(r["x"] < 0 for r in rows): raise ValueError("bad row")
+        return [r["x"] * 2 for r in rows]
+    mb = MicroBatcher(predict, window_ms=50, max_batch=8)
+    out = _run(mb, [{"x": i} for i in (1, -1, 3)])
+    assert out[0] == 2 and out[2] == 6 and isinstance(out[1], ValueError)
+    assert mb.metrics()["fallbacks"] == 1 and mb.metrics()["errors"] == 1
+
+def test_short_result_fails_the_remaining_rows():
+    mb = MicroBatcher(lambda rows: [0] * (len(rows) - 1), window_ms=50, max_batch=8)
+    out = _run(mb, [{"x": i} for i in range(3)])
+    assert out[:2] == [0, 0] and isinstance(out[2], RuntimeError)
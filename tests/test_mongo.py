@@ -0,0 +1,45 @@
+import asyncio, threading
+import pymongo
+from utils.iom import mongo
+from utils.iom.mongo import _ThreadedClient, async_learners, close_async_clients, get_async_client, learners
+
+def test_one_async_client_per_event_loop(mongo_cfg):
+    async def clients():
+        a, b = get_async_client(cfg=mongo_cfg), get_async_client(cfg=mongo_cfg)
+        loop = asyncio.get_running_loop()
+        assert a is b and a in mongo._ASYNC[loop].values()
+        await close_async_clients()
+        assert loop not in mongo._ASYNC and get_async_client(cfg=mongo_cfg) is not a  # a closed client is not reused
+        return a
+    first, second = asyncio.run(clients()), asyncio.run(clients())
+    assert first is not second and isinstance(first, _ThreadedClient)
+
+def test_threaded_fallback_runs_off_the_loop(mongo_cfg):
+    sync = learners(mongo_cfg); threads = []
+    orig = sync.find_one_and_update
+    def spy(*a, **kw):
+        threads.append(threading.get_ident()); return orig(*a, **kw)
+    async def run():
+        coll = async_learners(mongo_cfg)
+        coll._coll.find_one_and_update = spy
+        await coll.insert_many([{"learner_id": f"L{i}", "n": i} for i in range(5)])
+        doc = await coll.find_one_and_update({"learner_id": "L3"}, {"$set": {"n": 30}}, projection={"_id": 0},
+                                             return_document=True)
+        found = await coll.find({"n": {"$gte": 2}}, {"_id": 0}).to_list(None)
+        return doc, found, await coll.count_documents({}), threading.get_ident()
+    doc, found, n, loop_thread = asyncio.run(run())
+    assert doc == {"learner_id": "L3", "n": 30} and n == 5 and len(found) == 3
+    assert threads and loop_thread not in threads
+    assert sync.find_one({"learner_id": "L3"})["n"] == 30  # the same pooled sync collection underneath
+
+def test_pymongo_without_the_async_driver_falls_back(monkeypatch):
+    uri, opts = "mongodb://127.0.0.1:27017", (("connectTimeoutMS", 50),)
+    if hasattr(pymongo, "AsyncMongoClient"):
+        client = mongo._async_client("pymongo", uri, opts)  # connects lazily
+        assert isinstance(client, pymongo.AsyncMongoClient)
+        asyncio.run(client.close())
+        monkeypatch.delattr(pymongo, "AsyncMongoClient")
+    pooled = object()
+    monkeypatch.setattr(mongo, "_sync_client", lambda *key: pooled if key == ("pymongo", uri, opts) else None)
+    client = mongo._async_client("pymongo", uri, opts)
+    assert isinstance(client, _ThreadedClient) and client._client is pooled
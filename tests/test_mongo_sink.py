@@ -0,0 +1,46 @@
+import random, time
+import pandas as pd
+from utils.iom.mongo import learners
+from utils.iom.mongo_sink import MongoSink
+
+def _docs(coll) -> dict:
+    return {d["learner_id"]: d for d in coll.find({}, {"_id": 0})}
+
+def test_upserts_cast_and_fill(mongo_cfg, make_learners):
+    coll = learners(mongo_cfg)
+    df = make_learners(50).assign(cluster_kmeans=1)
+    with MongoSink(coll, batch_size=7) as sink:
+        sink.write(df)
+    docs = _docs(coll)
+    assert len(docs) == 50
+    d = docs["L00003"]
+    assert d["accuracy"] == df.loc[3, "accuracy"] and d["cluster_kmeans"] == 1 and d["cluster_gmm"] == 0
+
+class _Slow:
+    """bulk_write with network-like jitter, so batches in flight on different threads can overtake each other."""
+    def __init__(self, coll):
+        self.coll = coll; self.rng = random.Random(0)
+
+    def bulk_write(self, ops, **kw):
+        time.sleep(self.rng.uniform(0, 0.003))
+        return self.coll.bulk_write(ops, **kw)
+
+def test_last_write_of_a_key_wins(mongo_cfg):
+    coll = learners(mongo_cfg)
+    coll.create_index("learner_id", unique=True)  # concurrent upserts of one new key would raise E11000
+    ids = [f"L{i % 20}" for i in range(400)]
+    with MongoSink(_Slow(coll), batch_size=3, workers=4, fill_missing=False) as sink:
+        for part in range(0, 400, 100):  # every key in every write, several times per write
+            sink.write(pd.DataFrame({"learner_id": ids[part:part + 100], "cluster_kmeans": range(part, part + 100)}))
+    docs = _docs(coll)
+    assert len(docs) == 20
+    assert all(docs[f"L{k}"]["cluster_kmeans"] == 380 + k for k in range(20))
+
+def test_fill_missing_false_keeps_other_fields(mongo_cfg):
+    coll = learners(mongo_cfg)
+    with MongoSink(coll) as sink:
+        sink.write(pd.DataFrame({"learner_id": ["a"], "accuracy": [0.5], "cluster_kmeans": [2]}))
+    with MongoSink(coll, fill_missing=False) as sink:
+        sink.write(pd.DataFrame({"learner_id": ["a"], "cluster_kmeans": [1]}))
+        sink.delete_ids(["nope"])
+    assert _docs(coll)["a"]["accuracy"] == 0.5 and _docs(coll)["a"]["cluster_kmeans"] == 1
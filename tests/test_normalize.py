@@ -0,0 +1,9 @@
+import pandas as pd
+from utils.iom.normalize_and_merge import Normalizer, resolve_columns
+
+def test_fractional_difficulty_rounds_to_the_nearest_level():
+    df = pd.DataFrame({"learner_id": ["a", "b", "c", "d", "e", "f", "g"], "accuracy": [0.5] * 7,
+                       "difficulty_level": ["1.6", "0.4", "Advanced", None, "0.5", "1.5", "2.5"]})
+    out = Normalizer(resolve_columns(df.columns), {})(df)
+    assert out["difficulty_level"].tolist() == [2, 0, 2, 0, 1, 2, 3]  # halves round up, not to even
+    assert out["difficulty_level"].dtype == "int64"
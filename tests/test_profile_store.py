@@ -0,0 +1,53 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from utils.iom.mongo import async_learners, learners
+from utils.iom.profile_store import ProfileService, ProfileStore, build_store
+
+@pytest.fixture
+def store_dir(make_learners, tmp_path):
+    df = make_learners(50)
+    df.loc[50] = df.loc[7].to_dict() | {"accuracy": 0.999}  # a repeated id: the last row wins
+    df.to_csv(tmp_path / "learner_clusters.csv", index=False)
+    build_store(tmp_path / "learner_clusters.csv", tmp_path / "profiles")
+    return tmp_path / "profiles"
+
+def test_lookup_hits_misses_and_repeated_ids(store_dir, make_learners):
+    df = make_learners(50).set_index("learner_id"); store = ProfileStore(store_dir)
+    assert len(store) == 50 and store.meta["rows"] == 50
+    got = store.lookup(["L00003", "nope", "L00007", "L00003", ""])
+    assert list(got) == ["L00003", "L00007"]
+    assert got["L00003"]["avg_score"] == df.loc["L00003", "avg_score"] and got["L00007"]["accuracy"] == 0.999
+    assert store.get("L00049")["time_spent"] == df.loc["L00049", "time_spent"]
+    assert store.get("L00050") is None and store.get("A") is None and store.lookup([]) == {}
+
+def test_writes_are_pinned_until_a_snapshot_reads_past_them(mongo_cfg, store_dir):
+    svc = ProfileService(store_dir, learners(mongo_cfg), cache_size=2, poll_seconds=0, acoll=lambda: async_learners(mongo_cfg))
+    for lid in ("L00001", "L00002", "L00003"):
+        asyncio.run(svc.aupsert(lid, {"accuracy": 0.5}))
+    assert list(svc._pinned) == ["L00002", "L00003"]  # capped at cache_size, oldest write dropped
+    assert svc.get("L00003")["accuracy"] == 0.5 and svc.get("L00001")["accuracy"] != 0.5
+    written = svc._pinned["L00003"][0]
+    build_store(store_dir.parent / "learner_clusters.csv", store_dir, cutoff=written - 60)  # read before the write
+    assert svc.get("L00003")["accuracy"] == 0.5 and len(svc._pinned) == 2
+    build_store(store_dir.parent / "learner_clusters.csv", store_dir, cutoff=written + 1)
+    assert svc.get("L00003")["accuracy"] != 0.5 and len(svc._pinned) == 0
+    asyncio.run(svc.aupsert("N00001", {"accuracy": 0.25}))  # unknown to the snapshot: seeded from nothing
+    svc._pinned.clear()
+    assert svc.get("N00001")["accuracy"] == 0.25 and svc.stats["mongo_hits"] == 1
+
+def test_learner_endpoints(mongo_cfg, store_dir, monkeypatch):
+    from fastapi_app import recommender_app as api
+    svc = ProfileService(store_dir, poll_seconds=0)
+    monkeypatch.setattr(api, "PROFILES", svc)
+    client = TestClient(api.app)
+    assert client.get("/learners/L00004").json()["learner_id"] == "L00004"
+    assert client.get("/learners/nope").status_code == 404
+    res = client.post("/learners/lookup", json={"ids": ["L00001", "nope", "L00001"]}).json()
+    assert list(res["found"]) == ["L00001"] and res["missing"] == ["nope"]
+    assert client.put("/learners/L00001", json={"accuracy": 0.5}).status_code == 503
+    monkeypatch.setattr(api, "PROFILES", ProfileService(store_dir, learners(mongo_cfg), poll_seconds=0,
+                                                        acoll=lambda: async_learners(mongo_cfg)))
+    assert client.put("/learners/L00001", json={"accuracy": 0.5}).json()["accuracy"] == 0.5
+    assert client.get("/learners/L00001").json()["accuracy"] == 0.5
+    assert client.get("/metrics/profiles").json()["pinned"] == 1
@@ -0,0 +1,65 @@
+from dataclasses import replace
+import joblib
+import numpy as np, pytest
+from sklearn.mixture import GaussianMixture
+from utils.iom.clustering import GMM_NAME, MODEL_NAME, Clusterer
+from utils.iom.features import PIPE_NAME, SPEC_NAME, FeatureBuilder
+from utils.iom.registry import get_registry
+from utils.iom.recommend import Recommender
+
+def _rows(make_learners, n=400):
+    df = make_learners(n, seed=1)
+    rng = np.random.default_rng(2)
+    # every level the rules distinguish (below, inside and above the bounds, fractional), fraction and percent accuracy
+    df["difficulty_level"] = rng.choice([-1, 0, 1, 2, 3, 1.5], n)
+    df["accuracy"] = np.where(rng.random(n) < 0.5, df["accuracy"], rng.uniform(0, 100, n).round(2))
+    df.loc[:5, "accuracy"] = [0.5, 0.8, 0.7, 50, 80, 70]
+    return df
+
+@pytest.mark.parametrize("table", [False, True])
+def test_batch_matches_recommend_one(fitted, make_learners, table):
+    rec = Recommender(replace(fitted, recommend_table=table))
+    df = _rows(make_learners)
+    out = rec.recommend_batch(df)
+    one = [rec.recommend_one(r) for r in df.to_dict("records")]
+    assert set(df["difficulty_level"]) == {-1, 0, 1, 2, 3, 1.5}
+    assert (df["accuracy"] > 1).any()
+    assert out["cluster"].tolist() == [r.cluster for r in one]
+    assert out["next_difficulty"].tolist() == [r.next_difficulty for r in one]
+    assert out["topics"].tolist() == [",".join(r.topics) for r in one]
+    assert out["tips"].tolist() == [" | ".join(r.tips) for r in one]
+
+@pytest.fixture
+def with_gmm(cfg, make_learners):
+    """cfg with a KMeans and a GMM on the same features, published together (as cluster_task2 does)."""
+    df = make_learners(300); Clusterer(cfg).fit(df)
+    X = FeatureBuilder(cfg).build(df, fit=False, pipe=joblib.load(cfg.artifacts / PIPE_NAME))
+    joblib.dump(GaussianMixture(cfg.n_clusters, random_state=0).fit(X), cfg.artifacts / GMM_NAME)
+    get_registry(cfg).publish(files=[cfg.artifacts / n for n in (PIPE_NAME, SPEC_NAME, MODEL_NAME, GMM_NAME)])
+    return cfg
+
+@pytest.mark.parametrize("table", [False, True])
+@pytest.mark.parametrize("compiled", [False, True])
+def test_soft_batch_matches_recommend_one(with_gmm, make_learners, table, compiled):
+    fitted = with_gmm
+    rec = Recommender(replace(fitted, recommend_table=table, compiled_inference=compiled))
+    df = _rows(make_learners, 200)
+    out = rec.recommend_batch(df, mode="soft")
+    one = [rec.recommend_one(r, mode="soft") for r in df.to_dict("records")]
+    assert out["cluster"].tolist() == [r.cluster for r in one]
+    assert out["next_difficulty"].tolist() == [r.next_difficulty for r in one]
+    assert out["topics"].tolist() == [",".join(r.topics) for r in one]
+    assert out["tips"].tolist() == [" | ".join(r.tips) for r in one]
+    assert np.allclose(out["expected_difficulty"], [r.expected_difficulty for r in one], rtol=0, atol=1e-9)
+    p = out[[f"p_cluster_{k}" for k in range(fitted.n_clusters)]].to_numpy()
+    assert np.allclose(p, [r.posterior for r in one], rtol=0, atol=1e-9)
+    assert np.allclose(out["cluster_confidence"], p.max(axis=1))
+
+def test_nan_difficulty_fails_in_both_paths(fitted, make_learners):
+    rec = Recommender(fitted)
+    df = make_learners(4).astype({"difficulty_level": float})
+    df.loc[2, "difficulty_level"] = np.nan
+    with pytest.raises(ValueError):
+        rec.recommend_for_cluster(df.iloc[2].to_dict(), 0)
+    with pytest.raises(ValueError):
+        rec.recommend_batch(df)
@@ -0,0 +1,12 @@
+import joblib
+from sklearn.cluster import KMeans
+from utils.iom.clustering import Clusterer
+from utils.iom.registry import get_registry, VERSIONS
+
+def test_fit_publishes_only_its_own_files(cfg, make_learners):
+    cfg.artifacts.mkdir(parents=True)
+    joblib.dump(KMeans(n_clusters=2), cfg.artifacts / "gmm.joblib")  # stale file from an older run
+    Clusterer(cfg).fit(make_learners(200))
+    arts = get_registry(cfg).current()
+    assert set(arts.hashes) == {"preprocess.joblib", "feature_spec.json", "kmeans.joblib", "recommend_table.json"}
+    assert [p.name for p in (cfg.artifacts / VERSIONS).iterdir()] == [arts.version]  # staging dir removed
@@ -0,0 +1,17 @@
+from dataclasses import replace
+from utils.iom.recommend import Recommender
+
+def test_cached_recommendations_are_copies(fitted, make_learners):
+    rec = Recommender(replace(fitted, recommend_cache_size=16))
+    row = make_learners(1).to_dict("records")[0]
+    first = rec.recommend_one(row)
+    expected = (list(first.topics), list(first.tips))
+    first.topics.append("mutated"); first.tips.clear()
+    again = rec.recommend_one(row)
+    assert rec.cache.hits == 1
+    assert (again.topics, again.tips) == expected
+    again.topics.clear()
+    assert rec.recommend_one(row).topics == expected[0]
+
+def test_cache_off_by_default(fitted):
+    assert Recommender(fitted).cache is None
@@ -0,0 +1,106 @@
+import json
+import numpy as np, pandas as pd, pytest
+from utils.iom.clustering import Clusterer
+from utils.iom.profile_store import build_store
+from utils.iom.registry import get_registry
+from utils.iom.mongo_sink import MongoSink
+from utils.iom.stream_assign import POINTER, EventTail, OnlineAssigner, drain
+
+def _events(n, seed, n_learners=300):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({"learner_id": [f"L{i:05d}" for i in rng.integers(0, n_learners, n)],
+                         "correct": rng.integers(0, 2, n), "time_spent_sec": rng.uniform(5, 600, n).round(1),
+                         "difficulty": rng.uniform(0, 1, n).round(3)})
+
+def _append(path, df):
+    with open(path, "a") as f:
+        df.to_json(f, orient="records", lines=True)
+
+@pytest.fixture
+def snapshot(fitted, make_learners, tmp_path):
+    df = make_learners(300)
+    df["cluster_kmeans"] = Clusterer(fitted).predict(df)
+    df.to_csv(tmp_path / "learner_clusters.csv", index=False)
+    build_store(tmp_path / "learner_clusters.csv", fitted.profiles_dir)
+    return fitted
+
+def _assigned(a, ids):
+    snap = a.snapshot.lookup(ids)
+    return [a.labels.get(i, snap[i]["cluster_kmeans"]) for i in ids]
+
+def test_tail_holds_back_partial_lines_and_resumes(tmp_path):
+    src = tmp_path / "events.jsonl"
+    src.write_text('{"learner_id": "L1", "correct": 1}\n{"learner_id": "L2", "correct": 0}\n{"learner_id": "L3", "cor')
+    tail = EventTail(src)
+    assert [len(df) for df in tail.poll()] == [2]
+    with open(src, "a") as f:
+        f.write('rect": 1}\n')
+    resumed = EventTail(src, dict(tail.offsets))  # a restart with the saved offsets
+    assert [df["learner_id"].tolist() for df in resumed.poll()] == [["L3"]]
+    assert list(resumed.poll()) == []
+    csv = tmp_path / "events.csv"
+    csv.write_text("learner_id,correct,time_spent_sec,difficulty\nL1,1,30,0.5\nL2,0,4")
+    tail = EventTail(csv)
+    assert [df["learner_id"].tolist() for df in tail.poll()] == [["L1"]]
+
+def test_restarts_resume_from_saved_offsets(snapshot, tmp_path):
+    parts = [_events(400, s) for s in range(3)]
+    one = OnlineAssigner(snapshot, tmp_path / "single")
+    _append(tmp_path / "all.jsonl", pd.concat(parts))
+    drain(one, EventTail(tmp_path / "all.jsonl"))
+    src = tmp_path / "events.jsonl"
+    for part in parts:  # a fresh process per part, as after a restart
+        _append(src, part)
+        a = OnlineAssigner(snapshot, tmp_path / "state")
+        drain(a, EventTail(src, a.offsets))
+    ids = sorted(set(pd.concat(parts)["learner_id"]))
+    assert a.stats["events"] == 1200
+    pd.testing.assert_frame_equal(a.features(ids), one.features(ids))
+    assert _assigned(a, ids) == _assigned(one, ids)
+    state = tmp_path / "state"
+    assert sorted(p.name for p in state.iterdir() if p.is_dir()) == [(state / POINTER).read_text().strip()]
+
+def test_rebuilt_snapshot_replays_events_after_its_cutoff(snapshot, tmp_path):
+    src = tmp_path / "events.jsonl"; first, second = _events(300, 1), _events(300, 2)
+    a = OnlineAssigner(snapshot, tmp_path / "state"); tail = EventTail(src, a.offsets)
+    _append(src, first); drain(a, tail)
+    covered = json.loads(json.dumps(a.checkpoints[-1]))  # the rebuild below read its data after `first` only
+    _append(src, second); drain(a, tail)
+    build_store(tmp_path / "learner_clusters.csv", snapshot.profiles_dir, cutoff=covered["at"])
+    drain(a, tail)
+    assert a.stats["rewinds"] == 1
+    only = OnlineAssigner(snapshot, tmp_path / "only"); _append(tmp_path / "second.jsonl", second)
+    drain(only, EventTail(tmp_path / "second.jsonl"))
+    ids = sorted(set(second["learner_id"]))
+    pd.testing.assert_frame_equal(a.features(ids), only.features(ids))  # `second` replayed once, `first` dropped
+
+def test_drift_guard_rejects_large_steps(snapshot, tmp_path):
+    centers = get_registry(snapshot).current().kmeans.cluster_centers_
+    events = _events(2000, 4)
+    guarded = OnlineAssigner(snapshot, tmp_path / "guarded", partial_fit=True, max_drift=1e-6)
+    guarded.refresh(); guarded.process(events)
+    assert guarded.stats["drift_rejected"] == 1 and guarded.stats["retrain_needed"]
+    assert np.allclose(guarded.centers, centers)
+    free = OnlineAssigner(snapshot, tmp_path / "free", partial_fit=True, max_drift=100.0)
+    free.refresh(); free.process(events)
+    assert free.stats["drift_rejected"] == 0 and not np.allclose(free.centers, centers)
+    free.save()
+    resumed = OnlineAssigner(snapshot, tmp_path / "free", partial_fit=True, max_drift=100.0)
+    assert np.array_equal(resumed.centers, free.centers) and np.array_equal(resumed.base, centers)
+
+class _Down:
+    def bulk_write(self, ops, ordered=True):
+        raise ConnectionError("primary unreachable")
+
+def test_failed_write_does_not_advance_the_offsets(snapshot, tmp_path):
+    src = tmp_path / "events.jsonl"; state = tmp_path / "state"
+    a = OnlineAssigner(snapshot, state); tail = EventTail(src, a.offsets)
+    _append(src, _events(50, 1)); drain(a, tail)
+    saved = dict(a.offsets)
+    _append(src, _events(3000, 2).assign(correct=0, time_spent_sec=5000.0))  # moves learners to other clusters
+    sink = MongoSink(_Down(), fill_missing=False)
+    with pytest.raises(RuntimeError, match="primary unreachable"):
+        drain(a, tail, sink)
+    assert OnlineAssigner(snapshot, state).offsets == saved  # the lost batch is read again after a restart
+    with pytest.raises(RuntimeError):
+        sink.close()
@@ -0,0 +1,36 @@
+from dataclasses import replace
+import joblib
+import numpy as np, pandas as pd
+from utils.iom.clustering import CENTROIDS
+from utils.iom.registry import VERSIONS, get_registry
+from utils.iom.sweep import parse_ks, promote, run_sweep
+
+def test_parse_ks():
+    assert parse_ks("2-5") == [2, 3, 4, 5]
+    assert parse_ks("8, 3,5-6,3") == [3, 5, 6, 8]
+    assert parse_ks("1-3") == [2, 3]
+
+def test_sweep_ranks_and_matches_across_workers(fitted, make_learners, tmp_path):
+    src = tmp_path / "in.csv"; make_learners(600, seed=3).to_csv(src, index=False)
+    kw = dict(ks=parse_ks("2-4"), algos=("kmeans", "gmm"), eval_sample=300)
+    one = run_sweep(fitted, src, workers=1, out_dir=tmp_path / "one", **kw)
+    assert len(one) == 6 and one["rank"].tolist() == list(range(1, 7))
+    assert one["silhouette"].is_monotonic_decreasing
+    assert one[one["k"] > 2]["warm_start"].all() and not one[one["k"] == 2]["warm_start"].any()
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path / "one" / "sweep_results.csv")[["algo", "k"]], one[["algo", "k"]])
+    pool = run_sweep(replace(fitted, feature_cache_max_gb=0), src, workers=2, out_dir=tmp_path / "pool", **kw)
+    cols = ["algo", "k", "silhouette", "davies_bouldin", "calinski_harabasz"]
+    pd.testing.assert_frame_equal(pool[cols], one[cols])  # cache off: the matrix is spilled for the workers
+    by_db = run_sweep(fitted, src, workers=1, rank_by="davies_bouldin", out_dir=tmp_path / "db", **kw)
+    assert by_db["davies_bouldin"].is_monotonic_increasing
+
+def test_promote_swaps_the_serving_model(fitted, make_learners, tmp_path):
+    src = tmp_path / "in.csv"; make_learners(400, seed=4).to_csv(src, index=False)
+    best = run_sweep(fitted, src, ks=[4], algos=("kmeans",), eval_sample=200, out_dir=tmp_path / "s").iloc[0]
+    fitted.reports.mkdir(parents=True, exist_ok=True)
+    version = promote(fitted, best.to_dict())
+    reg = get_registry(fitted)
+    assert reg.current_version() == version
+    served = joblib.load(reg.root / VERSIONS / version / "kmeans.joblib")
+    assert np.array_equal(served.cluster_centers_, joblib.load(best["model_path"]).cluster_centers_)
+    assert pd.read_csv(fitted.artifacts / CENTROIDS).shape == (4, served.cluster_centers_.shape[1])
@@ -0,0 +1,32 @@
+import hashlib, json
+import numpy as np, pandas as pd, pytest
+from iom_validate import validate
+
+def _full(n=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"learner_id": rng.integers(0, 1500, n).astype(str), "score": rng.integers(0, 4, n),
+                       "level": rng.choice(["a", "b"], n), "note": rng.uniform(0, 1, n)})  # `note` is not in core
+    return df, ["learner_id", "score", "level"]
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet"])
+def test_duplicate_count_matches_pandas(fmt, tmp_path):
+    df, core = _full()
+    if fmt == "csv":
+        df.to_csv(tmp_path / "master_full.csv", index=False); df[core].to_csv(tmp_path / "master_core.csv", index=False)
+    else:
+        df.to_parquet(tmp_path / "master_full", partition_cols=["level"], index=False)
+        (tmp_path / "data_dictionary_core.json").write_text(json.dumps([{"name": c} for c in core]))
+    res = validate(tmp_path, chunksize=700)  # duplicates land in different chunks
+    want = int(df[core].duplicated().sum())
+    assert want > 0 and res["core_duplicate_rows"] == want and "core_has_duplicates" in res["issues"]
+    assert res["rows_full"] == len(df) and res["columns"]["score"] == {"nulls": 0, "min": 0, "max": 3}
+
+def test_md5_is_checked_against_the_audit(tmp_path):
+    df, core = _full(); df = df.drop_duplicates(core)
+    df.to_csv(tmp_path / "master_full.csv", index=False); df[core].to_csv(tmp_path / "master_core.csv", index=False)
+    md5 = hashlib.md5((tmp_path / "master_full.csv").read_bytes()).hexdigest()
+    (tmp_path / "audit.json").write_text(json.dumps({"artifacts": {"master_full.csv": {"md5": md5}}}))
+    res = validate(tmp_path, chunksize=700)
+    assert res["md5_full"] == md5 and res["issues"] == [] and res["core_duplicate_rows"] == 0
+    (tmp_path / "audit.json").write_text(json.dumps({"artifacts": {"master_full.csv": {"md5": "0" * 32}}}))
+    assert validate(tmp_path)["issues"] == ["md5_mismatch_full"]
@@ -0,0 +1,117 @@
+from __future__ import annotations
+import multiprocessing, os, threading, time, uuid
+from collections import deque
+from dataclasses import replace
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from .config import AppConfig
+from .recommend import Recommender
+from .data_load import is_parquet, count_rows, iter_chunks, column_names, dataset_schema
+from .sinks import open_sink
+
+_WORKER_REC: Recommender | None = None
+
+def _init_worker(cfg: AppConfig):
+    global _WORKER_REC
+    _WORKER_REC = Recommender(cfg)
+
+def _score_chunk(df: pd.DataFrame) -> pd.DataFrame:
+    return _WORKER_REC.recommend_batch(df)
+
+def _output_types(cfg: AppConfig, in_path) -> dict:
+    # input columns as stored (Parquet) or as read (CSV: features numeric, everything else text), then the scores
+    import pyarrow as pa
+    feats = {c: pa.float64() for c in [*cfg.numeric, *cfg.categorical]}
+    inputs = {f.name: f.type for f in dataset_schema(in_path)} if is_parquet(in_path) else feats
+    return {**feats, **inputs, "cluster": pa.int64(), "next_difficulty": pa.int64(), "topics": pa.string(),
+            "tips": pa.string(), "expected_difficulty": pa.float64(), "cluster_confidence": pa.float64()}
+
+def run_batch(cfg: AppConfig, in_path, out_path, chunksize: int | None = None, workers: int | None = None,
+              fmt: str | None = None, progress=None, mode: str | None = None, mp_context=None) -> dict:
+    """Score `in_path` chunk by chunk into `out_path`; chunks are scored in a process pool and written in input order.
+    Pass a spawn `mp_context` when calling from a multithreaded process (the API server)."""
+    if mode:
+        cfg = replace(cfg, recommend_mode=mode)
+    chunksize = chunksize or cfg.batch_chunksize
+    workers = workers if workers is not None else (cfg.batch_workers or os.cpu_count() or 1)
+    state = {"rows_done": 0, "chunks_done": 0, "rows_total": count_rows(in_path)}
+    # CSV columns the model does not read stay text, so their type cannot flip between chunks (ids "007" vs 7)
+    feats = {*cfg.numeric, *cfg.categorical}
+    dtype = None if is_parquet(in_path) else {c: str for c in column_names(in_path) if c not in feats}
+    sink = open_sink(out_path, fmt, _output_types(cfg, in_path))
+    def emit(out):
+        sink.write(out)
+        state["rows_done"] += len(out); state["chunks_done"] += 1
+        if progress: progress(dict(state))
+    try:
+        if workers <= 1:
+            _init_worker(cfg)
+            for chunk in iter_chunks(in_path, chunksize, dtype=dtype):
+                emit(_score_chunk(chunk))
+        else:
+            # at most 2 chunks per worker are held in memory at any time
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cfg,),
+                                     mp_context=mp_context) as pool:
+                pending = deque()
+                for chunk in iter_chunks(in_path, chunksize, dtype=dtype):
+                    pending.append(pool.submit(_score_chunk, chunk))
+                    if len(pending) >= 2 * workers:
+                        emit(pending.popleft().result())
+                while pending:
+                    emit(pending.popleft().result())
+    finally:
+        sink.close()
+    return {**state, "output": str(out_path)}
+
+class BatchJobs:
+    """In-process registry of background batch jobs, polled by id. At most `batch.max_jobs` run at once (the rest
+    wait as "queued"), each on its share of the cores, in worker processes spawned rather than forked from the
+    multithreaded server. Finished jobs are forgotten after `batch.job_ttl_seconds`, and beyond MAX_FINISHED."""
+    MAX_FINISHED = 1000
+
+    def __init__(self, cfg: AppConfig):
+        self.cfg = cfg
+        self._jobs: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(1, cfg.batch_max_jobs))
+        self.workers = cfg.batch_workers or max(1, (os.cpu_count() or 1) // max(1, cfg.batch_max_jobs))
+
+    def _prune(self):
+        now = time.time()
+        done = sorted((j["finished_at"], i) for i, j in self._jobs.items() if j["finished_at"] is not None)
+        live = [i for t, i in done if now - t <= self.cfg.batch_job_ttl_seconds]
+        for i in [i for t, i in done if now - t > self.cfg.batch_job_ttl_seconds] + live[:max(0, len(live) - self.MAX_FINISHED)]:
+            del self._jobs[i]
+
+    def submit(self, in_path, out_path=None, fmt: str | None = None, **kw) -> str:
+        job_id = uuid.uuid4().hex[:12]
+        fmt = fmt or self.cfg.batch_format
+        out_path = out_path or self.cfg.reports / f"batch_recommendations_{job_id}.{fmt}"
+        with self._lock:
+            self._prune()
+            self._jobs[job_id] = {"job_id": job_id, "state": "queued", "input": str(in_path), "output": str(out_path),
+                                  "rows_done": 0, "chunks_done": 0, "rows_total": None, "error": None,
+                                  "submitted_at": time.time(), "started_at": None, "finished_at": None}
+        threading.Thread(target=self._run, args=(job_id, in_path, out_path, fmt, kw), daemon=True).start()
+        return job_id
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _run(self, job_id, in_path, out_path, fmt, kw):
+        with self._slots:
+            self._update(job_id, state="running", started_at=time.time())
+            try:
+                run_batch(self.cfg, in_path, out_path, fmt=fmt, progress=lambda s: self._update(job_id, **s),
+                          **{"workers": self.workers, "mp_context": multiprocessing.get_context("spawn"), **kw})
+            except Exception as e:
+                self._update(job_id, state="failed", error=repr(e), finished_at=time.time())
+            else:
+                self._update(job_id, state="done", finished_at=time.time())
+
+    def status(self, job_id) -> dict | None:
+        with self._lock:
+            self._prune()
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
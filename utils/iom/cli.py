@@ -1,9 +1,11 @@
 import argparse
 import pandas as pd
 from .config import AppConfig
-from .data_load import load_dataframe
+from .data_load import load_dataframe, column_names, DEF_INPUT
 from .clustering import Clusterer
 from .recommend import Recommender
+from .batch_pipeline import run_batch
+from .sweep import run_sweep, promote, parse_ks, ALGOS, RANK
 
 def build_cmd():
     p = argparse.ArgumentParser(prog="iom-cli")
@@ -15,14 +17,32 @@ def build_cmd():
     rec.add_argument("--avg_score", type=float, required=True)
     rec.add_argument("--accuracy", type=float, required=True)
     rec.add_argument("--difficulty_level", type=int, required=True)
+    bat = sub.add_parser("batch")
+    bat.add_argument("--input", type=str, required=True)
+    bat.add_argument("--out", type=str, default=None)
+    bat.add_argument("--format", choices=["csv", "parquet"], default=None)
+    bat.add_argument("--chunksize", type=int, default=None)
+    bat.add_argument("--workers", type=int, default=None)
+    sw = sub.add_parser("sweep")
+    sw.add_argument("--csv", type=str, default=None)
+    sw.add_argument("--k", type=str, default="2-8", help="range and/or list, e.g. 2-8 or 3,5,8")
+    sw.add_argument("--algos", type=str, default=",".join(ALGOS))
+    sw.add_argument("--workers", type=int, default=1)
+    sw.add_argument("--sample", type=int, default=20000, help="stratified rows for the sampled silhouette")
+    sw.add_argument("--fit_sample", type=int, default=0, help="rows each fit sees (0 = all)")
+    sw.add_argument("--gmm_sample", type=int, default=300000)
+    sw.add_argument("--rank_by", choices=list(RANK), default="silhouette")
+    sw.add_argument("--promote", action="store_true", help="publish the top-ranked model to the artifacts")
     return p
 
 def main():
     CFG = AppConfig.load()
     args = build_cmd().parse_args()
     if args.cmd == "fit":
-        df = load_dataframe(CFG, args.csv)
-        Clusterer(CFG).fit(df)
+        # only the feature columns are read (projected at the scan for Parquet input)
+        wanted = set(CFG.numeric + CFG.categorical)
+        df = load_dataframe(CFG, args.csv, columns=[c for c in column_names(args.csv or DEF_INPUT) if c in wanted])
+        Clusterer(CFG).fit(df, source=args.csv or DEF_INPUT)
         print("[OK] Model trained & artifacts saved ->", CFG.artifacts)
     elif args.cmd == "recommend":
         row = {
@@ -38,8 +58,23 @@ def main():
             "topics": rec.topics,
             "tips": rec.tips,
         })
+    elif args.cmd == "batch":
+        fmt = args.format or (None if args.out else CFG.batch_format)
+        out = args.out or CFG.reports / f"batch_recommendations.{fmt}"
+        summary = run_batch(CFG, args.input, out, chunksize=args.chunksize, workers=args.workers, fmt=fmt,
+                            progress=lambda s: print(f"scored {s['rows_done']} rows ({s['chunks_done']} chunks)"))
+        print("[OK] Batch recommendations ->", summary["output"])
+    elif args.cmd == "sweep":
+        table = run_sweep(CFG, args.csv or DEF_INPUT, parse_ks(args.k), args.algos.split(","), workers=args.workers,
+                          eval_sample=args.sample, fit_sample=args.fit_sample, gmm_sample=args.gmm_sample, rank_by=args.rank_by)
+        cols = ["rank", "algo", "k", "silhouette", "silhouette_simplified", "davies_bouldin", "calinski_harabasz",
+                "inertia", "bic", "fit_seconds", "eval_seconds"]
+        print(table[cols].to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+        if args.promote:
+            best = table.iloc[0].to_dict()
+            print(f"[OK] Promoted {best['algo']} k={best['k']} -> version", promote(CFG, best))
     else:
-        print("Use subcommands: fit | recommend")
+        print("Use subcommands: fit | recommend | batch | sweep")
 
 if __name__ == "__main__":
     main()
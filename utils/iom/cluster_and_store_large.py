@@ -1,13 +1,61 @@
 #!/usr/bin/env python3
-import argparse, json, random
+import argparse, json, tempfile, time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import numpy as np, pandas as pd
 from sklearn.cluster import MiniBatchKMeans
 from sklearn.mixture import GaussianMixture
-from pymongo import MongoClient
 import joblib
 from utils.iom.config import AppConfig
-from utils.iom.features import FeatureBuilder
+from utils.iom.clustering import CompiledGMM
+from utils.iom.data_load import column_names, iter_chunks
+from utils.iom.features import FeatureBuilder, PIPE_NAME, SPEC_NAME, dense32
+from utils.iom.registry import get_registry, file_hash
+from utils.iom.feature_cache import get_cache, key_for, fit_key_for
+from utils.iom.mongo import learners
+from utils.iom.mongo_sink import MongoSink
+from utils.iom.profile_store import build_store
+
+WANTED=["learner_id","time_spent","avg_score","accuracy","difficulty_level","topic_progress"]
+
+class Reservoir:
+    """Uniform sample of k rows over a stream: every row draws a random key and the k smallest keys are kept.
+
+    Equivalent to per-row reservoir sampling, but each chunk is merged with one argpartition.
+    """
+    def __init__(self, k, rng):
+        self.k=k; self.rng=rng; self.keys=np.empty(0); self.rows=None
+    def add(self, X):
+        keys=self.rng.random(len(X))
+        if self.rows is None:
+            self.rows=np.empty((0,X.shape[1]), dtype=X.dtype)
+        keys=np.concatenate([self.keys, keys]); rows=np.concatenate([self.rows, X])
+        if len(keys)>self.k:
+            keep=np.argpartition(keys, self.k)[:self.k]
+            keys=keys[keep]; rows=rows[keep]
+        self.keys=keys; self.rows=rows
+
+_MODELS=None
+
+def _init_worker(mbk, gmm):
+    global _MODELS
+    _MODELS=(mbk, CompiledGMM(gmm))
+
+def _assign(spill, n_rows, n_feats, start, stop):
+    mbk, gmm=_MODELS
+    X=np.memmap(spill, dtype=np.float32, mode="r", shape=(n_rows, n_feats))[start:stop]
+    proba=gmm.predict_proba(X)
+    return mbk.predict(X), proba.argmax(axis=1), proba.max(axis=1)
+
+def _nonempty(chunks):
+    return (c for c in chunks if len(c))
+
+def _write_empty(cfg, args, out_csv, started) -> dict:
+    """No rows (empty or fully filtered input): an empty result and snapshot, nothing trained or published."""
+    pd.DataFrame(columns=[*WANTED, "cluster_kmeans", "cluster_gmm", "gmm_confidence"]).to_csv(out_csv, index=False)
+    profiles=build_store(out_csv, cfg.profiles_dir, args.chunksize, cutoff=started)
+    return {"csv":args.csv,"n_clusters":args.n_clusters,"rows":0,"report_csv":str(out_csv),"model_version":None,"mongo":None,
+            "profiles":{"dir":str(cfg.profiles_dir),"rows":profiles["rows"]},"artifacts":{}}
 
 def main():
     ap=argparse.ArgumentParser()
@@ -15,56 +63,105 @@ def main():
     ap.add_argument("--n_clusters", type=int, default=3)
     ap.add_argument("--chunksize", type=int, default=200000)
     ap.add_argument("--sample_for_gmm", type=int, default=300000)
-    ap.add_argument("--mongo", default="mongodb://127.0.0.1:27017")
-    ap.add_argument("--db", default="iom")
-    ap.add_argument("--collection", default="learners")
+    ap.add_argument("--mongo", default=None, help="default: mongo.uri from config.yaml")
+    ap.add_argument("--db", default=None)
+    ap.add_argument("--collection", default=None)
+    ap.add_argument("--workers", type=int, default=4, help="mongo writer threads")
+    ap.add_argument("--predict_workers", type=int, default=1, help="processes for the predict/write pass")
+    ap.add_argument("--spill_dir", default=None, help="where the float32 feature spill lives (default: system temp)")
     args=ap.parse_args()
     cfg=AppConfig.load()
+    started=time.time()  # the snapshot's data cutoff: the input is read from here on
     fb=FeatureBuilder(cfg)
-    client=MongoClient(args.mongo); coll=client[args.db][args.collection]
+    coll=learners(cfg, args.mongo, args.db, args.collection)
     mbk=MiniBatchKMeans(n_clusters=args.n_clusters, random_state=cfg.random_state, batch_size=4096)
-    sampler=[]; total=0
-    first=True
-    for chunk in pd.read_csv(args.csv, chunksize=args.chunksize, low_memory=False):
-        X=fb.build(chunk[[c for c in set(cfg.numeric+cfg.categorical) if c in chunk.columns]], fit=first); first=False
-        X_arr = X.toarray() if hasattr(X,"toarray") else X
-        mbk.partial_fit(X_arr)
-        for row in X_arr:
-            total+=1
-            if len(sampler)<args.sample_for_gmm: sampler.append(row)
-            else:
-                j=random.randint(0,total-1)
-                if j<args.sample_for_gmm: sampler[j]=row
-    Path(cfg.artifacts).mkdir(parents=True, exist_ok=True)
-    joblib.dump(mbk, cfg.artifacts/"kmeans_minibatch.joblib")
-    smp=np.asarray(sampler,dtype=float)
-    gmm=GaussianMixture(n_components=args.n_clusters, random_state=cfg.random_state).fit(smp)
-    joblib.dump(gmm, cfg.artifacts/"gmm.joblib")
+    sampler=Reservoir(args.sample_for_gmm, np.random.default_rng(cfg.random_state))
     out_csv=cfg.reports/"learner_clusters.csv"; out_csv.parent.mkdir(parents=True, exist_ok=True)
-    wrote=False; buf=[]
-    for chunk in pd.read_csv(args.csv, chunksize=args.chunksize, low_memory=False):
-        X=fb.build(chunk[[c for c in set(cfg.numeric+cfg.categorical) if c in chunk.columns]], fit=False)
-        X_arr = X.toarray() if hasattr(X,"toarray") else X
-        k=mbk.predict(X_arr); g=gmm.predict(X_arr); p=gmm.predict_proba(X_arr).max(axis=1)
-        chunk=chunk.copy()
-        chunk["cluster_kmeans"]=k; chunk["cluster_gmm"]=g; chunk["gmm_confidence"]=p
-        wanted=["learner_id","time_spent","avg_score","accuracy","difficulty_level","topic_progress","cluster_kmeans","cluster_gmm","gmm_confidence"]
-        present=[c for c in wanted if c in chunk.columns]
-        if "learner_id" not in present:
-            chunk["learner_id"]=[f"L{ix+1:010d}" for ix in range(len(chunk))]
-            present=["learner_id"]+present
-        chunk[present].to_csv(out_csv, mode="a", index=False, header=(not wrote)); wrote=True
-        keep=["learner_id","accuracy","time_spent","difficulty_level","topic_progress"]
-        if "avg_score" in chunk.columns: keep.append("avg_score")
-        for _,r in chunk.iterrows():
-            d={k:(float(r[k]) if k in chunk.columns and pd.notna(r[k]) else None) for k in keep if k in chunk.columns}
-            d["learner_id"]=str(r["learner_id"]); d["cluster_kmeans"]=int(r["cluster_kmeans"]); d["cluster_gmm"]=int(r["cluster_gmm"]); d["gmm_confidence"]=float(r["gmm_confidence"])
-            buf.append(d)
-            if len(buf)>=5000:
-                coll.bulk_write([{"updateOne":{"filter":{"learner_id":x["learner_id"]},"update":{"$set":x},"upsert":True}} for x in buf], ordered=False); buf=[]
-    if buf:
-        coll.bulk_write([{"updateOne":{"filter":{"learner_id":x["learner_id"]},"update":{"$set":x},"upsert":True}} for x in buf], ordered=False)
-    summary={"csv":args.csv,"n_clusters":args.n_clusters,"report_csv":str(out_csv),
+    header=column_names(args.csv)
+    feat_cols=[c for c in header if c in set(cfg.numeric+cfg.categorical)]
+    meta_cols=[c for c in header if c in WANTED]
+    cache=get_cache(cfg); fitted=cache.fitted_path(fit_key_for(cfg, args.csv)) if cache.enabled else None
+    with tempfile.TemporaryDirectory(prefix="iom_spill_", dir=args.spill_dir) as tmp:
+        # the scaler moments and categories come from the whole file, not chunk one: either the pipeline fitted on
+        # this very file before (feature cache), or one parse that accumulates them while spilling the chunks, so
+        # the transform pass below reads the spill instead of parsing the CSV a second time
+        spilled=None
+        if fitted is not None and fitted.exists():
+            fb.load_fitted(fitted, [c for c in cfg.numeric if c in feat_cols], [c for c in cfg.categorical if c in feat_cols])
+        else:
+            spilled=[]
+            for i, chunk in enumerate(_nonempty(iter_chunks(args.csv, args.chunksize, columns=list(dict.fromkeys(feat_cols+meta_cols))))):
+                fb.partial_fit(chunk[feat_cols])
+                spilled.append(Path(tmp)/f"raw_{i:05d}.pkl"); chunk.to_pickle(spilled[-1])
+            if not spilled:
+                summary=_write_empty(cfg, args, out_csv, started)
+                (cfg.reports/"clustering_summary.json").write_text(json.dumps(summary,indent=2))
+                print(json.dumps(summary,indent=2))
+                return
+            fb.finish_fit()
+            if fitted is not None: cache.put_fitted(fitted.stem, cfg.artifacts/PIPE_NAME)
+        key=key_for(cfg, args.csv, file_hash(cfg.artifacts/PIPE_NAME))
+        cached=cache.get(key)
+        # pass 1: transform once (or read the cached matrix), train, sample, and spill passthrough columns for pass 2;
+        # the feature spill is written straight into the feature cache so later stages can reuse it
+        writer=cache.writer(key, {"source":args.csv}) if cached is None and cache.enabled else None
+        raw_spill=cached is None and writer is None
+        spill=Path(tmp)/"features.f32" if raw_spill else cache.data_path(key)
+        raw=open(spill, "wb") if raw_spill else None
+        bounds=[]; total=0; n_feats=0
+        usecols=list(dict.fromkeys(feat_cols+meta_cols)) if cached is None else meta_cols
+        chunks=(pd.read_pickle(p) for p in spilled) if spilled is not None else _nonempty(iter_chunks(args.csv, args.chunksize, columns=usecols))
+        try:
+            for i, chunk in enumerate(chunks):
+                if cached is None:
+                    X_arr=fb.build_compact(chunk) if cfg.compact_features else dense32(fb.build(chunk[feat_cols], fit=False))
+                    if writer is not None: writer.append(X_arr)
+                    else: raw.write(X_arr.tobytes())
+                else:
+                    X_arr=np.asarray(cached[total:total+len(chunk)])
+                mbk.partial_fit(X_arr)
+                sampler.add(X_arr)
+                meta=chunk[[c for c in WANTED if c in chunk.columns]].reset_index(drop=True)
+                if "learner_id" not in meta.columns:
+                    meta.insert(0, "learner_id", [f"L{total+ix+1:010d}" for ix in range(len(meta))])
+                meta.to_pickle(Path(tmp)/f"meta_{i:05d}.pkl")
+                bounds.append((total, total+len(chunk))); total+=len(chunk); n_feats=X_arr.shape[1]
+        except BaseException:
+            if writer is not None: writer.discard()
+            raise
+        finally:
+            if raw is not None: raw.close()
+        if writer is not None: writer.close()
+        Path(cfg.artifacts).mkdir(parents=True, exist_ok=True)
+        joblib.dump(mbk, cfg.artifacts/"kmeans_minibatch.joblib")
+        gmm=GaussianMixture(n_components=args.n_clusters, random_state=cfg.random_state).fit(sampler.rows.astype(np.float64))
+        joblib.dump(gmm, cfg.artifacts/"gmm.joblib")
+        # the minibatch model is what assigned cluster_kmeans above, so it also serves as kmeans.joblib of this version
+        version=get_registry(cfg).publish(files={PIPE_NAME:cfg.artifacts/PIPE_NAME, SPEC_NAME:cfg.artifacts/SPEC_NAME,
+                                                 "kmeans.joblib":cfg.artifacts/"kmeans_minibatch.joblib",
+                                                 "kmeans_minibatch.joblib":cfg.artifacts/"kmeans_minibatch.joblib",
+                                                 "gmm.joblib":cfg.artifacts/"gmm.joblib"})
+
+        # pass 2: assign from the memory-mapped spill; no CSV parse, no re-transform
+        sink=MongoSink(coll, workers=args.workers, fill_missing=False)
+        if args.predict_workers>1 and bounds:  # pool.map(_assign, *zip(*[])) would get no iterables
+            pool=ProcessPoolExecutor(max_workers=args.predict_workers, initializer=_init_worker, initargs=(mbk, gmm))
+            results=pool.map(_assign, *zip(*[(str(spill), total, n_feats, a, b) for a, b in bounds]))
+        else:
+            pool=None; _init_worker(mbk, gmm)
+            results=(_assign(str(spill), total, n_feats, a, b) for a, b in bounds)
+        try:
+            for i, (k, g, p) in enumerate(results):
+                out=pd.read_pickle(Path(tmp)/f"meta_{i:05d}.pkl")
+                out["cluster_kmeans"]=k; out["cluster_gmm"]=g; out["gmm_confidence"]=p
+                out.to_csv(out_csv, mode="w" if i==0 else "a", index=False, header=(i==0))
+                sink.write(out)
+        finally:
+            if pool is not None: pool.shutdown()
+        mongo_stats=sink.close()
+    profiles=build_store(out_csv, cfg.profiles_dir, args.chunksize, cutoff=started)
+    summary={"csv":args.csv,"n_clusters":args.n_clusters,"rows":total,"report_csv":str(out_csv),"model_version":version,"mongo":mongo_stats,
+             "profiles":{"dir":str(cfg.profiles_dir),"rows":profiles["rows"]},
              "artifacts":{"kmeans_minibatch":str(cfg.artifacts/'kmeans_minibatch.joblib'),
                           "gmm":str(cfg.artifacts/'gmm.joblib'),
                           "preprocess":str(cfg.artifacts/'preprocess.joblib'),
@@ -0,0 +1,173 @@
+from __future__ import annotations
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# Cluster quality on arbitrarily large (memory-mapped) feature matrices.
+#   * one O(n) pass for counts/sums -> cluster means, Calinski-Harabasz
+#   * one O(n*k) pass for Davies-Bouldin and the simplified (centroid) silhouette
+#   * exact silhouette on a stratified per-cluster sample, with a 95% confidence interval
+# Every pass works on row blocks, so only one block per worker is densified at a time;
+# numpy releases the GIL in the matrix products, so blocks run on a thread pool.
+Z95 = 1.959963984540054
+
+def _blocks(n: int, chunk: int):
+    return [(a, min(a + chunk, n)) for a in range(0, n, chunk)]
+
+def _block(X, a, b, dtype=np.float64) -> np.ndarray:
+    return np.asarray(X[a:b], dtype=dtype)
+
+def _dists(X: np.ndarray, C: np.ndarray, c_sq: np.ndarray) -> np.ndarray:
+    # ||x||^2 - 2 x.c + ||c||^2, in place: the (rows x centers) matrix is the only large temporary
+    d = X @ C.T
+    d *= -2.0; d += c_sq[None, :]; d += np.einsum("ij,ij->i", X, X)[:, None]
+    np.maximum(d, 0.0, out=d)
+    return np.sqrt(d, out=d)
+
+def predict_labels(model, X, chunk: int = 200000, workers: int = 4) -> np.ndarray:
+    """model.predict over row blocks of X (KMeans, MiniBatchKMeans and GaussianMixture all qualify)."""
+    # blocks in the dtype the model was fitted in (KMeans fitted on float32 rejects float64 input)
+    dtype = getattr(model, "cluster_centers_", getattr(model, "means_", np.empty(0))).dtype
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        parts = list(ex.map(lambda ab: model.predict(_block(X, *ab, dtype)), _blocks(len(X), chunk)))
+    return np.concatenate(parts).astype(np.int64) if parts else np.empty(0, dtype=np.int64)
+
+def cluster_moments(X, labels: np.ndarray, k: int, chunk: int = 200000, workers: int = 4):
+    """Per-cluster counts, feature sums and total squared norms in one pass."""
+    def part(ab):
+        a, b = ab; Xb = _block(X, a, b); lb = labels[a:b]
+        sums = np.zeros((k, Xb.shape[1]))
+        for c in range(k):
+            sums[c] = Xb[lb == c].sum(axis=0)
+        return np.bincount(lb, minlength=k), sums, np.bincount(lb, weights=np.einsum("ij,ij->i", Xb, Xb), minlength=k)
+    counts = np.zeros(k, dtype=np.int64); sums = np.zeros((k, X.shape[1])); sq = np.zeros(k)
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        for c, s, q in ex.map(part, _blocks(len(X), chunk)):
+            counts += c; sums += s; sq += q
+    return counts, sums, sq
+
+def calinski_harabasz(counts, sums, sq) -> float:
+    live = counts > 0; n = counts.sum(); k = int(live.sum())
+    if k < 2 or n <= k:
+        return 0.0
+    means = sums[live] / counts[live, None]
+    overall = sums.sum(axis=0) / n
+    between = float((counts[live] * ((means - overall) ** 2).sum(axis=1)).sum())
+    within = float((sq[live] - counts[live] * (means ** 2).sum(axis=1)).sum())
+    return 1.0 if within <= 0 else between * (n - k) / (within * (k - 1))
+
+def centroid_pass(X, labels: np.ndarray, means: np.ndarray, live: np.ndarray, chunk: int = 200000, workers: int = 4):
+    """Per-cluster sums of the distance to the own mean (Davies-Bouldin) and of the simplified silhouette
+    s = (b - a) / max(a, b), with a = distance to the own mean and b = distance to the nearest other non-empty cluster."""
+    k = len(means); c_sq = (means ** 2).sum(axis=1)
+    def part(ab):
+        a, b = ab; lb = labels[a:b]
+        D = _dists(_block(X, a, b), means, c_sq)
+        D[:, ~live] = np.inf
+        rows = np.arange(len(lb))
+        own = D[rows, lb].copy()
+        D[rows, lb] = np.inf
+        other = D.min(axis=1) if live.sum() > 1 else own
+        denom = np.maximum(own, other)
+        s = np.divide(other - own, denom, out=np.zeros_like(own), where=denom > 0)
+        return np.bincount(lb, weights=own, minlength=k), np.bincount(lb, weights=s, minlength=k)
+    intra = np.zeros(k); sil = np.zeros(k)
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        for i, s in ex.map(part, _blocks(len(X), chunk)):
+            intra += i; sil += s
+    return intra, sil
+
+def davies_bouldin(means: np.ndarray, intra_mean: np.ndarray) -> float:
+    # same definition as sklearn.metrics.davies_bouldin_score, from per-cluster statistics
+    if len(means) < 2:
+        return 0.0
+    cd = np.sqrt(np.maximum((means ** 2).sum(1)[:, None] + (means ** 2).sum(1)[None, :] - 2 * means @ means.T, 0.0))
+    if np.allclose(intra_mean, 0) or np.allclose(cd, 0):
+        return 0.0
+    np.fill_diagonal(cd, np.inf); cd[cd == 0] = np.inf
+    return float(np.mean(np.max((intra_mean[:, None] + intra_mean[None, :]) / cd, axis=1)))
+
+def stratified_sample(labels: np.ndarray, total: int, rng: np.random.Generator) -> np.ndarray:
+    """Row indices with an equal share of `total` per cluster (all rows of clusters smaller than their share)."""
+    present = np.flatnonzero(np.bincount(labels)) if len(labels) else np.array([], dtype=np.int64)
+    if not len(present):
+        return np.empty(0, dtype=np.int64)
+    share = max(2, total // len(present))
+    idx = []
+    for c in present:
+        members = np.flatnonzero(labels == c)
+        idx.append(members if len(members) <= share else rng.choice(members, share, replace=False))
+    return np.sort(np.concatenate(idx))
+
+def sample_silhouettes(Xs: np.ndarray, ls: np.ndarray, chunk: int = 2048, workers: int = 4) -> np.ndarray:
+    """Exact silhouette of every sample row against the sample, in row blocks of a (chunk x m) distance matrix.
+
+    Distances are float32 (half the memory traffic of the m^2 pass); per-cluster sums are accumulated in float64.
+    """
+    Xs = np.asarray(Xs, dtype=np.float32); m = len(Xs)
+    k = int(ls.max()) + 1 if m else 0
+    onehot = np.zeros((m, k), dtype=np.float32); onehot[np.arange(m), ls] = 1.0
+    sizes = onehot.sum(axis=0, dtype=np.float64); x_sq = (Xs ** 2).sum(axis=1)
+    def part(ab):
+        a, b = ab; lb = ls[a:b]
+        sums = (_dists(Xs[a:b], Xs, x_sq) @ onehot).astype(np.float64)  # per-cluster distance sums; self-distance is ~0
+        rows = np.arange(len(lb))
+        own_n = sizes[lb] - 1
+        a_i = np.divide(sums[rows, lb], own_n, out=np.zeros(len(lb)), where=own_n > 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean_other = sums / sizes
+        mean_other[:, sizes == 0] = np.inf; mean_other[rows, lb] = np.inf
+        b_i = mean_other.min(axis=1)
+        denom = np.maximum(a_i, b_i)
+        s = np.divide(b_i - a_i, denom, out=np.zeros(len(lb)), where=(denom > 0) & np.isfinite(b_i))
+        s[own_n == 0] = 0.0  # singleton clusters score 0, as in sklearn
+        return s
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        parts = list(ex.map(part, _blocks(m, chunk)))
+    return np.concatenate(parts) if parts else np.empty(0)
+
+def stratified_estimate(s: np.ndarray, ls: np.ndarray, counts: np.ndarray) -> tuple[float, float]:
+    """Population-weighted mean of per-cluster sample means and its standard error (with finite-population correction)."""
+    n = counts.sum(); mean = 0.0; var = 0.0
+    for c in np.flatnonzero(counts):
+        sc = s[ls == c]
+        if not len(sc):
+            continue
+        w = counts[c] / n
+        mean += w * sc.mean()
+        if len(sc) > 1:
+            var += w * w * sc.var(ddof=1) / len(sc) * (1 - len(sc) / counts[c])
+    return float(mean), float(np.sqrt(max(var, 0.0)))
+
+def evaluate(model, X, *, sample: int = 20000, silhouette: str = "both",
+             chunk: int = 200000, workers: int = 4, seed: int = 0) -> dict:
+    """All metrics for one fitted model over the full matrix X; `silhouette` is 'both', 'simplified' or 'sampled'."""
+    t0 = time.perf_counter()
+    labels = predict_labels(model, X, chunk, workers)
+    k = int(getattr(model, "n_clusters", getattr(model, "n_components", 0)) or (labels.max() + 1))
+    counts, sums, sq = cluster_moments(X, labels, k, chunk, workers)
+    live = counts > 0
+    means = sums / np.maximum(counts, 1)[:, None]
+    out = {"rows": int(len(X)), "n_clusters": k, "cluster_sizes": counts.tolist(),
+           "calinski_harabasz": calinski_harabasz(counts, sums, sq)}
+    intra, sil = centroid_pass(X, labels, means, live, chunk, workers)
+    out["davies_bouldin"] = davies_bouldin(means[live], intra[live] / counts[live])
+    if silhouette in ("both", "simplified"):
+        out["silhouette_simplified"] = float(sil.sum() / max(len(X), 1))
+    if silhouette in ("both", "sampled"):
+        idx = stratified_sample(labels, sample, np.random.default_rng(seed))
+        ls = labels[idx]
+        s = sample_silhouettes(np.asarray(X[idx]), ls, workers=workers)
+        est, se = stratified_estimate(s, ls, counts)
+        per = {int(c): float(s[ls == c].mean()) for c in np.flatnonzero(counts) if (ls == c).any()}
+        out.update({"silhouette": est, "silhouette_ci95": [est - Z95 * se, est + Z95 * se],
+                    "silhouette_sample_size": int(len(idx)), "silhouette_per_cluster": per})
+    if hasattr(model, "inertia_"):
+        out["inertia"] = float(model.inertia_)
+    elif hasattr(model, "score_samples") and len(X):
+        # mixtures have no inertia; report the mean log-likelihood instead
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            ll = sum(ex.map(lambda ab: float(model.score_samples(_block(X, *ab)).sum()), _blocks(len(X), chunk)))
+        out["avg_log_likelihood"] = ll / len(X)
+    out["seconds"] = round(time.perf_counter() - t0, 3)
+    return out
@@ -1,70 +1,73 @@
 #!/usr/bin/env python3
-import argparse, json
+import argparse, json, time
 from pathlib import Path
 import pandas as pd, numpy as np, joblib
 from sklearn.cluster import KMeans
 from sklearn.mixture import GaussianMixture
 from utils.iom.config import AppConfig
-from utils.iom.features import FeatureBuilder
-from pymongo import MongoClient
+from utils.iom.clustering import CompiledGMM
+from utils.iom.data_load import load_dataframe
+from utils.iom.features import FeatureBuilder, PIPE_NAME, SPEC_NAME
+from utils.iom.registry import get_registry
+from utils.iom.feature_cache import store_fitted
+from utils.iom.mongo import learners
+from utils.iom.mongo_sink import MongoSink
+from utils.iom.profile_store import build_store
 
 def main():
     ap=argparse.ArgumentParser()
     ap.add_argument("--csv", required=True)
     ap.add_argument("--n_clusters", type=int, default=3)
-    ap.add_argument("--mongo", default="mongodb://127.0.0.1:27017")
-    ap.add_argument("--db", default="iom")
-    ap.add_argument("--collection", default="learners")
+    ap.add_argument("--mongo", default=None, help="default: mongo.uri from config.yaml")
+    ap.add_argument("--db", default=None)
+    ap.add_argument("--collection", default=None)
     ap.add_argument("--no_mongo", action="store_true")
+    ap.add_argument("--workers", type=int, default=4)
     args=ap.parse_args()
 
     cfg=AppConfig.load()
-    df=pd.read_csv(args.csv)
+    started=time.time()  # the snapshot's data cutoff: the input is read from here on
+    df=load_dataframe(cfg, args.csv)
     fb=FeatureBuilder(cfg)
-    X=fb.build(df[cfg.numeric+cfg.categorical], fit=True)
+    if cfg.compact_features:
+        fb.fit(df); X=fb.build_compact(df)
+    else:
+        X=fb.build(df[cfg.numeric+cfg.categorical], fit=True)
+    store_fitted(cfg, args.csv, X)
 
     km=KMeans(n_clusters=cfg.n_clusters, random_state=cfg.random_state).fit(X)
-    gmm=GaussianMixture(n_components=cfg.n_clusters, random_state=cfg.random_state).fit(X)
+    # EM covariances in float32 can go singular; the mixture is fitted in float64 either way
+    gmm=GaussianMixture(n_components=cfg.n_clusters, random_state=cfg.random_state).fit(X.astype(np.float64))
 
     (cfg.artifacts).mkdir(parents=True, exist_ok=True)
     joblib.dump(km, cfg.artifacts/"kmeans.joblib")
     joblib.dump(gmm, cfg.artifacts/"gmm.joblib")
+    version=get_registry(cfg).publish(files=[cfg.artifacts/n for n in (PIPE_NAME, SPEC_NAME, "kmeans.joblib", "gmm.joblib")])
 
     df_out=df.copy()
     df_out["cluster_kmeans"]=km.predict(X)
-    df_out["cluster_gmm"]=gmm.predict(X)
-    df_out["gmm_confidence"]=gmm.predict_proba(X).max(axis=1)
+    proba=CompiledGMM(gmm).predict_proba(X)
+    df_out["cluster_gmm"]=proba.argmax(axis=1)
+    df_out["gmm_confidence"]=proba.max(axis=1)
 
     (cfg.reports).mkdir(parents=True, exist_ok=True)
     out_csv=cfg.reports/"learner_clusters.csv"
     df_out.to_csv(out_csv, index=False)
+    profiles=build_store(out_csv, cfg.profiles_dir, cutoff=started)
 
     if not args.no_mongo:
         try:
-            coll=MongoClient(args.mongo)[args.db][args.collection]
-            docs=[]
-            for _,r in df_out.iterrows():
-                d={
-                    "learner_id": str(r.get("learner_id","")),
-                    "time_spent": float(r.get("time_spent",0)),
-                    "avg_score": float(r.get("avg_score",0)),
-                    "accuracy": float(r.get("accuracy",0)),
-                    "difficulty_level": int(r.get("difficulty_level",1)),
-                    "topic_progress": float(r.get("topic_progress",0)),
-                    "cluster_kmeans": int(r["cluster_kmeans"]),
-                    "cluster_gmm": int(r["cluster_gmm"]),
-                    "gmm_confidence": float(r["gmm_confidence"])
-                }
-                docs.append({"updateOne":{"filter":{"learner_id":d["learner_id"]},"update":{"$set":d},"upsert":True}})
-                if len(docs)>=5000:
-                    coll.bulk_write(docs, ordered=False); docs=[]
-            if docs: coll.bulk_write(docs, ordered=False)
+            with MongoSink(learners(cfg, args.mongo, args.db, args.collection), workers=args.workers) as sink:
+                sink.write(df_out)
+            print("mongo upsert:", sink.stats())
         except Exception as e:
-            pass
+            print(f"[WARN] mongo upsert skipped: {e}")
 
     summary={
       "csv": args.csv,
       "report_csv": str(out_csv),
+      "model_version": version,
+      "profiles": {"dir": str(cfg.profiles_dir), "rows": profiles["rows"]},
       "artifacts": {
         "preprocess": str(cfg.artifacts/"preprocess.joblib"),
         "kmeans": str(cfg.artifacts/"kmeans.joblib"),
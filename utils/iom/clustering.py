@@ -3,37 +3,71 @@ import numpy as np
 import pandas as pd
 from sklearn.cluster import KMeans
 from .config import AppConfig
-from .features import FeatureBuilder
+from .features import FeatureBuilder, CompiledFeatures, PIPE_NAME, SPEC_NAME
+from .registry import get_registry
+from .feature_cache import store_fitted
 from pathlib import Path
 
 MODEL_NAME = "kmeans.joblib"
+GMM_NAME = "gmm.joblib"
 CENTROIDS = "centroids.csv"
 
+def model_input(model, X):
+    """X in the dtype `model` was fitted in; sklearn's KMeans kernels reject mixed float32/float64 input."""
+    centers = getattr(model, "cluster_centers_", None)
+    return X if centers is None or X.dtype == centers.dtype else X.astype(centers.dtype)
+
 class Clusterer:
     def __init__(self, cfg: AppConfig):
         self.cfg = cfg
         self.model = None
         self.feats = FeatureBuilder(cfg)
 
-    def fit(self, df: pd.DataFrame):
-        X = self.feats.build(df, fit=True)
+    def fit(self, df: pd.DataFrame, source=None):
+        if self.cfg.compact_features:
+            self.feats.fit(df); X = self.feats.build_compact(df)
+        else:
+            X = self.feats.build(df, fit=True)
+        if source is not None:
+            # later stages on the same file (quality metrics, sweeps) then skip parse + transform
+            store_fitted(self.cfg, source, X)
         kmeans = KMeans(n_clusters=self.cfg.n_clusters, random_state=self.cfg.random_state)
         kmeans.fit(X)
         self.model = kmeans
         self._save()
         self._save_centroids()
+        # exactly what this fit wrote: a gmm.joblib left from an older fit belongs to another preprocess
+        get_registry(self.cfg).publish(files=[self.cfg.artifacts / n for n in (PIPE_NAME, SPEC_NAME, MODEL_NAME)])
 
     def predict(self, df: pd.DataFrame) -> np.ndarray:
-        model_path = self.cfg.artifacts / MODEL_NAME
-        pipe_path = self.cfg.artifacts / "preprocess.joblib"
+        # one artifact set per call, so a hot swap never mixes old preprocess with new centroids
+        arts = get_registry(self.cfg).current()
+        if arts.kmeans is None:
+            raise FileNotFoundError(self.cfg.artifacts / MODEL_NAME)
+        if self.cfg.compact_features:
+            X = self.feats.build_compact(df, pipe=arts.preprocess)
+        else:
+            X = self.feats.build(df, fit=False, pipe=arts.preprocess)
+        return arts.kmeans.predict(model_input(arts.kmeans, X))
 
-        if self.model is None and model_path.exists():
-            self.model = joblib.load(model_path)
+    def compile(self) -> "CompiledClusterer":
+        arts = get_registry(self.cfg).current()
+        if arts.kmeans is None:
+            raise FileNotFoundError(self.cfg.artifacts / MODEL_NAME)
+        return arts.compiled()
 
-        # force load fitted pipeline
-        self.feats._ensure_pipe_loaded()
-        X = self.feats.build(df, fit=False)
-        return self.model.predict(X)
+    def posterior(self, rows) -> np.ndarray:
+        """GMM posterior over components, (n_rows, n_components); `rows` is a DataFrame or a list of dicts."""
+        arts = get_registry(self.cfg).current()
+        if arts.gmm is None:
+            raise FileNotFoundError(self.cfg.artifacts / GMM_NAME)
+        if isinstance(rows, list) and self.cfg.compiled_inference and arts.kmeans is not None:
+            X = arts.compiled().feats.transform(rows)
+        else:
+            df = pd.DataFrame(rows) if isinstance(rows, list) else rows
+            X = self.feats.build_compact(df, pipe=arts.preprocess) if self.cfg.compact_features \
+                else self.feats.build(df, fit=False, pipe=arts.preprocess)
+        return arts.compiled_gmm().predict_proba(X)
 
     def _save(self):
         out = self.cfg.artifacts / MODEL_NAME
@@ -43,3 +77,53 @@ class Clusterer:
     def _save_centroids(self):
         c = self.model.cluster_centers_
         pd.DataFrame(c).to_csv(self.cfg.artifacts / CENTROIDS, index=False)
+
+class CompiledClusterer:
+    """Nearest-centroid assignment on plain arrays; same arithmetic as KMeans.predict (||c||² - 2·x·c)."""
+    def __init__(self, feats: CompiledFeatures, centers: np.ndarray):
+        self.feats = feats
+        self.centers = np.ascontiguousarray(centers, dtype=float)
+        self.centers_sq = np.einsum("ij,ij->i", self.centers, self.centers)
+
+    def predict(self, rows) -> np.ndarray:
+        X = self.feats.transform(rows)
+        return np.argmin(self.centers_sq - 2.0 * (X @ self.centers.T), axis=1)
+
+def _precision_factors(gmm) -> np.ndarray:
+    """precisions_cholesky_ of any covariance_type as (K, d, d) upper-triangular factors."""
+    K, d = gmm.means_.shape; pc = np.asarray(gmm.precisions_cholesky_, dtype=float)
+    if gmm.covariance_type == "full":
+        return pc
+    if gmm.covariance_type == "tied":
+        return np.broadcast_to(pc, (K, d, d)).copy()
+    if gmm.covariance_type == "diag":
+        return pc[:, :, None] * np.eye(d)
+    return pc[:, None, None] * np.eye(d)  # spherical
+
+class CompiledGMM:
+    """GaussianMixture posterior from the precision Cholesky factors P_k, precomputed once:
+    log w_k + log N(x|k) = c_k - ½‖x·P_k - μ_k·P_k‖², with c_k = log w_k - ½·d·log 2π + log det P_k.
+    All components are one (n×d)·(d×K·d) product, a row-wise sum of squares and a softmax; same result as
+    predict_proba, without its per-component loop or a sparse -> dense copy of the whole chunk."""
+    def __init__(self, gmm, chunk_rows: int = 65536):
+        K, d = gmm.means_.shape; P = _precision_factors(gmm)
+        self.n_components = K; self.d = d; self.chunk_rows = chunk_rows
+        self.P = np.ascontiguousarray(P.transpose(1, 0, 2).reshape(d, K * d))  # block k of the columns = P_k
+        self.mu = np.einsum("kd,kde->ke", np.asarray(gmm.means_, dtype=float), P).reshape(-1)
+        log_det = np.log(np.diagonal(P, axis1=1, axis2=2)).sum(axis=1)
+        self.const = np.log(np.asarray(gmm.weights_, dtype=float)) - 0.5 * d * np.log(2 * np.pi) + log_det
+
+    def log_joint(self, X) -> np.ndarray:
+        """log w_k + log N(x|k) for a dense block of rows."""
+        Y = np.asarray(X) @ self.P  # float32 features are promoted to float64 here
+        Y -= self.mu; Y *= Y
+        return self.const - 0.5 * Y.reshape(len(Y), self.n_components, self.d).sum(axis=2)
+
+    def predict_proba(self, X) -> np.ndarray:
+        out = np.empty((X.shape[0], self.n_components))
+        for s in range(0, X.shape[0], self.chunk_rows):
+            block = X[s:s + self.chunk_rows]
+            L = self.log_joint(block.toarray() if hasattr(block, "toarray") else block)
+            L -= L.max(axis=1, keepdims=True); np.exp(L, out=L); L /= L.sum(axis=1, keepdims=True)
+            out[s:s + len(L)] = L
+        return out
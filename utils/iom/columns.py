@@ -0,0 +1,19 @@
+"""Header matching shared by the normalizer and the learner-events builder."""
+import re
+
+def col_key(name) -> str:
+    """Case- and punctuation-insensitive form of a column name: 'Student ID' -> 'studentid'."""
+    return re.sub(r'\W+', '', str(name).lower())
+
+def lookup(cols_by_key: dict, names):
+    return next((cols_by_key[col_key(n)] for n in names if col_key(n) in cols_by_key), None)
+
+def find_col(columns, names):
+    """First of `names` (in preference order) present in `columns`, as spelled in `columns`; None if absent."""
+    return lookup({col_key(c): c for c in columns}, names)
+
+def pick_columns(columns, aliases: dict) -> dict:
+    """canonical name -> source column for every alias list that matches."""
+    cols = {col_key(c): c for c in columns}
+    found = {key: lookup(cols, alts) for key, alts in aliases.items()}
+    return {k: c for k, c in found.items() if c is not None}
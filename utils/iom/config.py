@@ -13,14 +13,71 @@ class AppConfig:
     numeric: list
     categorical: list
     difficulty_map: dict
+    compiled_inference: bool = False
+    compact_features: bool = False
+    microbatch_enabled: bool = False
+    microbatch_window_ms: float = 2.0
+    microbatch_max_batch: int = 64
+    microbatch_workers: int = 4
+    recommend_table: bool = False
+    recommend_mode: str = "hard"
+    recommend_cache_size: int = 0
+    recommend_cache_decimals: int = 6
+    batch_chunksize: int = 100000
+    batch_workers: int = 0
+    batch_format: str = "csv"
+    batch_max_jobs: int = 1
+    batch_job_ttl_seconds: float = 3600.0
+    registry_poll_seconds: float = 2.0
+    registry_keep_versions: int = 5
+    feature_cache_dir: Path = Path("data/cache/features")
+    feature_cache_max_gb: float = 20.0
+    profiles_dir: Path = Path("reports/profiles")
+    profiles_cache_size: int = 100000
+    profiles_mongo_fallback: bool = False
+    mongo_uri: str | None = None
+    mongo_db: str = "iom"
+    mongo_collection: str = "learners"
+    mongo_backend: str = "pymongo"
+    mongo_max_pool_size: int = 100
+    mongo_min_pool_size: int = 0
+    mongo_connect_timeout_ms: int = 2000
+    mongo_server_selection_timeout_ms: int = 2000
+    mongo_socket_timeout_ms: int = 10000
+    mongo_read_preference: str = "primaryPreferred"
     @staticmethod
     def load(path: str = "config.yaml") -> "AppConfig":
         with open(path, "r") as f:
             cfg = yaml.safe_load(f)
-        p = cfg["paths"]; t = cfg["training"]["kmeans"]; feats = cfg["features"]
+        p = cfg["paths"]; t = cfg["training"]["kmeans"]; feats = cfg["features"]; srv = cfg.get("serving") or {}
+        mb = srv.get("microbatch") or {}; rc = srv.get("response_cache") or {}
+        bt = cfg.get("batch") or {}
+        reg = cfg.get("registry") or {}
+        fc = cfg.get("feature_cache") or {}
+        pr = cfg.get("profiles") or {}
+        mg = cfg.get("mongo") or {}
         return AppConfig(
             raw=Path(p["raw"]), processed=Path(p["processed"]), knowledge=Path(p["knowledge"]),
             artifacts=Path(p["artifacts"]), reports=Path(p["reports"]),
             n_clusters=t["n_clusters"], random_state=t["random_state"],
-            numeric=feats["numeric"], categorical=feats["categorical"], difficulty_map=feats["difficulty_map"]
+            numeric=feats["numeric"], categorical=feats["categorical"], difficulty_map=feats["difficulty_map"],
+            compiled_inference=bool(srv.get("compiled", False)), compact_features=bool(feats.get("compact", False)),
+            microbatch_enabled=bool(mb.get("enabled", False)), microbatch_window_ms=float(mb.get("window_ms", 2.0)),
+            microbatch_max_batch=int(mb.get("max_batch", 64)), microbatch_workers=int(mb.get("workers", 4)),
+            recommend_table=bool(srv.get("recommend_table", False)), recommend_mode=str(srv.get("mode", "hard")),
+            recommend_cache_size=int(rc.get("size", 0)), recommend_cache_decimals=int(rc.get("decimals", 6)),
+            batch_chunksize=int(bt.get("chunksize", 100000)), batch_workers=int(bt.get("workers", 0)),
+            batch_format=str(bt.get("format", "csv")), batch_max_jobs=int(bt.get("max_jobs", 1)),
+            batch_job_ttl_seconds=float(bt.get("job_ttl_seconds", 3600)),
+            registry_poll_seconds=float(reg.get("poll_seconds", 2.0)), registry_keep_versions=int(reg.get("keep_versions", 5)),
+            feature_cache_dir=Path(fc.get("dir", "data/cache/features")), feature_cache_max_gb=float(fc.get("max_gb", 20.0)),
+            profiles_dir=Path(pr.get("dir", Path(p["reports"]) / "profiles")), profiles_cache_size=int(pr.get("cache_size", 100000)),
+            profiles_mongo_fallback=bool(pr.get("mongo_fallback", False)),
+            mongo_uri=mg.get("uri"), mongo_db=str(mg.get("db", "iom")), mongo_collection=str(mg.get("collection", "learners")),
+            mongo_backend=str(mg.get("backend", "pymongo")),
+            mongo_max_pool_size=int(mg.get("max_pool_size", 100)), mongo_min_pool_size=int(mg.get("min_pool_size", 0)),
+            mongo_connect_timeout_ms=int(mg.get("connect_timeout_ms", 2000)),
+            mongo_server_selection_timeout_ms=int(mg.get("server_selection_timeout_ms", 2000)),
+            mongo_socket_timeout_ms=int(mg.get("socket_timeout_ms", 10000)),
+            mongo_read_preference=str(mg.get("read_preference", "primaryPreferred")),
         )
@@ -1,10 +1,73 @@
+import operator
 import pandas as pd
 from pathlib import Path
 from .config import AppConfig
 
 DEF_INPUT = "data/raw/student_performance.csv"
 
-def load_dataframe(cfg: AppConfig, path: str | None = None) -> pd.DataFrame:
-    csv_path = Path(path or DEF_INPUT)
-    df = pd.read_csv(csv_path)
-    return df
+# filters use the pyarrow/pandas DNF tuple form: [("difficulty_level", ">=", 1), ("__source_file", "in", ["a.csv"])]
+_OPS = {"==": operator.eq, "=": operator.eq, "!=": operator.ne, "<": operator.lt, "<=": operator.le,
+        ">": operator.gt, ">=": operator.ge}
+
+def is_parquet(path) -> bool:
+    p = Path(path)
+    return p.suffix.lower() in (".parquet", ".pq") or p.is_dir()
+
+def _dataset(path):
+    # hive partitioning: master_full/__source_file=a.csv/part-*.parquet restores the partition column
+    # (only "." is ignored: pyarrow's default also skips "_" and so every __source_file= directory)
+    import pyarrow.dataset as ds
+    return ds.dataset(str(path), format="parquet", partitioning="hive", ignore_prefixes=["."])
+
+def _expression(filters):
+    import pyarrow.parquet as pq
+    return pq.filters_to_expression(filters) if filters else None
+
+def apply_filters(df: pd.DataFrame, filters) -> pd.DataFrame:
+    """The same filters evaluated in pandas, for inputs without pushdown (CSV)."""
+    if not filters:
+        return df
+    mask = pd.Series(True, index=df.index)
+    for col, op, val in filters:
+        if op == "in": mask &= df[col].isin(val)
+        elif op == "not in": mask &= ~df[col].isin(val)
+        else: mask &= _OPS[op](df[col], val)
+    return df[mask]
+
+def _usecols(columns, filters):
+    return None if columns is None else list(dict.fromkeys([*columns, *(c for c, _, _ in filters or [])]))
+
+def _select(df: pd.DataFrame, columns, filters) -> pd.DataFrame:
+    df = apply_filters(df, filters)
+    return df if columns is None else df[list(columns)]
+
+def count_rows(path, filters=None) -> int | None:
+    if not is_parquet(path):
+        return None
+    return _dataset(path).count_rows(filter=_expression(filters))
+
+def dataset_schema(path):
+    return _dataset(path).schema
+
+def column_names(path) -> list[str]:
+    if is_parquet(path):
+        return list(_dataset(path).schema.names)
+    return list(pd.read_csv(path, nrows=0).columns)
+
+def iter_chunks(path, chunksize: int, columns: list | None = None, filters=None, dtype=None):
+    # dtype: read_csv column types for CSV input (Parquet is typed already)
+    if is_parquet(path):
+        # projection and predicates are pushed into the scan; row groups whose statistics rule them out are skipped
+        for batch in _dataset(path).to_batches(columns=columns, filter=_expression(filters), batch_size=chunksize):
+            if batch.num_rows:
+                yield batch.to_pandas()
+    else:
+        for chunk in pd.read_csv(path, chunksize=chunksize, usecols=_usecols(columns, filters), low_memory=False, dtype=dtype):
+            yield _select(chunk, columns, filters)
+
+def load_dataframe(cfg: AppConfig, path: str | None = None, columns: list | None = None, filters=None) -> pd.DataFrame:
+    """CSV file, Parquet file or partitioned Parquet dataset; `columns` projects, `filters` selects rows."""
+    src = Path(path or DEF_INPUT)
+    if is_parquet(src):
+        return _dataset(src).to_table(columns=columns, filter=_expression(filters)).to_pandas()
+    return _select(pd.read_csv(src, usecols=_usecols(columns, filters), low_memory=False), columns, filters)
@@ -0,0 +1,185 @@
+from __future__ import annotations
+import hashlib, json, os, shutil, time, uuid
+from pathlib import Path
+import numpy as np
+from .config import AppConfig
+from .features import FeatureBuilder, PIPE_NAME, dense32
+from .registry import get_registry, file_hash
+from .data_load import column_names, iter_chunks
+
+# <cache dir>/<key>.f32   raw C-order float32 feature matrix, memory-mapped on read
+# <cache dir>/<key>.json  shape, source fingerprint, last_used (drives LRU eviction)
+# <cache dir>/fitted/<key>.joblib  preprocess pipeline fitted on a whole input file (small, not evicted)
+SAMPLE_BYTES = 1 << 20
+
+def file_fingerprint(path) -> dict:
+    """size + mtime + sha1 of the first and last MiB: cheap, and catches in-place rewrites that keep the size.
+    A dataset directory fingerprints every file in it."""
+    p = Path(path)
+    if p.is_dir():
+        return {"files": {str(f.relative_to(p)): file_fingerprint(f) for f in sorted(p.rglob("*")) if f.is_file()}}
+    st = p.stat()
+    h = hashlib.sha1()
+    with open(p, "rb") as f:
+        h.update(f.read(SAMPLE_BYTES))
+        if st.st_size > SAMPLE_BYTES:
+            f.seek(max(SAMPLE_BYTES, st.st_size - SAMPLE_BYTES)); h.update(f.read(SAMPLE_BYTES))
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sample_sha1": h.hexdigest()}
+
+def cache_key(source_fp: dict, spec: dict, preprocess_hash: str, compact: bool = False) -> str:
+    blob = json.dumps({"src": source_fp, "spec": spec, "preprocess": preprocess_hash, "dtype": "float32", "compact": compact},
+                      sort_keys=True)
+    return hashlib.sha256(blob.encode()).hexdigest()[:32]
+
+class FeatureCache:
+    def __init__(self, root, max_bytes: int):
+        self.root = Path(root); self.max_bytes = max_bytes
+        self.hits = 0; self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _paths(self, key):
+        return self.root / f"{key}.f32", self.root / f"{key}.json"
+
+    def data_path(self, key: str) -> Path:
+        return self._paths(key)[0]
+
+    def fitted_path(self, key: str) -> Path:
+        return self.root / "fitted" / f"{key}.joblib"
+
+    def put_fitted(self, key: str, src):
+        """Keep a copy of the pipeline file fitted on the input behind `key` (fit_key_for)."""
+        if not self.enabled:
+            return
+        out = self.fitted_path(key); out.parent.mkdir(parents=True, exist_ok=True)
+        tmp = out.with_name(f".{out.name}.{uuid.uuid4().hex[:8]}")
+        shutil.copyfile(src, tmp); os.replace(tmp, out)
+
+    def get(self, key: str):
+        data, meta_path = self._paths(key)
+        if not self.enabled or not (data.exists() and meta_path.exists()):
+            self.misses += 1
+            return None
+        meta = json.loads(meta_path.read_text())
+        meta["last_used"] = time.time()
+        _write_json(meta_path, meta)
+        self.hits += 1
+        if meta["shape"][0] == 0:
+            return np.empty(meta["shape"], dtype=np.float32)
+        return np.memmap(data, dtype=np.float32, mode="r", shape=tuple(meta["shape"]))
+
+    def writer(self, key: str, meta: dict | None = None) -> "CacheWriter":
+        return CacheWriter(self, key, meta or {})
+
+    def put(self, key: str, X, meta: dict | None = None):
+        with self.writer(key, meta) as w:
+            w.append(X)
+        return self.get(key)
+
+    def entries(self) -> list[dict]:
+        out = []
+        for m in self.root.glob("*.json"):
+            try:
+                meta = json.loads(m.read_text())
+            except (OSError, ValueError):
+                continue
+            data = m.with_suffix(".f32")
+            meta["key"] = m.stem; meta["bytes"] = data.stat().st_size if data.exists() else 0
+            out.append(meta)
+        return out
+
+    def evict(self, keep: str | None = None):
+        """Drop least-recently-used entries until the cache fits in max_bytes (never the entry just written)."""
+        entries = sorted(self.entries(), key=lambda e: e.get("last_used", 0))
+        total = sum(e["bytes"] for e in entries)
+        for e in entries:
+            if total <= self.max_bytes:
+                break
+            if e["key"] == keep:
+                continue
+            for p in self._paths(e["key"]):
+                p.unlink(missing_ok=True)
+            total -= e["bytes"]
+
+class CacheWriter:
+    """Streams row blocks into a cache entry; the entry becomes visible atomically on close."""
+    def __init__(self, cache: FeatureCache, key: str, meta: dict):
+        self.cache = cache; self.key = key; self.meta = meta
+        cache.root.mkdir(parents=True, exist_ok=True)
+        self.tmp = cache.root / f".{key}.{uuid.uuid4().hex[:8]}.tmp"
+        self._f = open(self.tmp, "wb"); self.rows = 0; self.cols = None
+
+    @property
+    def path(self) -> Path:
+        return self.tmp
+
+    def append(self, X):
+        X = dense32(X)
+        self.cols = X.shape[1] if self.cols is None else self.cols
+        self._f.write(X.tobytes()); self.rows += len(X)
+
+    def close(self):
+        self._f.close()
+        if not self.cache.enabled:
+            self.tmp.unlink(missing_ok=True)
+            return
+        data, meta_path = self.cache._paths(self.key)
+        os.replace(self.tmp, data)
+        _write_json(meta_path, {**self.meta, "shape": [self.rows, self.cols or 0], "created": time.time(), "last_used": time.time()})
+        self.cache.evict(keep=self.key)
+
+    def discard(self):
+        self._f.close(); self.tmp.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None: self.close()
+        else: self.discard()
+
+def _write_json(path: Path, obj):
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}")
+    tmp.write_text(json.dumps(obj)); os.replace(tmp, path)
+
+def get_cache(cfg: AppConfig) -> FeatureCache:
+    return FeatureCache(cfg.feature_cache_dir, int(cfg.feature_cache_max_gb * (1 << 30)))
+
+def spec_of(num_cols, cat_cols) -> dict:
+    return {"numeric": list(num_cols), "categorical": list(cat_cols)}
+
+def key_for(cfg: AppConfig, path, preprocess_hash: str) -> str:
+    return cache_key(file_fingerprint(path), spec_of(cfg.numeric, cfg.categorical), preprocess_hash, cfg.compact_features)
+
+def fit_key_for(cfg: AppConfig, path) -> str:
+    """Key of a preprocess pipeline fitted on all of `path`: it depends on the data and the feature spec only."""
+    return cache_key(file_fingerprint(path), spec_of(cfg.numeric, cfg.categorical), "fitted")
+
+def store_fitted(cfg: AppConfig, path, X):
+    """After a fit on `path`, cache its feature matrix under the preprocess.joblib just written."""
+    cache = get_cache(cfg)
+    if cache.enabled:
+        cache.put(key_for(cfg, path, file_hash(cfg.artifacts / PIPE_NAME)), X, {"source": str(path)})
+
+def load_features(cfg: AppConfig, path, chunksize: int = 500000):
+    """Float32 feature matrix of `path` under the active preprocess: a memmap on a hit, transformed and cached on a miss."""
+    arts = get_registry(cfg).current()
+    if arts.preprocess is None:
+        raise FileNotFoundError(cfg.artifacts / PIPE_NAME)
+    cache = get_cache(cfg)
+    key = key_for(cfg, path, arts.hashes["preprocess.joblib"])
+    X = cache.get(key)
+    if X is not None:
+        return X
+    fb = FeatureBuilder(cfg); feat_cols = set(cfg.numeric + cfg.categorical)
+    reader = iter_chunks(path, chunksize, columns=[c for c in column_names(path) if c in feat_cols])
+    build = (lambda chunk: fb.build_compact(chunk, pipe=arts.preprocess)) if cfg.compact_features else \
+            (lambda chunk: dense32(fb.build(chunk, fit=False, pipe=arts.preprocess)))
+    if not cache.enabled:
+        return np.vstack([build(chunk) for chunk in reader])
+    with cache.writer(key, {"source": str(path)}) as w:
+        for chunk in reader:
+            w.append(build(chunk))
+    return cache.get(key)
@@ -1,29 +1,137 @@
-import json, joblib, pandas as pd
+import json, joblib, shutil, numpy as np, pandas as pd
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 from utils.iom.config import AppConfig
+from utils.iom.registry import get_registry
 SPEC_NAME="feature_spec.json"; PIPE_NAME="preprocess.joblib"
 class FeatureBuilder:
     def __init__(self, cfg: AppConfig):
-        self.cfg=cfg; self.pipe=None
+        self.cfg=cfg; self.pipe=None; self._stream=None; self._compiled=(None, None)
     def _ensure_pipe_loaded(self):
         if self.pipe is None:
-            path=self.cfg.artifacts/PIPE_NAME
-            if path.exists(): self.pipe=joblib.load(path)
-    def build(self, df: pd.DataFrame, fit=True):
-        df=df.copy()
+            self.pipe=get_registry(self.cfg).current().preprocess
+    def build(self, df: pd.DataFrame, fit=True, pipe=None):
         num_cols=[c for c in self.cfg.numeric if c in df.columns]
         cat_cols=[c for c in self.cfg.categorical if c in df.columns]
-        if fit or self.pipe is None:
-            pre=ColumnTransformer([("num",StandardScaler(),num_cols),("cat",OneHotEncoder(handle_unknown="ignore"),cat_cols)])
-            self.pipe=Pipeline([("pre",pre)])
         if fit:
+            self.pipe=self._new_pipe(num_cols, cat_cols)
             X=self.pipe.fit_transform(df[num_cols+cat_cols])
-            (self.cfg.artifacts/SPEC_NAME).write_text(json.dumps({"numeric":num_cols,"categorical":cat_cols},indent=2))
-            (self.cfg.artifacts).mkdir(parents=True, exist_ok=True)
-            joblib.dump(self.pipe, self.cfg.artifacts/PIPE_NAME)
+            self._save(num_cols, cat_cols)
         else:
-            self._ensure_pipe_loaded()
-            X=self.pipe.transform(df[num_cols+cat_cols])
+            if pipe is None:
+                self._ensure_pipe_loaded(); pipe=self.pipe
+            if pipe is None: raise FileNotFoundError(self.cfg.artifacts/PIPE_NAME)
+            X=pipe.transform(df[num_cols+cat_cols])
+        return X
+    def fit(self, df: pd.DataFrame):
+        """Fit and save the pipeline without materialising its (float64, maybe sparse) output."""
+        num_cols=[c for c in self.cfg.numeric if c in df.columns]
+        cat_cols=[c for c in self.cfg.categorical if c in df.columns]
+        self.pipe=self._new_pipe(num_cols, cat_cols).fit(df[num_cols+cat_cols])
+        self._save(num_cols, cat_cols)
+        return self.pipe
+    def build_compact(self, df, pipe=None, out=None) -> np.ndarray:
+        """Compact mode: dense C-contiguous float32 in the feature_spec.json column layout, written straight
+        into `out` when given; no DataFrame copy and no sparse -> toarray round trip."""
+        if pipe is None:
+            self._ensure_pipe_loaded(); pipe=self.pipe
+        if pipe is None: raise FileNotFoundError(self.cfg.artifacts/PIPE_NAME)
+        if self._compiled[0] is not pipe:
+            self._compiled=(pipe, CompiledFeatures.from_pipe(pipe))
+        return self._compiled[1].transform(df, dtype=np.float32, out=out)
+    @staticmethod
+    def _new_pipe(num_cols, cat_cols):
+        pre=ColumnTransformer([("num",StandardScaler(),num_cols),("cat",OneHotEncoder(handle_unknown="ignore"),cat_cols)])
+        return Pipeline([("pre",pre)])
+    def _save(self, num_cols, cat_cols):
+        (self.cfg.artifacts).mkdir(parents=True, exist_ok=True)
+        (self.cfg.artifacts/SPEC_NAME).write_text(json.dumps({"numeric":num_cols,"categorical":cat_cols},indent=2))
+        joblib.dump(self.pipe, self.cfg.artifacts/PIPE_NAME)
+    def load_fitted(self, path, num_cols, cat_cols):
+        """Reuse a pipeline file fitted earlier on the same data; copied byte for byte, so the preprocess.joblib
+        hash (and every feature cache key built on it) matches that earlier fit."""
+        (self.cfg.artifacts).mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(path, self.cfg.artifacts/PIPE_NAME); self.pipe=joblib.load(path)
+        (self.cfg.artifacts/SPEC_NAME).write_text(json.dumps({"numeric":list(num_cols),"categorical":list(cat_cols)},indent=2))
+        return self.pipe
+    def partial_fit(self, df: pd.DataFrame):
+        """Streaming fit: accumulate scaler moments and the category union chunk by chunk, then call finish_fit()."""
+        if self._stream is None:
+            num_cols=[c for c in self.cfg.numeric if c in df.columns]
+            cat_cols=[c for c in self.cfg.categorical if c in df.columns]
+            self._stream={"num":num_cols, "cat":cat_cols, "scaler":StandardScaler(), "cats":{c:[] for c in cat_cols}}
+        st=self._stream
+        if st["num"]: st["scaler"].partial_fit(df[st["num"]])
+        for c in st["cat"]:
+            st["cats"][c]=pd.unique(pd.concat([pd.Series(st["cats"][c], dtype=df[c].dtype), df[c]], ignore_index=True))
+        return self
+    def finish_fit(self):
+        """Materialise the fitted pipeline from the streamed statistics and save it like build(fit=True)."""
+        st=self._stream; self._stream=None
+        num_cols, cat_cols=st["num"], st["cat"]
+        # fit the ColumnTransformer on one synthetic row per category, then swap in the streamed scaler
+        n=max([len(st["cats"][c]) for c in cat_cols]+[1])
+        proto=pd.DataFrame({**{c:np.zeros(n) for c in num_cols},
+                            **{c:np.resize(np.asarray(st["cats"][c]), n) for c in cat_cols}})
+        self.pipe=self._new_pipe(num_cols, cat_cols)
+        self.pipe.fit(proto[num_cols+cat_cols])
+        pre=self.pipe.named_steps["pre"]
+        pre.transformers_=[(name, st["scaler"] if name=="num" else trans, cols) for name, trans, cols in pre.transformers_]
+        self._save(num_cols, cat_cols)
+        return self.pipe
+    def compile(self) -> "CompiledFeatures":
+        self._ensure_pipe_loaded()
+        if self.pipe is None: raise FileNotFoundError(self.cfg.artifacts/PIPE_NAME)
+        return CompiledFeatures.from_pipe(self.pipe)
+
+def dense32(X) -> np.ndarray:
+    """C-order float32 copy of a (possibly sparse) feature matrix, the layout of the feature cache and the spills."""
+    return np.ascontiguousarray(X.toarray() if hasattr(X, "toarray") else X, dtype=np.float32)
+
+def _column_values(rows, name):
+    # rows: list of dicts (request payloads) or any column mapping (DataFrame, dict of arrays)
+    if isinstance(rows, list): return np.array([r[name] for r in rows])
+    return np.asarray(rows[name])
+
+class CompiledFeatures:
+    """Plain-NumPy replay of the fitted preprocess pipeline (StandardScaler + OneHotEncoder)."""
+    def __init__(self, num_cols, mean, scale, cat_cols, categories):
+        self.num_cols=list(num_cols); self.cat_cols=list(cat_cols)
+        self.mean=mean; self.scale=scale; self.categories=[np.asarray(c) for c in categories]
+        self.n_features=len(self.num_cols)+sum(len(c) for c in self.categories)
+    @staticmethod
+    def from_pipe(pipe) -> "CompiledFeatures":
+        pre=pipe.named_steps["pre"]
+        num_cols=[]; cat_cols=[]; mean=None; scale=None; categories=[]
+        for name, trans, cols in pre.transformers_:
+            if trans=="drop" or len(cols)==0: continue
+            if isinstance(trans, StandardScaler):
+                num_cols=list(cols); mean=trans.mean_; scale=trans.scale_
+            elif isinstance(trans, OneHotEncoder) and trans.drop is None and trans.handle_unknown in ("ignore","infrequent_if_exist") \
+                    and not getattr(trans, "infrequent_categories_", None):
+                cat_cols=list(cols); categories=trans.categories_
+            else:
+                raise ValueError(f"cannot compile transformer {name!r}: {trans!r}")
+        return CompiledFeatures(num_cols, mean, scale, cat_cols, categories)
+    def layout(self) -> list[str]:
+        """Output column names: numeric columns, then one `col=category` column per category."""
+        return self.num_cols+[f"{c}={v}" for c, cats in zip(self.cat_cols, self.categories) for v in cats]
+    def transform(self, rows, dtype=float, out=None) -> np.ndarray:
+        # column at a time into one preallocated buffer: no per-column stacking, no one-hot temporaries
+        n=len(rows)
+        if out is None: X=np.empty((n, self.n_features), dtype=dtype)
+        elif out.shape!=(n, self.n_features) or not out.flags.c_contiguous: raise ValueError("out must be a C-contiguous (n_rows, n_features) array")
+        else: X=out
+        for i, c in enumerate(self.num_cols):
+            col=X[:, i]; col[:]=_column_values(rows, c)
+            if self.mean is not None: col-=self.mean[i]
+            if self.scale is not None: col/=self.scale[i]
+        j=len(self.num_cols)
+        X[:, j:]=0
+        for c, cats in zip(self.cat_cols, self.categories):
+            pos=pd.Index(cats).get_indexer(_column_values(rows, c))
+            hit=np.flatnonzero(pos>=0)  # unknown categories stay all-zero, as with handle_unknown="ignore"
+            X[hit, j+pos[hit]]=1
+            j+=len(cats)
         return X
@@ -0,0 +1,56 @@
+from __future__ import annotations
+import os
+from pathlib import Path
+import numpy as np, pandas as pd
+from .mongo_sink import LEARNER_FIELDS, doc_frame
+
+def row_fingerprints(df: pd.DataFrame, fields: dict = LEARNER_FIELDS, fill_missing: bool = True) -> np.ndarray:
+    """uint64 hash per row of the fields as they are upserted, so any change in a written value changes the hash."""
+    return pd.util.hash_pandas_object(doc_frame(df, fields, fill_missing), index=False).to_numpy(dtype=np.uint64)
+
+class FingerprintIndex:
+    """Sidecar learner_id -> fingerprint index (.npz) recording what the collection last received."""
+    def __init__(self, path):
+        self.path = Path(path)
+        self.ids = np.array([], dtype=object)
+        self.hashes = np.array([], dtype=np.uint64)
+        if self.path.exists():
+            with np.load(self.path, allow_pickle=False) as z:
+                self.ids = z["ids"].astype(object); self.hashes = z["hashes"]
+        self._index = pd.Index(self.ids)
+        self._seen_ids: list[np.ndarray] = []; self._seen_hashes: list[np.ndarray] = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def changed(self, ids: np.ndarray, hashes: np.ndarray) -> np.ndarray:
+        """Mask of rows that are new or differ from the indexed fingerprint; the rows are recorded as seen."""
+        ids = np.asarray(ids, dtype=object)
+        pos = self._index.get_indexer(ids)
+        mask = pos < 0
+        known = ~mask
+        mask[known] = self.hashes[pos[known]] != hashes[known]
+        self._seen_ids.append(ids); self._seen_hashes.append(hashes)
+        return mask
+
+    def missing(self) -> np.ndarray:
+        """Indexed ids that were not seen in this run."""
+        seen = np.concatenate(self._seen_ids) if self._seen_ids else np.array([], dtype=object)
+        return self.ids[~self._index.isin(seen)]
+
+    def commit(self, drop_missing: bool = False):
+        """Persist seen rows (last occurrence wins); ids not seen are kept unless `drop_missing`."""
+        seen = pd.Series(np.concatenate(self._seen_hashes) if self._seen_hashes else np.array([], dtype=np.uint64),
+                         index=np.concatenate(self._seen_ids) if self._seen_ids else np.array([], dtype=object))
+        seen = seen[~seen.index.duplicated(keep="last")]
+        if not drop_missing:
+            old = pd.Series(self.hashes, index=self.ids)
+            seen = pd.concat([old[~old.index.isin(seen.index)], seen])
+        self.ids = seen.index.to_numpy(dtype=object); self.hashes = seen.to_numpy(dtype=np.uint64)
+        self._index = pd.Index(self.ids)
+        self._seen_ids, self._seen_hashes = [], []
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, ids=self.ids.astype(str), hashes=self.hashes)
+        os.replace(tmp, self.path)
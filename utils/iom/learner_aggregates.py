@@ -0,0 +1,110 @@
+from __future__ import annotations
+import json, os
+from pathlib import Path
+import numpy as np, pandas as pd
+from .data_load import iter_chunks
+from .feature_cache import file_fingerprint
+
+# profile feature -> events column it is the per-learner mean of (train_task_2_1_profile)
+FEATURES = {"accuracy_mean": "correct", "time_spent_mean": "time_spent_sec", "difficulty_mean": "difficulty"}
+VALUES = list(dict.fromkeys(FEATURES.values()))
+
+def _grow(a: np.ndarray, rows: int) -> np.ndarray:
+    out = np.zeros((rows, a.shape[1]), dtype=a.dtype); out[:len(a)] = a
+    return out
+
+class AggregateStore:
+    """Running per-learner sums and non-null counts of the event columns, in arrays indexed by an integer
+    learner key. A batch of events is merged with one bincount per column, so the cost of an update is
+    O(batch) and the feature matrix is a division over learners, never a rescan of the history.
+    `sources` remembers which event files (by fingerprint) are already folded in."""
+    def __init__(self, ids=(), sums=None, counts=None, sources: dict | None = None):
+        self.ids = list(ids)
+        self._key = {lid: k for k, lid in enumerate(self.ids)}
+        n = len(self.ids); cap = max(1024, n)
+        self._sums = np.zeros((cap, len(VALUES))); self._counts = np.zeros((cap, len(VALUES)), dtype=np.int64)
+        if sums is not None:
+            self._sums[:n] = sums; self._counts[:n] = counts
+        self.sources = dict(sources or {})
+
+    def __len__(self):
+        return len(self.ids)
+
+    def keys_for(self, learner_ids) -> tuple[np.ndarray, np.ndarray]:
+        """(key of each distinct id in the batch, per-row index into those keys); unseen ids are appended
+        and the arrays grow by doubling."""
+        codes, uniq = pd.factorize(pd.Series(learner_ids, dtype=object), sort=False)
+        keys = np.empty(len(uniq), dtype=np.int64)
+        for j, lid in enumerate(uniq):
+            k = self._key.get(lid)
+            if k is None:
+                k = self._key[lid] = len(self.ids); self.ids.append(lid)
+            keys[j] = k
+        if len(self.ids) > len(self._sums):
+            cap = max(len(self.ids), 2 * len(self._sums))
+            self._sums = _grow(self._sums, cap); self._counts = _grow(self._counts, cap)
+        return keys, codes
+
+    def merge(self, events: pd.DataFrame):
+        keys, codes = self.keys_for(events["learner_id"].astype(str)); m = len(keys)
+        for j, c in enumerate(VALUES):  # bincount over the batch's own learners only: O(batch)
+            v = pd.to_numeric(events[c], errors="coerce").to_numpy(dtype=float); ok = ~np.isnan(v)
+            self._sums[keys, j] += np.bincount(codes[ok], weights=v[ok], minlength=m)
+            self._counts[keys, j] += np.bincount(codes[ok], minlength=m)
+        return self
+
+    def totals(self, learner_ids) -> tuple[np.ndarray, np.ndarray]:
+        """(sums, counts) rows for `learner_ids`, in VALUES order; zeros for learners never merged."""
+        keys = np.array([self._key.get(lid, -1) for lid in learner_ids], dtype=np.int64); ok = keys >= 0
+        sums = np.zeros((len(keys), len(VALUES))); counts = np.zeros((len(keys), len(VALUES)), dtype=np.int64)
+        sums[ok] = self._sums[keys[ok]]; counts[ok] = self._counts[keys[ok]]
+        return sums, counts
+
+    def ingest(self, paths, chunksize: int = 500000) -> dict:
+        """Fold in every event file not seen yet. A file whose fingerprint changed since it was merged cannot
+        be subtracted out, so that (and only that) triggers a rebuild from all `paths`."""
+        paths = [Path(p) for p in paths if Path(p).exists()]
+        fps = {str(p): file_fingerprint(p) for p in paths}
+        if any(s in fps and fps[s] != fp for s, fp in self.sources.items()):
+            self.__init__(); status = "rebuilt"
+        else:
+            status = "incremental"
+        rows = 0
+        for p in paths:
+            if str(p) in self.sources:
+                continue
+            for chunk in iter_chunks(p, chunksize, columns=["learner_id", *VALUES]):
+                self.merge(chunk); rows += len(chunk)
+            self.sources[str(p)] = fps[str(p)]
+        return {"status": status, "new_rows": rows, "learners": len(self)}
+
+    def features(self) -> pd.DataFrame:
+        """Per-learner means (0 where a learner has no value), rows ordered by learner_id like groupby."""
+        n = len(self.ids)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.where(self._counts[:n] > 0, self._sums[:n] / self._counts[:n], 0.0)
+        ids = np.asarray(self.ids, dtype=object)
+        # ids are keyed as text; numeric ids (CSV batches) are ordered and returned as numbers, as groupby would
+        num = pd.to_numeric(pd.Series(ids), errors="coerce")
+        if n and num.notna().all() and (num.astype(str).to_numpy() == ids).all():
+            ids = num.to_numpy()
+        order = np.argsort(ids, kind="stable")
+        cols = {f: means[order, VALUES.index(c)] for f, c in FEATURES.items()}
+        return pd.DataFrame(cols, index=pd.Index(ids[order], name="learner_id"))
+
+    def save(self, path):
+        path = Path(path); path.parent.mkdir(parents=True, exist_ok=True); n = len(self.ids)
+        tmp = path.with_suffix(".tmp.npz")
+        np.savez(tmp, ids=np.asarray(self.ids, dtype=str), sums=self._sums[:n], counts=self._counts[:n],
+                 values=np.asarray(VALUES), sources=np.asarray(json.dumps(self.sources)))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path) -> "AggregateStore":
+        path = Path(path)
+        if not path.exists():
+            return cls()
+        z = np.load(path, allow_pickle=False)
+        if list(z["values"]) != VALUES:  # stored with other columns: start over
+            return cls()
+        return cls(z["ids"].tolist(), z["sums"], z["counts"], json.loads(str(z["sources"])))
@@ -0,0 +1,134 @@
+from __future__ import annotations
+import asyncio, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Sequence
+import numpy as np
+
+class _RowError:
+    """A per-row failure carried back from the executor."""
+    def __init__(self, error: Exception):
+        self.error = error
+
+class MicroBatcher:
+    """Coalesces concurrent single-row predictions into one vectorized call run off the event loop.
+
+    A batch is flushed when `max_batch` rows are queued or `window_ms` has passed since its first row.
+    Up to `workers` batches run concurrently in the executor. A batch whose vectorized call raises is retried row by row.
+    """
+    def __init__(self, predict_fn: Callable[[list], Sequence], window_ms: float = 2.0, max_batch: int = 64,
+                 workers: int = 4):
+        self.predict_fn = predict_fn
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="microbatch")
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._stats = {"requests": 0, "batches": 0, "rows": 0, "errors": 0, "fallbacks": 0, "in_flight": 0,
+                       "max_batch_seen": 0, "predict_seconds": 0.0, "wait_seconds": 0.0}
+        self._sizes = np.zeros(max_batch + 1, dtype=np.int64)
+
+    def _start(self):
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.workers)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, row: dict):
+        if self._task is None or self._task.done():
+            self._start()
+        fut = asyncio.get_running_loop().create_future()
+        self._stats["requests"] += 1
+        await self._queue.put((row, fut, time.perf_counter()))
+        return await fut
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._slots.acquire()
+            loop.create_task(self._dispatch(batch))
+
+    def _predict(self, rows: list) -> tuple[list, bool]:
+        """(one result or _RowError per row, whether it fell back). When the vectorized call raises, the rows are
+        retried one by one, so a single bad row fails only its own request."""
+        try:
+            return list(self.predict_fn(rows)), False
+        except Exception as e:
+            if len(rows) == 1:
+                return [_RowError(e)], False
+        out = []
+        for row in rows:
+            try:
+                out.append(self.predict_fn([row])[0])
+            except Exception as e:
+                out.append(_RowError(e))
+        return out, True
+
+    async def _dispatch(self, batch):
+        loop = asyncio.get_running_loop()
+        rows = [b[0] for b in batch]
+        started = time.perf_counter()
+        self._stats["in_flight"] += 1
+        try:
+            out, fell_back = await loop.run_in_executor(self.executor, self._predict, rows)
+            if fell_back: self._stats["fallbacks"] += 1
+            for (_, fut, _), res in zip(batch, out):
+                if fut.done(): continue
+                if isinstance(res, _RowError):
+                    self._stats["errors"] += 1; fut.set_exception(res.error)
+                else:
+                    fut.set_result(res)
+            if len(out) != len(batch):
+                err = RuntimeError(f"predict_fn returned {len(out)} results for {len(batch)} rows")
+                self._stats["errors"] += 1
+                for _, fut, _ in batch[len(out):]:
+                    if not fut.done(): fut.set_exception(err)
+        except Exception as e:
+            self._stats["errors"] += 1
+            for _, fut, _ in batch:
+                if not fut.done(): fut.set_exception(e)
+        finally:
+            self._stats["in_flight"] -= 1
+            self._slots.release()
+        n = len(batch)
+        self._stats["batches"] += 1
+        self._stats["rows"] += n
+        self._stats["max_batch_seen"] = max(self._stats["max_batch_seen"], n)
+        self._stats["predict_seconds"] += time.perf_counter() - started
+        self._stats["wait_seconds"] += sum(started - t for _, _, t in batch)
+        self._sizes[n] += 1
+
+    def metrics(self) -> dict:
+        s = dict(self._stats)
+        s["queue_depth"] = self._queue.qsize() if self._queue is not None else 0
+        s["window_ms"] = self.window * 1000.0
+        s["max_batch"] = self.max_batch
+        s["avg_batch_size"] = s["rows"] / s["batches"] if s["batches"] else 0.0
+        s["avg_queue_wait_ms"] = 1000.0 * s["wait_seconds"] / s["rows"] if s["rows"] else 0.0
+        s["batch_size_histogram"] = {str(i): int(c) for i, c in enumerate(self._sizes) if c}
+        return s
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,114 @@
+from __future__ import annotations
+import asyncio, inspect, os, weakref
+from functools import lru_cache
+from .config import AppConfig
+
+# One tuned, pooled client per (backend, uri, options) per process. Sync clients (pymongo.MongoClient is
+# thread-safe) serve the batch scripts and sync routes; async clients serve FastAPI handlers and are kept
+# per event loop, because pymongo's AsyncMongoClient binds to the loop it is first used on.
+# backend "mongomock" is an in-process stand-in for the test suite (requirements-dev.txt, see tests/conftest.py).
+DEFAULT_URI = "mongodb://127.0.0.1:27017"
+
+def resolve_uri(cfg: AppConfig | None = None, uri: str | None = None) -> str:
+    return uri or (cfg.mongo_uri if cfg is not None else None) or os.getenv("MONGODB_URI") or DEFAULT_URI
+
+def client_options(cfg: AppConfig | None) -> dict:
+    if cfg is None:
+        return {}
+    return {"maxPoolSize": cfg.mongo_max_pool_size, "minPoolSize": cfg.mongo_min_pool_size,
+            "connectTimeoutMS": cfg.mongo_connect_timeout_ms, "serverSelectionTimeoutMS": cfg.mongo_server_selection_timeout_ms,
+            "socketTimeoutMS": cfg.mongo_socket_timeout_ms, "readPreference": cfg.mongo_read_preference}
+
+def _key(uri, cfg):
+    return (cfg.mongo_backend if cfg is not None else "pymongo", resolve_uri(cfg, uri), tuple(sorted(client_options(cfg).items())))
+
+@lru_cache(maxsize=None)
+def _sync_client(backend: str, uri: str, opts: tuple):
+    if backend == "mongomock":
+        import mongomock
+        return mongomock.MongoClient(uri)
+    from pymongo import MongoClient
+    return MongoClient(uri, **dict(opts))
+
+def get_client(uri: str | None = None, cfg: AppConfig | None = None):
+    """Pooled sync client; `uri` overrides the configured one (the scripts' --mongo flag)."""
+    return _sync_client(*_key(uri, cfg))
+
+def learners(cfg: AppConfig, uri: str | None = None, db: str | None = None, collection: str | None = None):
+    return get_client(uri, cfg)[db or cfg.mongo_db][collection or cfg.mongo_collection]
+
+# ---- async ------------------------------------------------------------------
+class _ThreadedCursor:
+    def __init__(self, coll, args, kwargs):
+        self._coll = coll; self._args = args; self._kwargs = kwargs
+
+    async def to_list(self, length=None):
+        return await asyncio.to_thread(lambda: list(self._coll.find(*self._args, **self._kwargs).limit(length or 0)))
+
+class _ThreadedCollection:
+    """Async collection API over a sync collection, each call on a worker thread: used for the mongomock
+    backend and for a pymongo without the async driver, so handlers never block the loop either way."""
+    def __init__(self, coll):
+        self._coll = coll
+
+    def find(self, *args, **kwargs):
+        return _ThreadedCursor(self._coll, args, kwargs)
+
+    def __getattr__(self, name):
+        fn = getattr(self._coll, name)
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(fn, *args, **kwargs)
+        return call
+
+class _ThreadedDatabase:
+    def __init__(self, db):
+        self._db = db
+
+    def __getitem__(self, name):
+        return _ThreadedCollection(self._db[name])
+
+    async def command(self, *args, **kwargs):
+        return await asyncio.to_thread(self._db.command, *args, **kwargs)
+
+class _ThreadedClient:
+    def __init__(self, client):
+        self._client = client
+
+    def __getitem__(self, name):
+        return _ThreadedDatabase(self._client[name])
+
+    @property
+    def admin(self):
+        return self["admin"]
+
+    def close(self):
+        pass  # the sync client is shared and pooled; it outlives the loop
+
+_ASYNC: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = weakref.WeakKeyDictionary()
+
+def _async_client(backend: str, uri: str, opts: tuple):
+    if backend != "mongomock":
+        try:
+            from pymongo import AsyncMongoClient
+            return AsyncMongoClient(uri, **dict(opts))
+        except ImportError:
+            pass
+    return _ThreadedClient(_sync_client(backend, uri, opts))
+
+def get_async_client(uri: str | None = None, cfg: AppConfig | None = None):
+    """Pooled async client for the running event loop."""
+    clients = _ASYNC.setdefault(asyncio.get_running_loop(), {})
+    key = _key(uri, cfg)
+    if key not in clients:
+        clients[key] = _async_client(*key)
+    return clients[key]
+
+def async_learners(cfg: AppConfig):
+    return get_async_client(None, cfg)[cfg.mongo_db][cfg.mongo_collection]
+
+async def close_async_clients():
+    """Close this loop's async clients (app shutdown)."""
+    for client in (_ASYNC.pop(asyncio.get_running_loop(), None) or {}).values():
+        res = client.close()
+        if inspect.isawaitable(res):
+            await res
@@ -0,0 +1,141 @@
+from __future__ import annotations
+import threading, time, zlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np, pandas as pd
+
+# upserted learner document: field -> (type, default when the column is absent)
+LEARNER_FIELDS = {
+    "learner_id": (str, ""),
+    "time_spent": (float, 0.0),
+    "avg_score": (float, 0.0),
+    "accuracy": (float, 0.0),
+    "difficulty_level": (int, 1),
+    "topic_progress": (float, 0.0),
+    "cluster_kmeans": (int, 0),
+    "cluster_gmm": (int, 0),
+    "gmm_confidence": (float, 0.0),
+}
+
+def _cast_column(s: pd.Series, typ, default) -> pd.Series:
+    if typ is str:
+        return s.astype(str)
+    if typ is int:
+        return pd.to_numeric(s, errors="coerce").fillna(default).astype(np.int64)
+    return pd.to_numeric(s, errors="coerce").astype(float)
+
+def doc_frame(df: pd.DataFrame, fields: dict = LEARNER_FIELDS, fill_missing: bool = True) -> pd.DataFrame:
+    """The upserted fields, cast exactly as they are written (absent columns filled with their default)."""
+    cols = {}
+    for name, (typ, default) in fields.items():
+        if name in df.columns:
+            cols[name] = _cast_column(df[name], typ, default).to_numpy()
+        elif fill_missing:
+            cols[name] = np.full(len(df), default, dtype=object if typ is str else typ)
+    return pd.DataFrame(cols)
+
+def build_docs(df: pd.DataFrame, fields: dict = LEARNER_FIELDS, fill_missing: bool = True) -> list[dict]:
+    """Column-wise document construction: cast each column once, then zip rows into dicts."""
+    frame = doc_frame(df, fields, fill_missing)
+    cols = []
+    for name in frame.columns:
+        vals = frame[name].tolist()
+        if frame[name].dtype.kind == "f" and frame[name].isna().any():
+            vals = [None if v != v else v for v in vals]
+        cols.append(vals)
+    return [dict(zip(frame.columns, vals)) for vals in zip(*cols)]
+
+class MongoSink:
+    """Upserts learner documents by learner_id, pipelining bulk_write batches on `workers` lanes. A key always
+    goes to the same lane and a lane runs its batches one at a time, in submission order: the last write of a
+    learner wins, and two upserts of one new key never race (no E11000 on a unique index)."""
+    def __init__(self, coll, key: str = "learner_id", batch_size: int = 5000, workers: int = 4, max_pending: int = 8,
+                 fields: dict = LEARNER_FIELDS, fill_missing: bool = True):
+        self.coll = coll; self.key = key; self.batch_size = batch_size
+        self.fields = fields; self.fill_missing = fill_missing
+        self._lanes = [ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"mongo-sink-{i}") for i in range(max(1, workers))]
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._futures = []
+        self._lock = threading.Lock()
+        self.docs = 0; self.batches = 0; self.deleted = 0; self.errors = []; self._raised = 0
+        self._t0 = time.perf_counter()
+
+    def _run(self, fn, n):
+        try:
+            fn()
+            with self._lock:
+                self.docs += n; self.batches += 1
+        except Exception as e:
+            with self._lock:
+                self.errors.append(repr(e))
+        finally:
+            self._slots.release()
+
+    def _submit(self, lane: int, fn, n):
+        self._slots.acquire()  # bounded queue: back-pressure once max_pending batches are in flight
+        self._futures.append(self._lanes[lane].submit(self._run, fn, n))
+        self._futures = [f for f in self._futures if not f.done()]
+
+    def _by_lane(self, keys) -> list[list[int]]:
+        lanes = [[] for _ in self._lanes]
+        for i, k in enumerate(keys):
+            lanes[zlib.crc32(str(k).encode()) % len(lanes)].append(i)
+        return lanes
+
+    def write_docs(self, docs: list[dict]):
+        from pymongo import UpdateOne
+        key = self.key
+        docs = list({d[key]: d for d in docs}.values())  # a key repeated within one write: the last row wins
+        for lane, idx in enumerate(self._by_lane([d[key] for d in docs])):
+            for i in range(0, len(idx), self.batch_size):
+                ops = [UpdateOne({key: docs[j][key]}, {"$set": docs[j]}, upsert=True) for j in idx[i:i + self.batch_size]]
+                self._submit(lane, lambda ops=ops: self.coll.bulk_write(ops, ordered=False), len(ops))
+
+    def delete_ids(self, ids: list):
+        ids = list(dict.fromkeys(ids))
+        for lane, idx in enumerate(self._by_lane(ids)):
+            for i in range(0, len(idx), self.batch_size):
+                batch = [ids[j] for j in idx[i:i + self.batch_size]]
+                self._submit(lane, lambda batch=batch: self._delete(batch), 0)
+
+    def _delete(self, batch):
+        res = self.coll.delete_many({self.key: {"$in": batch}})
+        with self._lock:
+            self.deleted += getattr(res, "deleted_count", len(batch))
+
+    def write(self, df: pd.DataFrame):
+        self.write_docs(build_docs(df, self.fields, self.fill_missing))
+
+    def flush(self):
+        """Wait for every submitted batch; raises if a batch failed since the last flush, so a caller that
+        checkpoints after flush() never records lost writes as done."""
+        for f in self._futures:
+            f.result()
+        self._futures = []
+        with self._lock:
+            new = self.errors[self._raised:]; self._raised = len(self.errors)
+        if new:
+            raise RuntimeError(f"{len(new)} bulk_write batch(es) failed; first: {new[0]}")
+
+    def close(self) -> dict:
+        try:
+            self.flush()
+        except RuntimeError:
+            pass  # reported below with the errors of earlier flushes
+        for lane in self._lanes: lane.shutdown(wait=True)
+        if self.errors:
+            raise RuntimeError(f"{len(self.errors)} bulk_write batch(es) failed; first: {self.errors[0]}")
+        return self.stats()
+
+    def stats(self) -> dict:
+        secs = time.perf_counter() - self._t0
+        return {"docs": self.docs, "deleted": self.deleted, "batches": self.batches, "seconds": round(secs, 3),
+                "docs_per_sec": round(self.docs / secs, 1) if secs > 0 else 0.0, "errors": self.errors[:5]}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is None:
+            self.close()
+        else:
+            for lane in self._lanes: lane.shutdown(wait=True)
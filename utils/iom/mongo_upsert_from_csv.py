@@ -1,40 +1,48 @@
 #!/usr/bin/env python3
 import argparse, pandas as pd
-from pymongo import MongoClient, UpdateOne
+from utils.iom.config import AppConfig
+from utils.iom.mongo import learners
+from utils.iom.mongo_sink import MongoSink
+from utils.iom.fingerprints import FingerprintIndex, row_fingerprints
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--csv", required=True)
-    ap.add_argument("--mongo", default="mongodb://127.0.0.1:27017")
-    ap.add_argument("--db", default="iom")
-    ap.add_argument("--collection", default="learners")
+    ap.add_argument("--mongo", default=None, help="default: mongo.uri from config.yaml")
+    ap.add_argument("--db", default=None)
+    ap.add_argument("--collection", default=None)
     ap.add_argument("--chunksize", type=int, default=200000)
+    ap.add_argument("--batch_size", type=int, default=5000)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--incremental", action="store_true", help="only send learners whose upserted fields changed")
+    ap.add_argument("--index", default=None, help="fingerprint sidecar (default: <processed>/<db>.<collection>.fingerprints.npz)")
+    ap.add_argument("--delete_missing", action="store_true", help="with --incremental, delete learners absent from the csv")
     args = ap.parse_args()
 
-    client = MongoClient(args.mongo)
-    coll = client[args.db][args.collection]
+    cfg = AppConfig.load()
+    coll = learners(cfg, args.mongo, args.db, args.collection)
     coll.create_index("learner_id", unique=True)
 
-    total = 0
+    index = None
+    if args.incremental:
+        index = FingerprintIndex(args.index or cfg.processed / f"{coll.database.name}.{coll.name}.fingerprints.npz")
+    sink = MongoSink(coll, batch_size=args.batch_size, workers=args.workers)
+    total = sent = 0
     for chunk in pd.read_csv(args.csv, chunksize=args.chunksize, low_memory=False):
-        ops=[]
-        for _,r in chunk.iterrows():
-            d = {
-              "learner_id": str(r.get("learner_id","")),
-              "time_spent": float(r.get("time_spent",0)),
-              "avg_score": float(r.get("avg_score",0)),
-              "accuracy": float(r.get("accuracy",0)),
-              "difficulty_level": int(r.get("difficulty_level",1)),
-              "topic_progress": float(r.get("topic_progress",0)),
-              "cluster_kmeans": int(r.get("cluster_kmeans",0)),
-              "cluster_gmm": int(r.get("cluster_gmm",0)),
-              "gmm_confidence": float(r.get("gmm_confidence",0.0)),
-            }
-            ops.append(UpdateOne({"learner_id": d["learner_id"]}, {"$set": d}, upsert=True))
-        if ops:
-            coll.bulk_write(ops, ordered=False)
-            total += len(ops)
-            print(f"upserted {total}...")
+        total += len(chunk)
+        if index is not None:
+            chunk = chunk[index.changed(chunk["learner_id"].astype(str).to_numpy(), row_fingerprints(chunk))]
+        sink.write(chunk)
+        sent += len(chunk)
+        print(f"queued {sent}/{total}...")
+    if index is not None and args.delete_missing:
+        sink.delete_ids(index.missing().tolist())
+    stats = sink.close()
+    if index is not None:
+        # only after every batch succeeded, otherwise the next run would skip rows Mongo never got
+        index.commit(drop_missing=args.delete_missing)
+    print(f"upserted {stats['docs']} of {total} rows, deleted {stats['deleted']} in {stats['seconds']}s "
+          f"({stats['docs_per_sec']} docs/sec)")
     print("done:", coll.count_documents({}), "docs")
 if __name__ == "__main__":
     main()
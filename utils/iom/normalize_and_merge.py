@@ -1,8 +1,13 @@
 #!/usr/bin/env python3
-import argparse, re
+import argparse, os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-import pandas as pd
+import numpy as np, pandas as pd
 from utils.iom.config import AppConfig
+from utils.iom.data_load import column_names, iter_chunks
+from utils.iom.sinks import open_sink
+from utils.iom.columns import pick_columns
 
 ALIASES = {
   "learner_id": ["learner_id","student_id","user_id","id","sid","uid"],
@@ -14,60 +19,126 @@ ALIASES = {
   "mastery": ["mastery","mastery_score","mastery_pct"],
   "topic_progress": ["topic_progress","topic_pct","progress_topic"]
 }
+OUT_COLS = ["learner_id","time_spent","avg_score","accuracy","difficulty_level","topic_progress"]
+DEFAULTS = {"time_spent":0.0, "avg_score":0.0, "accuracy":0.0, "difficulty_level":1, "topic_progress":0.0}
+DIFFICULTY = {"beginner":0,"intermediate":1,"advanced":2}
+PERCENT_COLS = ("avg_score","accuracy")
 
-def find_col(df, names):
-    cols = {re.sub(r'\W+','',c.lower()): c for c in df.columns}
-    for n in names:
-        key = re.sub(r'\W+','',n.lower())
-        if key in cols: return cols[key]
-    return None
+def resolve_columns(columns) -> dict:
+    """canonical name -> source column, decided once from the header."""
+    return pick_columns(columns, ALIASES)
 
-def normalize_df(df):
-    out = {}
-    for key, alts in ALIASES.items():
-        col = find_col(df, alts)
-        if col is not None:
-            out[key] = df[col]
-    ndf = pd.DataFrame(out)
+class Normalizer:
+    """Compiled per-file transform: the column mapping and the /100 decisions are fixed up front, so every
+    chunk is normalized identically and no column statistic is taken from a single chunk."""
+    def __init__(self, mapping: dict, percent: dict):
+        self.mapping = mapping; self.percent = percent
+        self.source_cols = list(dict.fromkeys(mapping.values()))
 
-    if "topic_progress" not in ndf.columns:
-        if "completion" in ndf.columns:
-            ndf["topic_progress"] = pd.to_numeric(ndf["completion"], errors="coerce")
-        elif "mastery" in ndf.columns:
-            ndf["topic_progress"] = pd.to_numeric(ndf["mastery"], errors="coerce")
+    def __call__(self, df: pd.DataFrame, offset: int = 0) -> pd.DataFrame:
+        n = len(df); m = self.mapping
+        out = {}
+        ids = m.get("learner_id")
+        # generated ids count from the chunk's global row offset, so they are unique and stable across chunks
+        out["learner_id"] = df[ids].to_numpy() if ids else [f"L{ix:010d}" for ix in range(offset+1, offset+n+1)]
+        for c in ("time_spent","avg_score","accuracy"):
+            out[c] = pd.to_numeric(df[m[c]], errors="coerce").to_numpy(dtype=float) if c in m else np.full(n, DEFAULTS[c])
+            if self.percent.get(c): out[c] = out[c] / 100.0
+        if "difficulty_level" in m:
+            raw = df[m["difficulty_level"]]
+            lvl = pd.to_numeric(raw, errors="coerce")
+            named = lvl.isna() & raw.notna()
+            if named.any():  # beginner/intermediate/advanced, case-insensitive
+                lvl[named] = raw[named].astype(str).str.lower().map(DIFFICULTY)
+            out["difficulty_level"] = lvl.to_numpy(dtype=float)
         else:
-            ndf["topic_progress"] = 0.0
+            out["difficulty_level"] = np.full(n, DEFAULTS["difficulty_level"])
+        src = next((m[c] for c in ("topic_progress","completion","mastery") if c in m), None)
+        out["topic_progress"] = pd.to_numeric(df[src], errors="coerce").to_numpy(dtype=float) if src else np.full(n, 0.0)
+        ndf = pd.DataFrame(out, columns=OUT_COLS).fillna(0)
+        # same dtype in every chunk; fractional levels (averaged sources) round to the nearest level, halves up
+        # (1.5 -> 2, 2.5 -> 3; Series.round would send halves to the even level)
+        ndf["difficulty_level"] = np.floor(ndf["difficulty_level"] + 0.5).astype(np.int64)
+        return ndf
+
+def scan_percent(path, mapping: dict, chunksize: int) -> dict:
+    """Stats pre-pass over just the score columns: a column is a percentage when its global max exceeds 1."""
+    cols = {c: mapping[c] for c in PERCENT_COLS if c in mapping}
+    top = {c: -np.inf for c in cols}
+    if cols:
+        for chunk in iter_chunks(path, chunksize, columns=list(dict.fromkeys(cols.values()))):
+            for c, src in cols.items():
+                top[c] = max(top[c], float(np.nanmax(pd.to_numeric(chunk[src], errors="coerce").to_numpy(dtype=float), initial=-np.inf)))
+    return {c: v > 1.0 for c, v in top.items()}
 
-    if "learner_id" not in ndf.columns:
-        ndf["learner_id"] = [f"L{ix+1:010d}" for ix in range(len(ndf))]
+def parse_units(spec: str | None) -> dict:
+    """'avg_score=percent,accuracy=fraction' -> {"avg_score": True, "accuracy": False}."""
+    units = {}
+    for part in filter(None, (spec or "").split(",")):
+        col, _, unit = part.partition("=")
+        if col not in PERCENT_COLS or unit not in ("percent", "fraction"):
+            raise ValueError(f"bad --units entry {part!r}; expected <avg_score|accuracy>=<percent|fraction>")
+        units[col] = unit == "percent"
+    return units
 
-    if "difficulty_level" in ndf.columns and ndf["difficulty_level"].dtype == object:
-        mapping = {"beginner":0,"intermediate":1,"advanced":2}
-        ndf["difficulty_level"] = ndf["difficulty_level"].astype(str).str.lower().map(mapping)
+def compile_normalizer(path, units: dict | None = None, chunksize: int = 200000) -> Normalizer:
+    mapping = resolve_columns(column_names(path))
+    units = dict(units or {})
+    if any(c in mapping and c not in units for c in PERCENT_COLS):
+        units = {**scan_percent(path, {c: mapping[c] for c in PERCENT_COLS if c not in units and c in mapping}, chunksize), **units}
+    return Normalizer(mapping, units)
 
-    for c in ["time_spent","avg_score","accuracy","difficulty_level","topic_progress"]:
-        if c in ndf.columns:
-            ndf[c] = pd.to_numeric(ndf[c], errors="coerce")
+def normalize_df(df):
+    """In-memory variant, same output as the streaming path."""
+    mapping = resolve_columns(df.columns)
+    percent = {c: bool(pd.to_numeric(df[mapping[c]], errors="coerce").max() > 1.0) for c in PERCENT_COLS if c in mapping}
+    return Normalizer(mapping, percent)(df)
 
-    for c, default in [("time_spent",0.0), ("avg_score",0.0), ("accuracy",0.0), ("difficulty_level",1), ("topic_progress",0.0)]:
-        if c not in ndf.columns:
-            ndf[c] = default
+_WORKER_NORM = None
 
-    if ndf["avg_score"].max() > 1.0: ndf["avg_score"] = ndf["avg_score"]/100.0
-    if ndf["accuracy"].max() > 1.0: ndf["accuracy"] = ndf["accuracy"]/100.0
+def _init_worker(norm):
+    global _WORKER_NORM
+    _WORKER_NORM = norm
 
-    return ndf[["learner_id","time_spent","avg_score","accuracy","difficulty_level","topic_progress"]]
+def _normalize_chunk(df, offset):
+    return _WORKER_NORM(df, offset)
+
+def normalize_file(in_path, out_path, chunksize: int = 200000, workers: int = 1, units: dict | None = None,
+                   fmt: str | None = None) -> dict:
+    """Stream `in_path` (CSV or Parquet) through one compiled Normalizer into `out_path`, chunks written in input order."""
+    norm = compile_normalizer(in_path, units, chunksize)
+    sink = open_sink(out_path, fmt); rows = 0
+    chunks = iter_chunks(in_path, chunksize, columns=norm.source_cols or None)
+    try:
+        if workers <= 1:
+            for chunk in chunks:
+                sink.write(norm(chunk, rows)); rows += len(chunk)
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(norm,)) as pool:
+                pending = deque(); offset = 0
+                for chunk in chunks:
+                    pending.append(pool.submit(_normalize_chunk, chunk, offset)); offset += len(chunk)
+                    if len(pending) >= 2 * workers:
+                        out = pending.popleft().result(); sink.write(out); rows += len(out)
+                while pending:
+                    out = pending.popleft().result(); sink.write(out); rows += len(out)
+    finally:
+        sink.close()
+    return {"rows": rows, "output": str(out_path), "mapping": norm.mapping, "percent": norm.percent}
 
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--csv", required=True)
+    ap.add_argument("--csv", required=True, help="input CSV or Parquet file/directory")
     ap.add_argument("--out", default="data/processed/iom_task2_input.csv")
+    ap.add_argument("--format", choices=["csv", "parquet"], default=None, help="default: from --out")
+    ap.add_argument("--chunksize", type=int, default=200000)
+    ap.add_argument("--workers", type=int, default=1, help="normalizer processes (0 = one per core)")
+    ap.add_argument("--units", default=None, help="skip the stats pre-pass, e.g. avg_score=percent,accuracy=fraction")
     args = ap.parse_args()
     _ = AppConfig.load()
     Path(args.out).parent.mkdir(parents=True, exist_ok=True)
-    df = pd.read_csv(args.csv, low_memory=False)
-    ndf = normalize_df(df).fillna(0)
-    ndf.to_csv(args.out, index=False)
-    print(args.out)
+    summary = normalize_file(args.csv, args.out, chunksize=args.chunksize, workers=args.workers or os.cpu_count() or 1,
+                             units=parse_units(args.units), fmt=args.format)
+    print(summary["output"])
 if __name__ == "__main__":
     main()
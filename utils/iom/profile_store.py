@@ -0,0 +1,217 @@
+from __future__ import annotations
+import argparse, json, os, shutil, tempfile, threading, time
+from collections import OrderedDict
+from pathlib import Path
+import numpy as np
+from .config import AppConfig
+from .data_load import iter_chunks
+from .mongo import async_learners, learners
+from .mongo_sink import LEARNER_FIELDS, doc_frame
+
+# <profiles dir>/
+#   meta.json          rows, columns + dtypes, source, built_at, data_cutoff (learner data read up to this time)
+#   learner_id.npy     sorted fixed-width ids (|S<w>), binary-searched
+#   <column>.npy       one array per LEARNER_FIELDS column, rows in id order; all memory-mapped on open
+META = "meta.json"
+ID = "learner_id"
+_DTYPES = {int: np.int32, float: np.float64}
+
+def _keys(ids) -> np.ndarray:
+    return np.array([str(i).encode() for i in ids], dtype=np.bytes_)  # utf-8, so any id works; byte order sorts
+
+def _json(v):
+    return None if v != v else v  # NaN -> null, as in the Mongo documents
+
+def build_store(src, out_dir, chunksize: int = 500000, cutoff: float | None = None) -> dict:
+    """learner_clusters.csv (or Parquet) -> columnar store; the last row wins for a repeated learner_id,
+    like the Mongo upsert. Written next to `out_dir` and swapped in with one rename. `cutoff` is when the learner
+    data behind `src` was read (default: the mtime of `src`); streamed events seen later are replayed on top."""
+    cutoff = Path(src).stat().st_mtime if cutoff is None else cutoff
+    out_dir = Path(out_dir); out_dir.parent.mkdir(parents=True, exist_ok=True)
+    fields = {k: v for k, v in LEARNER_FIELDS.items() if k != ID}
+    ids = []; parts = {c: [] for c in fields}
+    for chunk in iter_chunks(src, chunksize):
+        frame = doc_frame(chunk)  # same casts and defaults as the documents in Mongo
+        ids.append(_keys(frame[ID]))
+        for c, (typ, _) in fields.items():
+            parts[c].append(frame[c].to_numpy(dtype=_DTYPES[typ]))
+    ids = np.concatenate(ids) if ids else np.empty(0, dtype="S1")
+    order = np.argsort(ids, kind="stable")
+    ids = ids[order]
+    last = np.ones(len(ids), dtype=bool); last[:-1] = ids[1:] != ids[:-1]  # stable sort: last of a run is the latest row
+    tmp = Path(tempfile.mkdtemp(prefix=".profiles_", dir=out_dir.parent))
+    np.save(tmp / f"{ID}.npy", ids[last])
+    for c, (typ, _) in fields.items():
+        col = np.concatenate(parts[c]) if parts[c] else np.empty(0, dtype=_DTYPES[typ])
+        np.save(tmp / f"{c}.npy", col[order][last]); parts[c] = None
+    meta = {"rows": int(last.sum()), "columns": {c: np.dtype(_DTYPES[t]).name for c, (t, _) in fields.items()},
+            "source": str(src), "built_at": time.time(), "data_cutoff": cutoff}
+    (tmp / META).write_text(json.dumps(meta, indent=2))
+    old = None
+    if out_dir.exists():
+        old = out_dir.with_name(f".{out_dir.name}.old.{os.getpid()}"); os.replace(out_dir, old)
+    os.replace(tmp, out_dir)
+    if old is not None: shutil.rmtree(old, ignore_errors=True)  # open maps keep their (unlinked) files
+    return meta
+
+class ProfileStore:
+    """Read side of the snapshot: memory-mapped columns, lookups by binary search over the sorted ids."""
+    def __init__(self, root):
+        self.root = Path(root)
+        self.meta = json.loads((self.root / META).read_text())
+        self.ids = np.load(self.root / f"{ID}.npy", mmap_mode="r")
+        self.cols = {c: np.load(self.root / f"{c}.npy", mmap_mode="r") for c in self.meta["columns"]}
+        self.stamp = (self.root / META).stat().st_mtime_ns
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _rows(self, ids: list) -> np.ndarray:
+        """Row index per id, -1 when absent."""
+        keys = _keys(ids)
+        if not len(self.ids) or not len(keys):
+            return np.full(len(keys), -1)
+        pos = np.minimum(np.searchsorted(self.ids, keys), len(self.ids) - 1)
+        return np.where(self.ids[pos] == keys, pos, -1)
+
+    def _doc(self, learner_id: str, r: int) -> dict:
+        return {ID: learner_id, **{c: _json(a[r].item()) for c, a in self.cols.items()}}
+
+    def get(self, learner_id: str) -> dict | None:
+        r = int(self._rows([learner_id])[0])
+        return self._doc(str(learner_id), r) if r >= 0 else None
+
+    def lookup(self, ids: list) -> dict:
+        rows = self._rows(ids)
+        hit = rows >= 0
+        cols = {c: a[rows[hit]].tolist() for c, a in self.cols.items()}  # one gather per column
+        found = [str(i) for i, h in zip(ids, hit) if h]
+        return {lid: {ID: lid, **{c: _json(v[j]) for c, v in cols.items()}} for j, lid in enumerate(found)}
+
+class ProfileService:
+    """Snapshot first; ids it lacks optionally fall through to Mongo via a bounded LRU read-through cache.
+    The snapshot is reopened when a rebuild swaps the directory (checked at most every `poll_seconds`).
+    `alookup`/`aupsert` are the event-loop variants for the API, on the async collection `acoll()`."""
+    PROJECTION = {"_id": 0, **{f: 1 for f in LEARNER_FIELDS}}
+
+    def __init__(self, root, coll=None, cache_size: int = 100000, poll_seconds: float = 2.0, acoll=None):
+        self.root = Path(root); self.coll = coll; self.acoll = acoll; self.cache_size = cache_size; self.poll_seconds = poll_seconds
+        self._store = None; self._checked = 0.0
+        self._cache: OrderedDict[str, dict] = OrderedDict(); self._lock = threading.Lock()
+        self._pinned: OrderedDict[str, tuple[float, dict]] = OrderedDict(); self._pinned_stamp = None
+        self.stats = {"snapshot_hits": 0, "cache_hits": 0, "mongo_hits": 0, "misses": 0, "writes": 0}
+
+    @classmethod
+    def from_config(cls, cfg: AppConfig) -> "ProfileService":
+        if not cfg.profiles_mongo_fallback:
+            return cls(cfg.profiles_dir, None, cfg.profiles_cache_size, cfg.registry_poll_seconds)
+        # the async collection is resolved per call: its client belongs to the event loop it runs on
+        return cls(cfg.profiles_dir, learners(cfg), cfg.profiles_cache_size, cfg.registry_poll_seconds,
+                   acoll=lambda: async_learners(cfg))
+
+    @property
+    def store(self) -> ProfileStore | None:
+        now = time.monotonic()
+        if now - self._checked >= self.poll_seconds or self._store is None:
+            self._checked = now
+            meta = self.root / META
+            try:
+                stamp = meta.stat().st_mtime_ns
+                if self._store is None or stamp != self._store.stamp:
+                    self._store = ProfileStore(self.root)
+            except FileNotFoundError:
+                pass  # not built yet, or mid-swap: keep serving the previous snapshot
+        return self._store
+
+    def _cached(self, ids: list) -> dict:
+        with self._lock:
+            out = {}
+            for i in ids:
+                if i in self._cache:
+                    self._cache.move_to_end(i); out[i] = self._cache[i]
+            return out
+
+    def _remember(self, docs: dict):
+        with self._lock:
+            for i, d in docs.items():
+                self._cache[i] = d; self._cache.move_to_end(i)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _local(self, ids: list) -> tuple[dict, list]:
+        """(docs served without Mongo, ids still missing): written docs, then the snapshot, then the LRU."""
+        store = self.store
+        if store is not None and store.stamp != self._pinned_stamp:
+            # a snapshot supersedes the writes made before its learner data was read (not before it was built:
+            # a write landing during a long rebuild is missing from it)
+            cutoff = store.meta.get("data_cutoff", store.meta["built_at"])
+            with self._lock:
+                self._pinned = OrderedDict((i, p) for i, p in self._pinned.items() if p[0] > cutoff)
+                self._pinned_stamp = store.stamp
+        out = {i: self._pinned[i][1] for i in ids if i in self._pinned}
+        snap = store.lookup([i for i in ids if i not in out]) if store is not None else {}
+        out.update(snap); self.stats["snapshot_hits"] += len(snap)
+        rest = [i for i in ids if i not in out]
+        if rest and self.coll is not None:
+            cached = self._cached(rest); out.update(cached); self.stats["cache_hits"] += len(cached)
+            rest = [i for i in rest if i not in cached]
+        return out, rest
+
+    def _fetched(self, out: dict, rest: list, docs) -> dict:
+        fetched = {d[ID]: d for d in docs}
+        self._remember(fetched); out.update(fetched); self.stats["mongo_hits"] += len(fetched)
+        self.stats["misses"] += len(rest) - len(fetched)
+        return out
+
+    def lookup(self, ids: list) -> dict:
+        out, rest = self._local([str(i) for i in dict.fromkeys(ids)])
+        if rest and self.coll is not None:
+            return self._fetched(out, rest, self.coll.find({ID: {"$in": rest}}, self.PROJECTION))
+        self.stats["misses"] += len(rest)
+        return out
+
+    async def alookup(self, ids: list) -> dict:
+        out, rest = self._local([str(i) for i in dict.fromkeys(ids)])
+        if rest and self.acoll is not None:
+            return self._fetched(out, rest, await self.acoll().find({ID: {"$in": rest}}, self.PROJECTION).to_list(None))
+        self.stats["misses"] += len(rest)
+        return out
+
+    async def aupsert(self, learner_id: str, fields: dict) -> dict:
+        """Upsert one learner's fields in Mongo and serve the stored document over the snapshot until a
+        snapshot built after the write replaces it."""
+        if self.acoll is None:
+            raise RuntimeError("profiles.mongo_fallback is disabled")
+        lid = str(learner_id); store = self.store
+        base = (store.lookup([lid]).get(lid) or {}) if store is not None else {}  # a new doc starts from the snapshot row
+        update = {"$set": {**fields, ID: lid}}
+        seed = {k: v for k, v in base.items() if k not in update["$set"]}
+        if seed: update["$setOnInsert"] = seed
+        doc = await self.acoll().find_one_and_update({ID: lid}, update, projection=self.PROJECTION, upsert=True,
+                                                     return_document=True)
+        with self._lock:
+            self._pinned[lid] = (time.time(), doc); self._pinned.move_to_end(lid); self._cache.pop(lid, None)
+            while len(self._pinned) > self.cache_size:  # oldest writes first; they reappear with the next snapshot
+                self._pinned.popitem(last=False)
+        self.stats["writes"] += 1
+        return doc
+
+    def get(self, learner_id: str) -> dict | None:
+        return self.lookup([learner_id]).get(str(learner_id))
+
+    def metrics(self) -> dict:
+        store = self.store
+        return {**self.stats, "snapshot_rows": len(store) if store is not None else 0,
+                "snapshot_built_at": store.meta["built_at"] if store is not None else None,
+                "mongo_fallback": self.coll is not None, "cache_entries": len(self._cache), "pinned": len(self._pinned)}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--csv", default=None, help="default: <reports>/learner_clusters.csv")
+    ap.add_argument("--out", default=None, help="default: profiles.dir from config.yaml")
+    args = ap.parse_args()
+    cfg = AppConfig.load()
+    print(json.dumps(build_store(args.csv or cfg.reports / "learner_clusters.csv", args.out or cfg.profiles_dir), indent=2))
+
+if __name__ == "__main__":
+    main()
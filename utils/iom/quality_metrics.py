@@ -1,41 +1,60 @@
 #!/usr/bin/env python3
-import argparse, json, pandas as pd, numpy as np, joblib, os
-from sklearn.metrics import silhouette_score, davies_bouldin_score, calinski_harabasz_score
-from sklearn.exceptions import NotFittedError
+import argparse, json, os, numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from utils.iom.config import AppConfig
 from utils.iom.features import FeatureBuilder
+from utils.iom.data_load import load_dataframe
+from utils.iom.feature_cache import load_features
+from utils.iom.registry import get_registry
+from utils.iom.cluster_metrics import evaluate
+
+MODELS = {"kmeans": "kmeans.joblib", "kmeans_minibatch": "kmeans_minibatch.joblib", "gmm": "gmm.joblib"}
+LEGACY_KEYS = ("silhouette", "davies_bouldin", "calinski_harabasz", "inertia", "n_clusters")
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--csv", required=True)
-    ap.add_argument("--sample", type=int, default=100000)
+    ap.add_argument("--sample", type=int, default=20000, help="rows in the stratified sample for the exact silhouette")
+    ap.add_argument("--silhouette", choices=["both", "simplified", "sampled"], default="both",
+                    help="simplified = O(n*k) centroid silhouette over all rows; sampled = exact silhouette on the sample")
+    ap.add_argument("--models", default=",".join(MODELS), help="comma list of " + ",".join(MODELS))
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--chunksize", type=int, default=200000)
     args = ap.parse_args()
 
     cfg = AppConfig.load()
-    df = pd.read_csv(args.csv)
-    if len(df) > args.sample:
-        df = df.sample(args.sample, random_state=cfg.random_state)
+    try:
+        # all rows, zero-copy from the feature cache when this file was already transformed under the active preprocess
+        X = load_features(cfg, args.csv)
+    except FileNotFoundError:
+        df = load_dataframe(cfg, args.csv, columns=cfg.numeric + cfg.categorical)
+        X = FeatureBuilder(cfg).build(df, fit=True)
+        X = X.toarray() if hasattr(X, "toarray") else np.asarray(X)
 
-    fb = FeatureBuilder(cfg)
+    arts = get_registry(cfg).current()
+    models = {name: arts.get(MODELS[name]) for name in args.models.split(",") if arts.get(MODELS.get(name, "")) is not None}
+    if not models:
+        raise SystemExit(f"no fitted models among {args.models} in {cfg.artifacts}")
+    per_model = max(1, args.workers // len(models))
 
-    try:
-        X = fb.build(df[cfg.numeric + cfg.categorical], fit=False)
-    except (FileNotFoundError, NotFittedError, AttributeError):
-        X = fb.build(df[cfg.numeric + cfg.categorical], fit=True)
-
-    Xd = X.toarray() if hasattr(X, "toarray") else X
-    km = joblib.load(cfg.artifacts / "kmeans.joblib")
-
-    labels = km.predict(Xd)
-    metrics = {
-        "sample_size": int(len(df)),
-        "silhouette": float(silhouette_score(Xd, labels)),
-        "davies_bouldin": float(davies_bouldin_score(Xd, labels)),
-        "calinski_harabasz": float(calinski_harabasz_score(Xd, labels)),
-        "inertia": float(km.inertia_) if hasattr(km, "inertia_") else None,
-        "n_clusters": int(km.n_clusters),
-        "preprocess_exists": os.path.exists(cfg.artifacts / "preprocess.joblib"),
-    }
+    def run(name):
+        try:
+            return name, evaluate(models[name], X, sample=args.sample, silhouette=args.silhouette,
+                                  chunk=args.chunksize, workers=per_model, seed=cfg.random_state)
+        except ValueError as e:  # e.g. a model trained on a different feature layout
+            return name, {"error": str(e)}
+
+    with ThreadPoolExecutor(max_workers=len(models)) as ex:
+        results = dict(ex.map(run, models))
+
+    # flat keys of the primary model stay where existing reports read them
+    primary = next((results[n] for n in models if "error" not in results[n]), {})
+    metrics = {k: primary.get(k) for k in LEGACY_KEYS}
+    if metrics["silhouette"] is None:
+        metrics["silhouette"] = primary.get("silhouette_simplified")
+    metrics.update({"rows": int(len(X)), "sample_size": primary.get("silhouette_sample_size"),
+                    "model_version": arts.version, "models": results,
+                    "preprocess_exists": os.path.exists(cfg.artifacts / "preprocess.joblib")})
 
     summ_path = cfg.reports / "clustering_summary.json"
     try:
@@ -1,9 +1,16 @@
 from __future__ import annotations
-import json
-from dataclasses import dataclass
+import hashlib, json, os, threading
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from pathlib import Path
+import joblib
+import numpy as np
 import pandas as pd
 from .config import AppConfig
 from .clustering import Clusterer
+from .registry import get_registry
+
+TABLE_NAME = "recommend_table.json"
 
 @dataclass
 class Recommendation:
@@ -11,12 +18,96 @@ class Recommendation:
     next_difficulty: int
     topics: list[str]
     tips: list[str]
+    posterior: list[float] | None = None  # soft mode: GMM posterior over clusters
+    expected_difficulty: float | None = None
+
+class RecommendTable:
+    """Recommender rules evaluated once per (cluster, difficulty, accuracy, time) bucket; a lookup is one index."""
+    def __init__(self, data: dict, source: str):
+        self.data = data; self.source = source
+        self.index = np.asarray(data["index"], dtype=np.int64).reshape(data["shape"])
+        self.next = np.array([r[0] for r in data["recs"]], dtype=np.int64)
+        self.topics = [r[1] for r in data["recs"]]; self.tips = [r[2] for r in data["recs"]]
+        self.topics_joined = np.array([",".join(t) for t in self.topics], dtype=object)
+        self.tips_joined = np.array([" | ".join(t) for t in self.tips], dtype=object)
+        self._flat = self.index.ravel().tolist(); self._strides = [s // 8 for s in self.index.strides]
+
+    def get(self, cluster: int, bucket) -> Recommendation | None:
+        # plain-int offset arithmetic: a NumPy scalar index would cost more than evaluating the rules
+        if bucket is None or not 0 <= cluster < len(self.index):
+            return None
+        (sc, sd, sa, st), (d, a, t) = self._strides, bucket
+        r = self._flat[cluster * sc + d * sd + a * sa + t * st]
+        return Recommendation(cluster, int(self.next[r]), list(self.topics[r]), list(self.tips[r])) if r >= 0 else None
+
+    def rows(self, clusters: np.ndarray, d: np.ndarray, a: np.ndarray, t: np.ndarray, ok: np.ndarray) -> np.ndarray:
+        """Table entry per row, -1 where the row has no bucket or its cluster is outside the table."""
+        ok = ok & (clusters >= 0) & (clusters < len(self.index))
+        rid = np.full(len(clusters), -1, dtype=np.int64)
+        rid[ok] = self.index[clusters[ok], d[ok], a[ok], t[ok]]
+        return rid
+
+def _copy(rec: Recommendation) -> Recommendation:
+    return replace(rec, topics=list(rec.topics), tips=list(rec.tips),
+                   posterior=list(rec.posterior) if rec.posterior is not None else None)
+
+class ResponseCache:
+    """LRU of recommendations keyed on the input rounded to `decimals`; emptied when the model changes.
+    Entries go in and come out as copies, so a caller mutating its result cannot change anyone else's."""
+    def __init__(self, size: int, decimals: int = 6):
+        self.size = size; self.decimals = decimals
+        self._items: OrderedDict[tuple, Recommendation] = OrderedDict(); self._lock = threading.Lock()
+        self._arts = None
+        self.hits = 0; self.misses = 0
+
+    def key(self, row: dict) -> tuple:
+        return tuple((k, round(float(v), self.decimals) if isinstance(v, (int, float)) else v) for k, v in sorted(row.items()))
+
+    def get(self, arts, key: tuple) -> Recommendation | None:
+        with self._lock:
+            if arts is not self._arts:
+                self._items.clear(); self._arts = arts
+            rec = self._items.get(key)
+            if rec is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key); self.hits += 1
+        return _copy(rec)
+
+    def put(self, arts, key: tuple, rec: Recommendation):
+        with self._lock:
+            if arts is not self._arts:
+                return
+            self._items[key] = _copy(rec)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"entries": len(self._items), "size": self.size, "decimals": self.decimals, "hits": self.hits,
+                "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
 
 class Recommender:
+    _TIP_SLOW = "Increase focused practice to ≥30 mins per session."
+    _TIP_ERRORS = "Review error log; drill weak sub-skills before advancing."
+    _TIP_ADVANCE = "Advance difficulty gradually; keep streaks of 3 passes."
+    _TIP_STABILIZE = "Stabilize fundamentals; use spaced repetition."
+    # thresholds shared by the rules and the table buckets; bump TABLE_VERSION whenever the rules change
+    ACC_UP = 0.8
+    ACC_DOWN = 0.5
+    ACC_TIP = 0.7
+    SLOW_SECONDS = 30
+    TABLE_VERSION = 1
+
     def __init__(self, cfg: AppConfig):
         self.cfg = cfg
         self.clusterer = Clusterer(cfg)
         self.schema = self._load_schema()
+        self._topics_by_level = self._topic_lookup()
+        self._tips_by_code = self._tip_lookup()
+        self._topic_vocab, self._topic_inc, self._topic_order = self._topic_matrices()
+        self._table: RecommendTable | None = None; self._table_arts = None; self._registry = None
+        self.cache = ResponseCache(cfg.recommend_cache_size, cfg.recommend_cache_decimals) if cfg.recommend_cache_size > 0 else None
 
     def _load_schema(self):
         path = self.cfg.knowledge / "schema.json"
@@ -27,12 +118,14 @@ class Recommender:
     def _difficulty_bounds(self):
         return 0, 2
 
-    def _decide_next_difficulty(self, row: dict, cluster: int) -> int:
-        acc = row.get("accuracy", 0.0)
+    def _step(self, acc: float) -> int:
         if acc > 1:
             acc = acc / 100.0
+        return 1 if acc >= self.ACC_UP else (-1 if acc <= self.ACC_DOWN else 0)
+
+    def _decide_next_difficulty(self, row: dict, cluster: int) -> int:
         base = int(row.get("difficulty_level", 1))
-        next_diff = base + (1 if acc >= 0.8 else (-1 if acc <= 0.5 else 0))
+        next_diff = base + self._step(row.get("accuracy", 0.0))
         lo, hi = self._difficulty_bounds()
         return max(lo, min(hi, next_diff))
 
@@ -43,35 +136,253 @@ class Recommender:
             return ["core-practice", "review-mistakes", "targeted-quizzes"]
         return choices[:3]
 
+    def _topic_lookup(self) -> np.ndarray:
+        # joined topic strings for every reachable next_difficulty, indexed by level - lo
+        lo, hi = self._difficulty_bounds()
+        return np.array([",".join(self._pick_topics(lvl)) for lvl in range(lo, hi + 1)], dtype=object)
+
+    def _topic_matrices(self):
+        # every topic any level suggests; level x topic membership; level x topic tie-break rank (the level's
+        # own order first, then the rest)
+        lo, hi = self._difficulty_bounds(); levels = [self._pick_topics(lvl) for lvl in range(lo, hi + 1)]
+        vocab = list(dict.fromkeys(t for ts in levels for t in ts))
+        inc = np.array([[t in ts for t in vocab] for ts in levels], dtype=float)
+        order = np.array([[ts.index(t) if t in ts else len(vocab) + j for j, t in enumerate(vocab)] for ts in levels])
+        return np.array(vocab, dtype=object), inc, order
+
     def _tips(self, row: dict, cluster: int, next_difficulty: int) -> list[str]:
         ts = []
-        if row.get("time_spent", 0) < 30:
-            ts.append("Increase focused practice to ≥30 mins per session.")
-        if row.get("accuracy", 0) < 0.7:
-            ts.append("Review error log; drill weak sub-skills before advancing.")
+        if row.get("time_spent", 0) < self.SLOW_SECONDS:
+            ts.append(self._TIP_SLOW)
+        if row.get("accuracy", 0) < self.ACC_TIP:
+            ts.append(self._TIP_ERRORS)
         if next_difficulty > row.get("difficulty_level", 1):
-            ts.append("Advance difficulty gradually; keep streaks of 3 passes.")
+            ts.append(self._TIP_ADVANCE)
         else:
-            ts.append("Stabilize fundamentals; use spaced repetition.")
+            ts.append(self._TIP_STABILIZE)
         return ts[:3]
 
-    def recommend_one(self, row: dict):
-        df = pd.DataFrame([row])
-        cluster = int(self.clusterer.predict(df)[0])
+    # ---- precomputed table ------------------------------------------------
+    # A row's outcome depends only on: difficulty_level clipped to [lo-1, hi+1] (anything below lo always moves
+    # to lo, anything above hi to hi), the accuracy step and whether accuracy < ACC_TIP (bucket (step+1)*2 + tip),
+    # and whether time_spent < SLOW_SECONDS.
+    def _bucket(self, row: dict):
+        lvl = row.get("difficulty_level", 1); base = int(lvl)
+        if base != lvl:
+            return None  # fractional levels compare differently in _tips: computed, not tabulated
+        lo, hi = self._difficulty_bounds(); acc = row.get("accuracy", 0.0)
+        return (min(max(base, lo - 1), hi + 1) - lo + 1, (self._step(acc) + 1) * 2 + int(acc < self.ACC_TIP),
+                int(row.get("time_spent", 0) < self.SLOW_SECONDS))
+
+    def _buckets_batch(self, df: pd.DataFrame):
+        lvl = self._column(df, "difficulty_level", 1); ok = np.isfinite(lvl) & (lvl == np.floor(lvl))
+        acc = self._column(df, "accuracy", 0.0)
+        lo, hi = self._difficulty_bounds()
+        d = np.clip(np.where(ok, lvl, lo), lo - 1, hi + 1).astype(np.int64) - lo + 1
+        a = (self._step_batch(acc) + 1) * 2 + (acc < self.ACC_TIP)
+        t = (self._column(df, "time_spent", 0) < self.SLOW_SECONDS).astype(np.int64)
+        return d, a, t, ok
+
+    def _representatives(self) -> dict:
+        # one accuracy per bucket with exactly that bucket's outcome; (step +1, below ACC_TIP) cannot happen
+        return {0: 100 * self.ACC_DOWN, 1: self.ACC_DOWN, 2: (self.ACC_TIP + self.ACC_UP) / 2,
+                3: (self.ACC_DOWN + self.ACC_TIP) / 2, 4: self.ACC_UP}
+
+    def _schema_digest(self) -> str:
+        return hashlib.sha256(json.dumps(self.schema, sort_keys=True).encode()).hexdigest()[:12]
+
+    def build_table(self, n_clusters: int) -> dict:
+        lo, hi = self._difficulty_bounds(); reps = self._representatives()
+        index = np.full((n_clusters, hi - lo + 3, 6, 2), -1, dtype=np.int64); recs = {}
+        for c, d, a, t in np.ndindex(index.shape):
+            row = {"difficulty_level": lo - 1 + d, "accuracy": reps.get(a, np.nan),
+                   "time_spent": 0.0 if t else float(self.SLOW_SECONDS)}
+            if self._bucket(row) != (d, a, t):
+                continue  # unreachable bucket
+            r = self._rules(row, c)
+            index[c, d, a, t] = recs.setdefault(json.dumps([r.next_difficulty, r.topics, r.tips]), len(recs))
+        return {"version": self.TABLE_VERSION, "schema": self._schema_digest(), "difficulty": [lo, hi],
+                "shape": list(index.shape), "index": index.ravel().tolist(), "recs": [json.loads(k) for k in recs]}
+
+    def _fresh(self, data) -> bool:
+        return (isinstance(data, dict) and data.get("version") == self.TABLE_VERSION
+                and data.get("schema") == self._schema_digest() and data.get("difficulty") == list(self._difficulty_bounds()))
+
+    def _arts(self):
+        if self._registry is None:
+            self._registry = get_registry(self.cfg)
+        return self._registry.current()
+
+    def table(self) -> RecommendTable | None:
+        """The active artifact set's table; rebuilt in memory when it is missing or was built for other rules."""
+        if not self.cfg.recommend_table:
+            return None
+        arts = self._arts()
+        if arts is not self._table_arts:
+            data = arts.get(TABLE_NAME)
+            if self._fresh(data):
+                self._table = RecommendTable(data, "artifact")
+            else:
+                self._table = RecommendTable(self.build_table(getattr(arts.kmeans, "n_clusters", self.cfg.n_clusters)), "built")
+            self._table_arts = arts
+        return self._table
+
+    def metrics(self) -> dict:
+        table = self.table()
+        return {"table": {"source": table.source, "entries": int((table.index >= 0).sum()), "distinct": len(table.next)}
+                         if table is not None else None,
+                "cache": self.cache.metrics() if self.cache is not None else None}
+
+    # ---- serving ----------------------------------------------------------
+    def predict_clusters(self, rows: list[dict]) -> list[int]:
+        if self.cfg.compiled_inference:
+            return [int(c) for c in self.clusterer.compile().predict(rows)]
+        return [int(c) for c in self.clusterer.predict(pd.DataFrame(rows))]
+
+    def cached(self, row: dict, mode: str = "hard") -> Recommendation | None:
+        if self.cache is None:
+            return None
+        return self.cache.get(self._arts(), (mode, self.cache.key(row)))
+
+    def remember(self, row: dict, rec: Recommendation, mode: str = "hard"):
+        if self.cache is not None:
+            self.cache.put(self._arts(), (mode, self.cache.key(row)), rec)
+
+    def recommend_one(self, row: dict, mode: str | None = None):
+        mode = mode or self.cfg.recommend_mode
+        rec = self.cached(row, mode)
+        if rec is None:
+            rec = self.recommend_soft(row) if mode == "soft" else self.recommend_for_cluster(row, self.predict_clusters([row])[0])
+            self.remember(row, rec, mode)
+        return rec
+
+    def recommend_for_cluster(self, row: dict, cluster: int):
+        table = self.table()
+        rec = table.get(cluster, self._bucket(row)) if table is not None else None
+        return rec if rec is not None else self._rules(row, cluster)
+
+    # ---- soft mode --------------------------------------------------------
+    # The GMM posterior p_k weights each cluster's recommendation: the mass on a difficulty level is the sum of
+    # p_k over clusters recommending it; next_difficulty is the heaviest level (ties: the lower one),
+    # expected_difficulty the mass-weighted mean, and topics the three with the most mass (ties: the order
+    # of the heaviest level's own list).
+    def _blend(self, next_k: np.ndarray, p: np.ndarray):
+        lo, hi = self._difficulty_bounds(); n = len(p)
+        mass = np.zeros((n, hi - lo + 1))
+        for k in range(p.shape[1]):
+            mass[np.arange(n), next_k[:, k] - lo] += p[:, k]
+        dom = mass.argmax(axis=1)
+        score = mass @ self._topic_inc
+        order = np.lexsort((self._topic_order[dom], -score), axis=-1)[:, :3]
+        top = np.where(np.take_along_axis(score, order, axis=1) > 0, order, -1)
+        return dom + lo, mass @ np.arange(lo, hi + 1), top
+
+    def _topic_strings(self, top: np.ndarray) -> np.ndarray:
+        # one join per distinct top-3 combination, gathered back to the rows
+        codes, inv = np.unique(((top + 1) * (len(self._topic_vocab) + 1) ** np.arange(top.shape[1])).sum(axis=1),
+                               return_inverse=True)
+        rep = np.empty(len(codes), dtype=np.int64); rep[inv] = np.arange(len(inv))  # any row with that code
+        names = np.array([",".join(self._topic_vocab[i] for i in top[r] if i >= 0) for r in rep], dtype=object)
+        return names[inv]
+
+    def recommend_soft(self, row: dict) -> Recommendation:
+        p = self.clusterer.posterior([row])[0]
+        next_k = np.array([[self.recommend_for_cluster(row, k).next_difficulty for k in range(len(p))]])
+        nd, expected, top = self._blend(next_k, p[None])
+        cluster = int(p.argmax()); nd = int(nd[0])
+        return Recommendation(cluster, nd, [self._topic_vocab[i] for i in top[0] if i >= 0], self._tips(row, cluster, nd),
+                              posterior=p.tolist(), expected_difficulty=float(expected[0]))
+
+    def _rules(self, row: dict, cluster: int) -> Recommendation:
         next_diff = self._decide_next_difficulty(row, cluster)
         topics = self._pick_topics(next_diff)
         return Recommendation(cluster, next_diff, topics, self._tips(row, cluster, next_diff))
 
-    def recommend_batch(self, df: pd.DataFrame) -> pd.DataFrame:
-        _ = self.clusterer.predict(df)
-        recs = []
-        for _, row in df.iterrows():
-            r = self.recommend_one(row.to_dict())
-            recs.append({
-                **row.to_dict(),
-                "cluster": r.cluster,
-                "next_difficulty": r.next_difficulty,
-                "topics": ",".join(r.topics),
-                "tips": " | ".join(r.tips),
-            })
-        return pd.DataFrame(recs)
+    @staticmethod
+    def _column(df: pd.DataFrame, name: str, default: float) -> np.ndarray:
+        if name in df.columns:
+            return df[name].to_numpy(dtype=float)
+        return np.full(len(df), default, dtype=float)
+
+    def _step_batch(self, acc: np.ndarray) -> np.ndarray:
+        acc = np.where(acc > 1, acc / 100.0, acc)
+        return np.where(acc >= self.ACC_UP, 1, np.where(acc <= self.ACC_DOWN, -1, 0))
+
+    def _decide_next_difficulty_batch(self, df: pd.DataFrame) -> np.ndarray:
+        lvl = self._column(df, "difficulty_level", 1)
+        # fail like int() in the per-row path instead of casting NaN/inf to an arbitrary integer
+        if np.isnan(lvl).any():
+            raise ValueError("cannot convert float NaN to integer")
+        if np.isinf(lvl).any():
+            raise OverflowError("cannot convert float infinity to integer")
+        base = lvl.astype(np.int64)
+        lo, hi = self._difficulty_bounds()
+        return np.clip(base + self._step_batch(self._column(df, "accuracy", 0.0)), lo, hi)
+
+    def _tip_lookup(self) -> np.ndarray:
+        # the _tips rules as a 3-bit code (slow, errors, advance) -> joined tip string
+        table = []
+        for code in range(8):
+            ts = []
+            if code & 4: ts.append(self._TIP_SLOW)
+            if code & 2: ts.append(self._TIP_ERRORS)
+            ts.append(self._TIP_ADVANCE if code & 1 else self._TIP_STABILIZE)
+            table.append(" | ".join(ts[:3]))
+        return np.array(table, dtype=object)
+
+    def _tips_batch(self, df: pd.DataFrame, next_diff: np.ndarray) -> np.ndarray:
+        slow = self._column(df, "time_spent", 0) < self.SLOW_SECONDS
+        errors = self._column(df, "accuracy", 0) < self.ACC_TIP
+        advance = next_diff > self._column(df, "difficulty_level", 1)
+        code = slow.astype(np.int8) * 4 + errors.astype(np.int8) * 2 + advance.astype(np.int8)
+        return self._tips_by_code[code]
+
+    def _next_batch(self, out: pd.DataFrame, clusters: np.ndarray, table, buckets):
+        """next_difficulty per row from the table, rows it does not cover through the vectorized rules."""
+        rid = table.rows(clusters, *buckets) if table is not None else np.full(len(out), -1)
+        nd = np.empty(len(out), dtype=np.int64); hit = rid >= 0
+        if hit.any():
+            nd[hit] = table.next[rid[hit]]
+        if not hit.all():
+            nd[~hit] = self._decide_next_difficulty_batch(out if not hit.any() else out[~hit])
+        return nd, rid
+
+    def recommend_batch(self, df: pd.DataFrame, mode: str | None = None) -> pd.DataFrame:
+        # columnar equivalent of calling recommend_one per row: one predict for the whole frame, then one
+        # table gather; rows the table does not cover go through the vectorized rules
+        mode = mode or self.cfg.recommend_mode
+        out = df.reset_index(drop=True)
+        if out.empty:
+            soft = {"expected_difficulty": [], "cluster_confidence": []} if mode == "soft" else {}
+            return out.assign(cluster=[], next_difficulty=[], topics=[], tips=[], **soft)
+        table = self.table(); buckets = self._buckets_batch(out) if table is not None else None
+        if mode == "soft":
+            return self._soft_batch(out, table, buckets)
+        clusters = np.asarray(self.clusterer.predict(out)).astype(int)
+        next_diff, rid = self._next_batch(out, clusters, table, buckets)
+        hit = rid >= 0; miss = ~hit
+        topics = np.empty(len(out), dtype=object); tips = np.empty(len(out), dtype=object)
+        if hit.any():
+            topics[hit] = table.topics_joined[rid[hit]]; tips[hit] = table.tips_joined[rid[hit]]
+        if miss.any():
+            lo, _ = self._difficulty_bounds()
+            topics[miss] = self._topics_by_level[next_diff[miss] - lo]
+            tips[miss] = self._tips_batch(out if miss.all() else out[miss], next_diff[miss])
+        return out.assign(cluster=clusters, next_difficulty=next_diff.astype(int), topics=topics, tips=tips)
+
+    def _soft_batch(self, out: pd.DataFrame, table, buckets) -> pd.DataFrame:
+        p = self.clusterer.posterior(out)
+        next_k = np.column_stack([self._next_batch(out, np.full(len(out), k), table, buckets)[0] for k in range(p.shape[1])])
+        next_diff, expected, top = self._blend(next_k, p)
+        return out.assign(cluster=p.argmax(axis=1), next_difficulty=next_diff.astype(int), topics=self._topic_strings(top),
+                          tips=self._tips_batch(out, next_diff), expected_difficulty=expected, cluster_confidence=p.max(axis=1),
+                          **{f"p_cluster_{k}": p[:, k] for k in range(p.shape[1])})
+
+def write_table(cfg: AppConfig, src) -> Path:
+    """Materialize the recommendation table for the artifacts in `src` (ModelRegistry.publish calls this)."""
+    src = Path(src); model = src / "kmeans.joblib"
+    n = getattr(joblib.load(model), "n_clusters", cfg.n_clusters) if model.exists() else cfg.n_clusters
+    out = src / TABLE_NAME; tmp = src / f".{TABLE_NAME}.tmp"
+    tmp.write_text(json.dumps(Recommender(cfg).build_table(n)))
+    os.replace(tmp, out)
+    return out
@@ -0,0 +1,236 @@
+from __future__ import annotations
+import hashlib, json, os, shutil, threading, time, uuid
+from collections import OrderedDict
+from pathlib import Path
+import joblib
+
+# models/
+#   CURRENT                    <- name of the active version (swapped with os.replace)
+#   versions/<version>/        <- immutable artifact set + manifest.json
+#   preprocess.joblib ...      <- flat "legacy" layout written by the training scripts
+#   versions/.stage-*/         <- explicit file set of one training run, while it is being published
+#   recommend_table.json       <- derived at publish time (utils.iom.recommend.write_table)
+ARTIFACT_FILES = ("preprocess.joblib", "kmeans.joblib", "kmeans_minibatch.joblib", "gmm.joblib", "feature_spec.json",
+                  "recommend_table.json")
+POINTER = "CURRENT"
+VERSIONS = "versions"
+MANIFEST = "manifest.json"
+
+def file_hash(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+class _ObjectCache:
+    """Process-wide LRU of unpickled artifacts keyed by content hash, shared by every registry."""
+    def __init__(self, size: int = 16):
+        self.size = size
+        self._items: OrderedDict[str, object] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0; self.misses = 0; self.load_seconds = 0.0
+
+    def get(self, digest: str, path: Path):
+        with self._lock:
+            if digest in self._items:
+                self._items.move_to_end(digest); self.hits += 1
+                return self._items[digest]
+        t0 = time.perf_counter()
+        obj = json.loads(path.read_text()) if path.suffix == ".json" else joblib.load(path)
+        with self._lock:
+            self.misses += 1; self.load_seconds += time.perf_counter() - t0
+            self._items[digest] = obj
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+        return obj
+
+_CACHE = _ObjectCache()
+
+class ArtifactSet:
+    """One immutable, fully loaded version of the model artifacts."""
+    def __init__(self, version: str, path: Path, objects: dict, hashes: dict):
+        self.version = version; self.path = path
+        self.objects = objects; self.hashes = hashes
+        self._compiled = None; self._compiled_gmm = None
+
+    def has(self, name: str) -> bool:
+        return name in self.objects
+
+    def get(self, name: str):
+        return self.objects.get(name)
+
+    @property
+    def preprocess(self): return self.objects.get("preprocess.joblib")
+    @property
+    def kmeans(self): return self.objects.get("kmeans.joblib")
+    @property
+    def gmm(self): return self.objects.get("gmm.joblib")
+    @property
+    def feature_spec(self): return self.objects.get("feature_spec.json")
+
+    def compiled(self):
+        # compiled once per version, so a hot swap also swaps the compiled arrays
+        if self._compiled is None:
+            from .clustering import CompiledClusterer
+            from .features import CompiledFeatures
+            self._compiled = CompiledClusterer(CompiledFeatures.from_pipe(self.preprocess), self.kmeans.cluster_centers_)
+        return self._compiled
+
+    def compiled_gmm(self):
+        if self._compiled_gmm is None:
+            from .clustering import CompiledGMM
+            self._compiled_gmm = CompiledGMM(self.gmm)
+        return self._compiled_gmm
+
+class ModelRegistry:
+    def __init__(self, root: Path, poll_seconds: float = 2.0, keep: int = 5, prepare=None):
+        # prepare(src): writes derived artifacts into `src` right before it is snapshotted
+        self.root = Path(root); self.poll_seconds = poll_seconds; self.keep = keep; self.prepare = prepare
+        self._active: ArtifactSet | None = None
+        self._stamp = None; self._checked = 0.0
+        self._lock = threading.Lock()
+        self.swaps = 0; self.last_load_seconds = 0.0
+
+    # ---- publishing -------------------------------------------------------
+    def publish(self, src: Path | None = None, files=None) -> str:
+        """Snapshot the artifact files in `src` (default: the flat layout in root) as a new version and activate it.
+
+        `files` ({artifact name: path}, or paths already named like the artifacts) is the exact set a training run
+        produced; it is staged in a directory of its own, so whatever else lies in `src` is never part of the version.
+        """
+        if files is None:
+            return self._publish(Path(src or self.root))
+        files = files if isinstance(files, dict) else {Path(p).name: p for p in files}
+        unknown = sorted(set(files) - set(ARTIFACT_FILES))
+        if unknown:
+            raise ValueError(f"not artifact files: {unknown}")
+        stage = self.root / VERSIONS / f".stage-{uuid.uuid4().hex[:8]}"
+        stage.mkdir(parents=True)
+        try:
+            for n, p in files.items():
+                shutil.copy2(p, stage / n)
+            return self._publish(stage)
+        finally:
+            shutil.rmtree(stage, ignore_errors=True)
+
+    def _publish(self, src: Path) -> str:
+        files = [n for n in ARTIFACT_FILES if (src / n).exists()]
+        if not files:
+            raise FileNotFoundError(f"no artifacts to publish in {src}")
+        if self.prepare is not None:
+            self.prepare(src)
+            files = [n for n in ARTIFACT_FILES if (src / n).exists()]
+        hashes = {n: file_hash(src / n) for n in files}
+        digest = hashlib.sha256(json.dumps(hashes, sort_keys=True).encode()).hexdigest()[:12]
+        same = [v for v in self.versions() if v.endswith("-" + digest)]
+        if same:
+            # identical content was published before: re-activate it instead of storing a copy
+            if self.current_version() != same[-1]:
+                self._write_pointer(same[-1])
+            return same[-1]
+        version = time.strftime("%Y%m%dT%H%M%S") + "-" + digest
+        vdir = self.root / VERSIONS / version
+        tmp = self.root / VERSIONS / f".{version}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        for n in files:
+            shutil.copy2(src / n, tmp / n)
+        (tmp / MANIFEST).write_text(json.dumps({"version": version, "created_at": time.time(), "files": hashes}, indent=2))
+        os.replace(tmp, vdir)
+        self._write_pointer(version)
+        self._prune(version)
+        return version
+
+    def _write_pointer(self, version: str):
+        tmp = self.root / f".{POINTER}.tmp"
+        tmp.write_text(version + "\n")
+        os.replace(tmp, self.root / POINTER)
+
+    def _prune(self, active: str):
+        vroot = self.root / VERSIONS
+        versions = sorted(p for p in vroot.iterdir() if p.is_dir() and not p.name.startswith("."))
+        for old in versions[:-self.keep] if self.keep > 0 else []:
+            if old.name != active:
+                shutil.rmtree(old, ignore_errors=True)
+
+    def versions(self) -> list[str]:
+        vroot = self.root / VERSIONS
+        return sorted(p.name for p in vroot.iterdir() if p.is_dir() and not p.name.startswith(".")) if vroot.exists() else []
+
+    def activate(self, version: str):
+        if not (self.root / VERSIONS / version / MANIFEST).exists():
+            raise FileNotFoundError(version)
+        self._write_pointer(version)
+
+    def current_version(self) -> str | None:
+        ptr = self.root / POINTER
+        return ptr.read_text().strip() if ptr.exists() else None
+
+    # ---- loading ----------------------------------------------------------
+    def _source_stamp(self):
+        # cheap change detection: pointer content, or flat-file sizes/mtimes when no version was published yet
+        version = self.current_version()
+        if version:
+            return ("version", version)
+        return ("legacy",) + tuple((n, st.st_size, st.st_mtime_ns) for n in ARTIFACT_FILES
+                                   if (st := _stat(self.root / n)) is not None)
+
+    def _load(self, stamp) -> ArtifactSet:
+        t0 = time.perf_counter()
+        if stamp[0] == "version":
+            path = self.root / VERSIONS / stamp[1]
+            hashes = json.loads((path / MANIFEST).read_text())["files"]
+            version = stamp[1]
+        else:
+            path = self.root
+            hashes = {n: file_hash(path / n) for n in ARTIFACT_FILES if (path / n).exists()}
+            version = "legacy"
+        objects = {n: _CACHE.get(h, path / n) for n, h in hashes.items()}
+        self.last_load_seconds = time.perf_counter() - t0
+        return ArtifactSet(version, path, objects, hashes)
+
+    def current(self) -> ArtifactSet:
+        """The active artifact set; callers keep the returned object for the whole request, so a swap never splits one."""
+        now = time.monotonic()
+        active = self._active
+        if active is not None and now - self._checked < self.poll_seconds:
+            return active
+        with self._lock:
+            if self._active is not None and now - self._checked < self.poll_seconds:
+                return self._active
+            stamp = self._source_stamp()
+            if self._active is None or stamp != self._stamp:
+                fresh = self._load(stamp)
+                if self._active is not None: self.swaps += 1
+                self._active, self._stamp = fresh, stamp
+            self._checked = now
+            return self._active
+
+    def metrics(self) -> dict:
+        lookups = _CACHE.hits + _CACHE.misses
+        return {"version": self._active.version if self._active else None, "swaps": self.swaps,
+                "last_load_seconds": self.last_load_seconds, "cache_hits": _CACHE.hits, "cache_misses": _CACHE.misses,
+                "cache_hit_rate": _CACHE.hits / lookups if lookups else 0.0,
+                "cache_load_seconds": _CACHE.load_seconds, "cached_objects": len(_CACHE._items)}
+
+def _stat(path: Path):
+    try:
+        return path.stat()
+    except FileNotFoundError:
+        return None
+
+def _prepare(cfg, src: Path):
+    from .recommend import write_table
+    write_table(cfg, src)
+
+_REGISTRIES: dict[Path, ModelRegistry] = {}
+_REGISTRIES_LOCK = threading.Lock()
+
+def get_registry(cfg) -> ModelRegistry:
+    root = Path(cfg.artifacts).resolve()
+    with _REGISTRIES_LOCK:
+        if root not in _REGISTRIES:
+            _REGISTRIES[root] = ModelRegistry(root, poll_seconds=cfg.registry_poll_seconds, keep=cfg.registry_keep_versions,
+                                              prepare=lambda src: _prepare(cfg, src))
+        return _REGISTRIES[root]
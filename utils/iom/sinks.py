@@ -0,0 +1,56 @@
+from __future__ import annotations
+from pathlib import Path
+import pandas as pd
+from .data_load import is_parquet
+
+# Chunked table writers shared by the batch scoring pipeline and normalize_and_merge: write(df) per chunk, close().
+
+class CsvSink:
+    def __init__(self, path):
+        self.path = Path(path); self._header = True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path.exists(): self.path.unlink()
+    def write(self, df: pd.DataFrame):
+        df.to_csv(self.path, mode="a", index=False, header=self._header); self._header = False
+    def close(self):
+        if self._header: self.path.touch()
+
+class ParquetSink:
+    """The file schema is fixed when the first chunk arrives, so it must not depend on that chunk's values:
+    `types` pins known columns (pyarrow types), other text columns and columns with no value yet (type unknown)
+    are written as strings, and every chunk is converted column by column to the schema (NaN -> null)."""
+    def __init__(self, path, types: dict | None = None):
+        self.path = Path(path); self._writer = None; self.types = dict(types or {})
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+    def _schema(self, df: pd.DataFrame):
+        import pyarrow as pa
+        fields = []
+        for c in df.columns:
+            if c in self.types: t = self.types[c]
+            elif pd.api.types.is_string_dtype(df[c].dtype) or df[c].isna().all(): t = pa.string()
+            else: t = pa.Array.from_pandas(df[c]).type
+            fields.append(pa.field(c, t))
+        return pa.schema(fields)
+    def _table(self, df: pd.DataFrame, schema):
+        import pyarrow as pa
+        extra = [c for c in df.columns if c not in schema.names]
+        if extra:
+            raise ValueError(f"columns not in the file schema: {extra}")
+        arrays = []
+        for f in schema:
+            s = df[f.name] if f.name in df.columns else pd.Series(None, index=df.index, dtype=object)
+            if pa.types.is_string(f.type) or pa.types.is_large_string(f.type):
+                s = [None if v is None or v != v else str(v) for v in s.tolist()]
+            arrays.append(pa.array(s, type=f.type, from_pandas=True))
+        return pa.Table.from_arrays(arrays, schema=schema)
+    def write(self, df: pd.DataFrame):
+        import pyarrow.parquet as pq
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(str(self.path), self._schema(df))
+        self._writer.write_table(self._table(df, self._writer.schema))
+    def close(self):
+        if self._writer is not None: self._writer.close()
+
+def open_sink(path, fmt: str | None = None, types: dict | None = None):
+    fmt = fmt or ("parquet" if is_parquet(path) else "csv")
+    return ParquetSink(path, types) if fmt == "parquet" else CsvSink(path)
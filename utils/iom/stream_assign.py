@@ -0,0 +1,335 @@
+from __future__ import annotations
+import argparse, copy, io, json, os, shutil, signal, tempfile, time
+from pathlib import Path
+import joblib, numpy as np, pandas as pd
+import pyarrow.parquet as pq
+from .config import AppConfig
+from .learner_aggregates import AggregateStore, VALUES
+from .mongo import learners
+from .mongo_sink import MongoSink
+from .profile_store import META, ProfileStore
+from .registry import ARTIFACT_FILES, file_hash, get_registry
+
+# Streaming cluster assignment: tail learner events (learner_id, correct, time_spent_sec, difficulty, as written by
+# scripts/build_learner_events.py), keep per-learner running sums, re-derive the touched learners' model features on
+# top of their snapshot profile and assign them to the published centroids; only changed assignments are emitted.
+# <state dir>/
+#   CURRENT            name of the live state version (swapped with os.replace, so a save is one atomic step)
+#   state_<id>/
+#     state.json       tail offsets, offset checkpoints, snapshot built_at, anchor/published kmeans hashes, counters
+#     aggregates.npz   AggregateStore of the events folded in since that snapshot
+#     labels.npz       assignments emitted since that snapshot (others are the snapshot's cluster_kmeans)
+#     anchor.npy       centroids of the anchor model, the drift guard's reference
+#     centers.npy      centroids nudged by partial_fit (only with --partial_fit)
+EVENTS = ["learner_id", *VALUES]
+POINTER = "CURRENT"
+CHECKPOINT_SECONDS = 60.0  # granularity of the (time, offsets) checkpoints a rebuilt snapshot rewinds to
+MAX_CHECKPOINTS = 10000
+TEXT = (".jsonl", ".json", ".csv")
+DEFAULTS = {"time_spent": 0.0, "avg_score": 0.0, "accuracy": 0.0, "difficulty_level": 1, "topic_progress": 0.0}
+
+class EventTail:
+    """Events appended since the last poll. A JSONL/CSV file is followed by byte offset (complete lines only); a
+    Parquet file by row groups, since a file is readable only once its writer closed it. `source` is one file or a
+    directory scanned recursively (names starting with . or _ are skipped). Truncated files are read again."""
+    def __init__(self, source, offsets: dict | None = None, max_bytes: int = 64 << 20):
+        self.source = Path(source); self.offsets = dict(offsets or {}); self.max_bytes = max_bytes
+
+    def files(self) -> list[Path]:
+        if not self.source.is_dir():
+            return [self.source] if self.source.exists() else []
+        return sorted(p for p in self.source.rglob("*") if p.is_file() and p.suffix in (*TEXT, ".parquet")
+                      and not any(s.startswith((".", "_")) for s in p.relative_to(self.source).parts))
+
+    def poll(self):
+        for p in self.files():
+            df = self._parquet(p) if p.suffix == ".parquet" else self._text(p)
+            if df is not None and len(df):
+                yield df
+
+    def _text(self, p: Path):
+        key = str(p.resolve()); pos = self.offsets.get(key, 0); size = p.stat().st_size
+        if size < pos: pos = 0
+        if size == pos: return None
+        with open(p, "rb") as f:
+            header = f.readline() if p.suffix == ".csv" else b""
+            if header and not header.endswith(b"\n"): return None  # header still being written
+            pos = max(pos, len(header)); f.seek(pos)
+            data = f.read(self.max_bytes)
+        cut = data.rfind(b"\n") + 1
+        if not cut:
+            if len(data) == self.max_bytes: raise ValueError(f"{p}: line longer than max_bytes at offset {pos}")
+            return None  # partial last line: wait for the writer
+        self.offsets[key] = pos + cut
+        buf = io.BytesIO(header + data[:cut])
+        if p.suffix == ".csv":
+            return pd.read_csv(buf, usecols=lambda c: c in EVENTS, dtype={"learner_id": str})
+        df = pd.read_json(buf, lines=True, dtype=False)
+        return df[[c for c in EVENTS if c in df.columns]]
+
+    def _parquet(self, p: Path):
+        key = str(p.resolve()); done = self.offsets.get(key, 0)
+        try:
+            f = pq.ParquetFile(p)
+        except (OSError, ValueError):
+            return None  # no footer yet: still being written
+        n = f.num_row_groups
+        if n < done: done = 0
+        if n == done: return None
+        t = f.read_row_groups(range(done, n), columns=[c for c in EVENTS if c in f.schema_arrow.names])
+        self.offsets[key] = n
+        return t.to_pandas()
+
+class OnlineAssigner:
+    """Folds event batches into running per-learner sums and returns the learners whose cluster changed.
+    Features of a touched learner: accuracy, time_spent (minutes per event) and difficulty_level (event difficulty
+    0..1 mapped onto the level range) are the event means, blended with the snapshot row as if it were worth
+    `prior_events` events; the columns events do not carry (avg_score, topic_progress, ...) come from the snapshot.
+    With `partial_fit` the centroids follow the stream through MiniBatchKMeans.partial_fit, seeded with the snapshot's
+    cluster sizes as counts; a step that would move any centroid more than `max_drift` (relative to the median
+    distance between the published centroids) from the published ones is rejected, and the model is flagged for a
+    full retrain. A new snapshot (a full recompute) supersedes the streamed state, a retrained model the nudges; the
+    events after the snapshot's data cutoff are replayed on top of it (see refresh())."""
+    def __init__(self, cfg: AppConfig, state_dir, prior_events: float = 20.0, partial_fit: bool = False,
+                 max_drift: float = 0.1):
+        self.cfg = cfg; self.state_dir = Path(state_dir)
+        self.prior_events = prior_events; self.partial_fit = partial_fit; self.max_drift = max_drift
+        live = self._live()
+        meta = json.loads((live / "state.json").read_text()) if live is not None else {}
+        self.offsets = meta.get("offsets", {}); self.snapshot_built = meta.get("snapshot_built_at")
+        # (time, offsets) pairs: every event before `offsets` had been read by `at`; the first one is "nothing read"
+        self.checkpoints = meta.get("checkpoints") or [{"at": 0.0, "offsets": {}}]
+        self.anchor = meta.get("anchor_kmeans"); self.published = meta.get("published_kmeans")
+        self.stats = {"events": 0, "batches": 0, "touched": 0, "changed": 0, "drift": 0.0, "drift_rejected": 0,
+                      "retrain_needed": False, "rewinds": 0, **meta.get("stats", {})}
+        live = live or self.state_dir
+        self.store = AggregateStore.load(live / "aggregates.npz")
+        self.labels = {}
+        if (live / "labels.npz").exists():
+            z = np.load(live / "labels.npz", allow_pickle=False)
+            self.labels = dict(zip(z["ids"].tolist(), z["labels"].tolist()))
+        saved = live / "centers.npy"
+        self.centers = np.load(saved) if partial_fit and saved.exists() else None
+        self.base = np.load(live / "anchor.npy") if (live / "anchor.npy").exists() else None
+        self.snapshot = None; self._arts = None; self._mbk = None
+        lv = list(cfg.difficulty_map.values()) or [0, 2]
+        self.levels = (min(lv), max(lv))
+
+    # ---- inputs -----------------------------------------------------------
+    def refresh(self) -> bool:
+        """Pick up a rebuilt snapshot; call it between polls. The streamed state is dropped and `offsets` moves back
+        to the last checkpoint taken before the snapshot's data cutoff, so the events after the cutoff are replayed on
+        top of the new snapshot rather than lost. True when the tail has to rewind to `offsets`."""
+        root = Path(self.cfg.profiles_dir)
+        if not (root / META).exists() or (self.snapshot is not None and self.snapshot.stamp == (root / META).stat().st_mtime_ns):
+            return False
+        self.snapshot = ProfileStore(root)
+        if self.snapshot.meta["built_at"] == self.snapshot_built:
+            return False
+        cutoff = self.snapshot.meta.get("data_cutoff", self.snapshot.meta["built_at"])
+        i = max([j for j, c in enumerate(self.checkpoints) if c["at"] <= cutoff], default=0)
+        self.checkpoints = self.checkpoints[i:]
+        rewind = self.offsets != self.checkpoints[0]["offsets"]
+        self.offsets = dict(self.checkpoints[0]["offsets"])
+        self.store = AggregateStore(); self.labels = {}; self._mbk = None
+        self.snapshot_built = self.snapshot.meta["built_at"]; self.stats["rewinds"] += int(rewind)
+        return rewind
+
+    def _sync(self):
+        arts = get_registry(self.cfg).current()
+        if arts is self._arts:
+            return
+        self._arts = arts; self.feats = arts.compiled().feats
+        # models are told apart by the kmeans file hash (the flat layout is always version "legacy"); drift is measured
+        # from the anchor, the last model not published by us, so republishing nudges never resets the guard
+        h = arts.hashes.get("kmeans.joblib")
+        if h not in (self.anchor, self.published) or self.base is None:
+            self.anchor = h; self.base = arts.kmeans.cluster_centers_.astype(float)
+            self.centers = None; self._mbk = None; self.stats["retrain_needed"] = False
+        if self.centers is None:
+            self.centers = arts.kmeans.cluster_centers_.astype(float)
+        d = np.linalg.norm(self.base[:, None] - self.base[None], axis=2)[np.triu_indices(len(self.base), 1)]
+        self._scale = float(np.median(d)) if len(d) else 1.0
+
+    def features(self, ids: list) -> pd.DataFrame:
+        sums, counts = self.store.totals(ids)
+        base = self.snapshot.lookup(ids) if self.snapshot is not None else {}
+        cols = list(dict.fromkeys([*self.feats.num_cols, *self.feats.cat_cols, *DEFAULTS]))
+        b = {c: np.array([_num(base.get(i, {}).get(c), DEFAULTS.get(c, 0.0)) for i in ids]) for c in cols}
+        w = np.array([self.prior_events if i in base else 0.0 for i in ids])
+        lo, hi = self.levels
+
+        def blend(col, prior, scale=1.0):
+            j = VALUES.index(col); n = w + counts[:, j]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                return np.where(n > 0, (w * prior + sums[:, j] * scale) / n, prior)
+        b["accuracy"] = blend("correct", b["accuracy"])
+        b["time_spent"] = blend("time_spent_sec", b["time_spent"], 1 / 60)
+        level = lo + blend("difficulty", (b["difficulty_level"] - lo) / max(hi - lo, 1)) * (hi - lo)
+        b["difficulty_level"] = np.clip(np.rint(level), lo, hi).astype(np.int64)
+        return pd.DataFrame({"learner_id": ids, **b})
+
+    # ---- one batch --------------------------------------------------------
+    def process(self, events: pd.DataFrame) -> pd.DataFrame:
+        """Fold `events` in; returns the changed learners (learner_id, feature columns, cluster_kmeans)."""
+        self._sync()
+        events = events.reindex(columns=EVENTS)
+        events = events[events["learner_id"].notna()]
+        self.store.merge(events)
+        ids = list(dict.fromkeys(events["learner_id"].astype(str)))
+        frame = self.features(ids)
+        X = self.feats.transform(frame)
+        if self.partial_fit and len(X):
+            self._nudge(X)
+        c = self.centers
+        new = np.argmin(np.einsum("ij,ij->i", c, c) - 2.0 * (X @ c.T), axis=1)
+        snap = self.snapshot.lookup(ids) if self.snapshot is not None else {}
+        prev = np.array([self.labels.get(i, _num(snap.get(i, {}).get("cluster_kmeans"), -1)) for i in ids])
+        changed = new != prev
+        for i, k in zip(np.asarray(ids, dtype=object)[changed], new[changed]):
+            self.labels[i] = int(k)
+        self.stats["events"] += len(events); self.stats["batches"] += 1
+        self.stats["touched"] += len(ids); self.stats["changed"] += int(changed.sum())
+        return frame[changed].assign(cluster_kmeans=new[changed].astype(np.int64)).reset_index(drop=True)
+
+    def _nudge(self, X: np.ndarray):
+        if self._mbk is None:
+            from sklearn.cluster import MiniBatchKMeans
+            k = len(self.centers)
+            sizes = (np.bincount(np.clip(self.snapshot.cols["cluster_kmeans"], 0, k - 1), minlength=k)
+                     if self.snapshot is not None and "cluster_kmeans" in self.snapshot.cols else np.zeros(k))
+            # counts start at the snapshot's cluster sizes: one fit on the centroids themselves, which leaves them in place
+            self._mbk = MiniBatchKMeans(n_clusters=k, init=self.centers, n_init=1, reassignment_ratio=0.0,
+                                        random_state=self.cfg.random_state)
+            self._mbk.partial_fit(self.centers, sample_weight=np.maximum(sizes, self.prior_events))
+        trial = copy.deepcopy(self._mbk).partial_fit(X)
+        drift = float(np.linalg.norm(trial.cluster_centers_ - self.base, axis=1).max() / self._scale)
+        if drift > self.max_drift:
+            self.stats["drift_rejected"] += 1; self.stats["retrain_needed"] = True
+            return
+        self._mbk = trial; self.centers = trial.cluster_centers_.astype(float); self.stats["drift"] = round(drift, 6)
+
+    # ---- state ------------------------------------------------------------
+    def publish(self) -> str | None:
+        """Publish the nudged centroids as a new model version (same preprocess/GMM, kmeans centers replaced)."""
+        if self._arts is None or np.array_equal(self.centers, self._arts.kmeans.cluster_centers_):
+            return None
+        reg = get_registry(self.cfg)
+        with tempfile.TemporaryDirectory(dir=reg.root) as tmp:
+            for n in ARTIFACT_FILES:
+                if (self._arts.path / n).exists() and n != "recommend_table.json": shutil.copy2(self._arts.path / n, tmp)
+            km = copy.deepcopy(self._arts.kmeans)
+            km.cluster_centers_ = self.centers.astype(km.cluster_centers_.dtype)
+            joblib.dump(km, Path(tmp) / "kmeans.joblib")
+            self.published = file_hash(Path(tmp) / "kmeans.joblib")
+            return reg.publish(Path(tmp))
+
+    def _live(self) -> Path | None:
+        ptr = self.state_dir / POINTER
+        if ptr.exists():
+            return self.state_dir / ptr.read_text().strip()
+        return self.state_dir if (self.state_dir / "state.json").exists() else None  # layout before the pointer
+
+    def _checkpoint(self):
+        now = time.time(); cp = self.checkpoints
+        if cp[-1]["offsets"] == self.offsets:
+            return
+        if len(cp) > 1 and now - cp[-2]["at"] < CHECKPOINT_SECONDS:
+            cp[-1] = {"at": now, "offsets": dict(self.offsets)}  # moving the last one later only widens a replay
+        else:
+            cp.append({"at": now, "offsets": dict(self.offsets)})
+        del cp[:-MAX_CHECKPOINTS]
+
+    def save(self):
+        """Write the state into a fresh version directory and switch CURRENT to it with one rename."""
+        self._checkpoint()
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(prefix="state_", dir=self.state_dir))
+        self.store.save(tmp / "aggregates.npz")
+        np.savez(tmp / "labels.npz", ids=np.asarray(list(self.labels), dtype=str),
+                 labels=np.asarray(list(self.labels.values()), dtype=np.int64))
+        if self.base is not None:
+            np.save(tmp / "anchor.npy", self.base)
+        if self.partial_fit and self.centers is not None:
+            np.save(tmp / "centers.npy", self.centers)
+        (tmp / "state.json").write_text(json.dumps(
+            {"offsets": self.offsets, "checkpoints": self.checkpoints, "snapshot_built_at": self.snapshot_built,
+             "anchor_kmeans": self.anchor, "published_kmeans": self.published, "stats": self.stats,
+             "saved_at": time.time()}, indent=2))
+        ptr = self.state_dir / f".{POINTER}.tmp"
+        ptr.write_text(tmp.name + "\n"); os.replace(ptr, self.state_dir / POINTER)
+        for p in self.state_dir.iterdir():
+            if p.is_dir() and p != tmp: shutil.rmtree(p, ignore_errors=True)
+            elif p.suffix in (".json", ".npz", ".npy"): p.unlink(missing_ok=True)  # files of the layout before the pointer
+
+def _num(v, default):
+    return default if v is None or v != v else v
+
+class JsonlSink:
+    def __init__(self, path):
+        self.path = Path(path); self.path.parent.mkdir(parents=True, exist_ok=True); self.docs = 0
+
+    def write(self, df: pd.DataFrame):
+        with open(self.path, "a") as f:
+            df.assign(updated_at=time.time()).to_json(f, orient="records", lines=True)
+        self.docs += len(df)
+
+    def flush(self): pass
+    def close(self) -> dict: return {"docs": self.docs, "path": str(self.path)}
+
+def drain(a: OnlineAssigner, tail: EventTail, sink=None) -> int:
+    """One poll: fold in every new event, emit the changed assignments, then move and save the offsets. The sink is
+    flushed first and raises if a write failed, so lost writes are never checkpointed (at-least-once; the upserts
+    are idempotent). Returns the number of events read."""
+    t0 = time.perf_counter(); n = 0
+    if a.refresh():
+        tail.offsets = dict(a.offsets); a.save()
+        print(json.dumps({"rewound": a.snapshot_built, "replay_from": a.checkpoints[0]["at"]}))
+    for events in tail.poll():
+        changed = a.process(events); n += len(events)
+        if sink is not None and len(changed): sink.write(changed)
+    if n:
+        if sink is not None: sink.flush()
+        a.offsets = tail.offsets; a.save()
+        print(json.dumps({**a.stats, "new_events": n, "seconds": round(time.perf_counter() - t0, 3)}))
+    return n
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--source", default="data/cleaned/events_incoming", help="JSONL/CSV/Parquet file or directory of them")
+    ap.add_argument("--state", default=None, help="default: <processed>/stream_state")
+    ap.add_argument("--sink", choices=["mongo", "jsonl", "none"], default="mongo")
+    ap.add_argument("--out", default=None, help="jsonl sink path (default: <reports>/cluster_updates.jsonl)")
+    ap.add_argument("--mongo", default=None); ap.add_argument("--db", default=None); ap.add_argument("--collection", default=None)
+    ap.add_argument("--poll_seconds", type=float, default=5.0)
+    ap.add_argument("--once", action="store_true", help="consume what is there, then exit (cron)")
+    ap.add_argument("--prior_events", type=float, default=20.0, help="weight of the snapshot row, in events")
+    ap.add_argument("--partial_fit", action="store_true", help="nudge centroids with MiniBatchKMeans.partial_fit")
+    ap.add_argument("--max_drift", type=float, default=0.1)
+    ap.add_argument("--publish_minutes", type=float, default=0.0, help="publish nudged centroids this often (0: never)")
+    ap.add_argument("--max_bytes", type=int, default=64 << 20)
+    args = ap.parse_args()
+    cfg = AppConfig.load()
+    a = OnlineAssigner(cfg, args.state or cfg.processed / "stream_state", args.prior_events, args.partial_fit, args.max_drift)
+    tail = EventTail(args.source, a.offsets, args.max_bytes)
+    sink = (MongoSink(learners(cfg, args.mongo, args.db, args.collection), fill_missing=False) if args.sink == "mongo"
+            else JsonlSink(args.out or cfg.reports / "cluster_updates.jsonl") if args.sink == "jsonl" else None)
+    stop = []
+    for s in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(s, lambda *_: stop.append(1))
+    last_publish = time.monotonic()
+    try:
+        while True:
+            n = drain(a, tail, sink)
+            if args.partial_fit and args.publish_minutes and time.monotonic() - last_publish >= 60 * args.publish_minutes:
+                last_publish = time.monotonic()
+                version = a.publish()
+                if version: a.save(); print(json.dumps({"published": version}))
+            if n and not stop: continue  # drain a backlog before sleeping
+            if args.once or stop: break
+            time.sleep(args.poll_seconds)
+    finally:
+        if sink is not None: print(json.dumps(sink.close()))
+
+if __name__ == "__main__":
+    main()
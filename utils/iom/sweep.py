@@ -0,0 +1,122 @@
+from __future__ import annotations
+import json, shutil, tempfile, time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import joblib
+import numpy as np, pandas as pd
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.mixture import GaussianMixture
+from .config import AppConfig
+from .feature_cache import load_features
+from .registry import get_registry
+from .cluster_metrics import evaluate
+from .clustering import CENTROIDS
+
+ALGOS = ("kmeans", "kmeans_minibatch", "gmm")
+# promotion target per algorithm: the KMeans family replaces the serving model, GMM the soft-assignment model
+PROMOTE_AS = {"kmeans": "kmeans.joblib", "kmeans_minibatch": "kmeans.joblib", "gmm": "gmm.joblib"}
+RANK = {"silhouette": False, "silhouette_simplified": False, "calinski_harabasz": False, "davies_bouldin": True,
+        "bic": True, "inertia": True}  # metric -> ascending
+
+def parse_ks(spec: str) -> list[int]:
+    """'2-8' or '3,5,8' (or a mix) -> sorted unique k >= 2."""
+    ks = set()
+    for part in str(spec).split(","):
+        lo, _, hi = part.strip().partition("-")
+        ks.update(range(int(lo), int(hi or lo) + 1))
+    return sorted(k for k in ks if k >= 2)
+
+_X = None
+
+def _init_worker(path, shape):
+    # every worker maps the same float32 file; nothing is pickled per task
+    global _X
+    _X = np.memmap(path, dtype=np.float32, mode="r", shape=tuple(shape))
+
+def _fit_rows(n, cap, rng):
+    return np.sort(rng.choice(n, cap, replace=False)) if 0 < cap < n else None
+
+def _grow(centers: np.ndarray, X: np.ndarray, rng) -> np.ndarray:
+    """Warm start for k+1: the previous centers plus one D^2-sampled row (a single k-means++ step)."""
+    sub = X[rng.choice(len(X), min(len(X), 100000), replace=False)]
+    d = ((sub[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2).min(axis=1)
+    pick = rng.choice(len(sub), p=d / d.sum()) if d.sum() > 0 else rng.integers(len(sub))
+    return np.vstack([centers, sub[pick]])
+
+def _make(algo, k, seed, init):
+    if algo == "kmeans":
+        return KMeans(n_clusters=k, random_state=seed, **({"init": init, "n_init": 1} if init is not None else {}))
+    if algo == "kmeans_minibatch":
+        return MiniBatchKMeans(n_clusters=k, random_state=seed, batch_size=4096, **({"init": init, "n_init": 1} if init is not None else {}))
+    return GaussianMixture(n_components=k, random_state=seed, **({"means_init": init} if init is not None else {}))
+
+def _fit_block(algo, ks, seed, fit_sample, gmm_sample, eval_sample, out_dir):
+    """Fit one algorithm over a contiguous run of k, each fit warm-started from the previous k's centers."""
+    rng = np.random.default_rng(seed + ks[0])
+    cap = min(fit_sample or len(_X), gmm_sample) if algo == "gmm" else fit_sample
+    rows = _fit_rows(len(_X), cap, rng)
+    Xf = np.asarray(_X if rows is None else _X[rows], dtype=np.float64 if algo == "gmm" else np.float32)
+    out = []; centers = None
+    for k in ks:
+        init = _grow(centers, Xf, rng) if centers is not None and len(centers) == k - 1 else None
+        t0 = time.perf_counter()
+        model = _make(algo, k, seed, init).fit(Xf)
+        fit_s = time.perf_counter() - t0
+        centers = model.means_ if algo == "gmm" else model.cluster_centers_
+        m = evaluate(model, _X, sample=eval_sample, workers=1, seed=seed)
+        path = Path(out_dir) / f"{algo}_k{k}.joblib"
+        joblib.dump(model, path)
+        out.append({"algo": algo, "k": k, "warm_start": init is not None, "silhouette": m.get("silhouette"),
+                    "silhouette_ci95": m.get("silhouette_ci95"), "silhouette_simplified": m.get("silhouette_simplified"),
+                    "davies_bouldin": m["davies_bouldin"], "calinski_harabasz": m["calinski_harabasz"],
+                    "inertia": float(model.inertia_) if hasattr(model, "inertia_") else None,
+                    "bic": float(model.bic(Xf)) if algo == "gmm" else None,
+                    "fit_seconds": round(fit_s, 3), "eval_seconds": m["seconds"], "fit_rows": len(Xf), "model_path": str(path)})
+    return out
+
+def run_sweep(cfg: AppConfig, csv, ks, algos=ALGOS, workers: int = 1, eval_sample: int = 20000, fit_sample: int = 0,
+              gmm_sample: int = 300000, rank_by: str = "silhouette", out_dir=None) -> pd.DataFrame:
+    """Fit every (algo, k) on the cached feature matrix of `csv` in a process pool; returns the ranked table."""
+    X = load_features(cfg, csv)
+    out_dir = Path(out_dir or cfg.reports / "sweep"); out_dir.mkdir(parents=True, exist_ok=True)
+    tmp = None
+    path = getattr(X, "filename", None)
+    if path is None:
+        # cache disabled: spill once so the workers can still share one mapping
+        tmp = tempfile.TemporaryDirectory(prefix="iom_sweep_"); path = str(Path(tmp.name) / "features.f32")
+        np.ascontiguousarray(X, dtype=np.float32).tofile(path)
+    try:
+        # contiguous k blocks per algorithm: enough blocks to fill the pool, each long enough to chain warm starts
+        n_blocks = max(1, workers // max(1, len(algos)))
+        tasks = [(a, [int(k) for k in block], cfg.random_state, fit_sample, gmm_sample, eval_sample, str(out_dir))
+                 for a in algos for block in np.array_split(np.asarray(ks), min(n_blocks, len(ks))) if len(block)]
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(path, X.shape)) as pool:
+                rows = [r for part in pool.map(_fit_block, *zip(*tasks)) for r in part]
+        else:
+            _init_worker(path, X.shape)
+            rows = [r for t in tasks for r in _fit_block(*t)]
+    finally:
+        if tmp is not None: tmp.cleanup()
+    table = pd.DataFrame(rows)
+    table = table.sort_values(rank_by, ascending=RANK[rank_by], na_position="last", kind="stable").reset_index(drop=True)
+    table.insert(0, "rank", np.arange(1, len(table) + 1))
+    table.to_csv(out_dir / "sweep_results.csv", index=False)
+    return table
+
+def promote(cfg: AppConfig, row: dict) -> str:
+    """Publish the active version with the swept model swapped in under its serving name (the sweep ran on the active
+    preprocess), and mirror the model into the flat artifact layout."""
+    reg = get_registry(cfg); arts = reg.current(); target = cfg.artifacts / PROMOTE_AS[row["algo"]]
+    files = {n: arts.path / n for n in arts.hashes if n != "recommend_table.json"}  # the table is re-derived
+    files[target.name] = row["model_path"]
+    shutil.copy2(row["model_path"], target)
+    if target.name == "kmeans.joblib":
+        pd.DataFrame(joblib.load(target).cluster_centers_).to_csv(cfg.artifacts / CENTROIDS, index=False)
+    version = reg.publish(files=files)
+    summ = cfg.reports / "clustering_summary.json"
+    base = json.loads(summ.read_text()) if summ.exists() else {}
+    base["promoted"] = {"algo": row["algo"], "k": int(row["k"]), "model_version": version,
+                        **{m: None if pd.isna(row.get(m)) else float(row[m]) for m in ("silhouette", "davies_bouldin", "bic")}}
+    summ.write_text(json.dumps(base, indent=2))
+    return version